@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compare records/sec of manual split() parsing and SourceCsv typed records on a large CSV file.
+
+import sys
+import time
+import tempfile
+
+from os.path import join
+
+from pyngsi.sources.source import Source
+from pyngsi.sources.source_csv import SourceCsv
+
+ROWS = 1000000
+TYPES = {"temperature": "float", "pressure": "int"}
+
+
+def create_file(tmpdir: str) -> str:
+    filename = join(tmpdir, "rooms.csv")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("id;temperature;pressure\n")
+        for i in range(ROWS):
+            f.write(f"Room{i % 9 + 1};{i % 40}.5;{700 + i % 300}\n")
+    return filename
+
+
+def manual(filename: str):
+    """what process() does by hand today"""
+    for row in Source.from_file(filename).skip_header():
+        id, temperature, pressure = row.record.split(';')
+        yield {"id": id, "temperature": float(temperature), "pressure": int(pressure)}
+
+
+def bench(name: str, records):
+    start = time.perf_counter()
+    n = sum(1 for _ in records)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<30}{n / elapsed:>12.0f} records/s")
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = create_file(tmpdir)
+        bench("split + convert", manual(filename))
+        bench("SourceCsv dict", SourceCsv(filename, header=True, types=TYPES))
+        bench("SourceCsv tuple", SourceCsv(filename, header=True, types=TYPES, records="tuple"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compare time and peak memory of SourceMicrosoftExcel in full and read-only modes,
+# on sample-data/test.xlsx scaled up to a large workbook.
+
+import sys
+import time
+import tempfile
+import tracemalloc
+
+from os.path import join, dirname
+
+import openpyxl
+
+from pyngsi.sources.more_sources import SourceMicrosoftExcel
+
+ROWS = 40000
+SHEETS = 4
+SAMPLE = join(dirname(__file__), "..", "sample-data", "test.xlsx")
+
+
+def create_file(tmpdir: str) -> str:
+    sample = [row for row in openpyxl.load_workbook(SAMPLE, read_only=True).worksheets[0].iter_rows(values_only=True)]
+    filename = join(tmpdir, "test-large.xlsx")
+    wb = openpyxl.Workbook(write_only=True)
+    for s in range(SHEETS):
+        ws = wb.create_sheet(f"Sheet{s + 1}")
+        for i in range(ROWS // SHEETS):
+            ws.append(sample[i % len(sample)])
+    wb.save(filename)
+    return filename
+
+
+def bench(name: str, src: SourceMicrosoftExcel):
+    start = time.perf_counter()
+    n = sum(1 for _ in src)
+    elapsed = time.perf_counter() - start
+    # second pass for memory, tracing allocations slows down
+    tracemalloc.start()
+    sum(1 for _ in src)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<30}{n / elapsed:>12.0f} rows/s{peak / 2**20:>10.1f} MiB peak")
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = create_file(tmpdir)
+        bench("full", SourceMicrosoftExcel(filename, sheets="*"))
+        bench("read_only", SourceMicrosoftExcel(filename, sheets="*", read_only=True))
+        bench("read_only tuple", SourceMicrosoftExcel(filename, sheets="*", read_only=True, records="tuple"))
+        # memory of the worker processes is not traced
+        bench("workers=4 tuple", SourceMicrosoftExcel(filename, sheets="*", records="tuple", workers=4))
+
+
+if __name__ == "__main__":
+    main()
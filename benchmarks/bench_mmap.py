@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compare lines/sec of Source.from_file() and SourceMmap on a large CSV file.
+
+import os
+import sys
+import time
+import tempfile
+
+from os.path import join
+
+from pyngsi.sources.source import Source
+from pyngsi.sources.source_mmap import SourceMmap
+
+ROWS = 2000000
+
+
+def create_file(tmpdir: str) -> str:
+    filename = join(tmpdir, "rooms.csv")
+    with open(filename, "w", encoding="utf-8") as f:
+        for i in range(ROWS):
+            f.write(f"Room{i % 9 + 1};{i % 40}.5;{700 + i % 300}\n")
+    return filename
+
+
+def bench(name: str, src: Source):
+    start = time.perf_counter()
+    n = sum(1 for _ in src)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<30}{n / elapsed:>12.0f} lines/s")
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = create_file(tmpdir)
+        print(f"{os.path.getsize(filename) / 1e6:.0f} MB")
+        bench("Source.from_file", Source.from_file(filename))
+        bench("SourceMmap", SourceMmap(filename))
+        workers = max(2, os.cpu_count() or 1)
+        bench(f"SourceMmap ({workers} workers)", SourceMmap(filename, workers=workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compare the throughput of the sequential agent and the pipeline agent.
+# Input is a gzipped CSV file, the sink simulates the network latency of an Orion server.
+
+import gzip
+import sys
+import time
+import tempfile
+
+from os.path import join
+
+from pyngsi.sources.source import Source
+from pyngsi.sink import Sink
+from pyngsi.agent import NgsiAgentPull, build_entity_sample_orion
+from pyngsi.pipeline import NgsiAgentPipeline
+
+ROWS = 20000
+LATENCY = 0.0002  # seconds
+
+
+class SinkLatency(Sink):
+
+    def write(self, msg):
+        time.sleep(LATENCY)
+
+
+def create_file(tmpdir: str) -> str:
+    filename = join(tmpdir, "rooms.csv.gz")
+    with gzip.open(filename, "wt", encoding="utf-8") as f:
+        for i in range(ROWS):
+            f.write(f"Room{i % 9 + 1};{i % 40}.5;{700 + i % 300}\n")
+    return filename
+
+
+def bench(name: str, agent) -> float:
+    start = time.perf_counter()
+    agent.run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<30}{agent.stats.output / elapsed:>12.0f} rows/s")
+    return elapsed
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = create_file(tmpdir)
+        bench("sequential", NgsiAgentPull(Source.from_file(filename), SinkLatency(),
+                                          build_entity_sample_orion))
+        bench("pipeline", NgsiAgentPipeline(Source.from_file(filename), SinkLatency(),
+                                            build_entity_sample_orion))
+        bench("pipeline (2 workers)", NgsiAgentPipeline(Source.from_file(filename), SinkLatency(),
+                                                        build_entity_sample_orion, workers=2))
+
+
+if __name__ == '__main__':
+    main()
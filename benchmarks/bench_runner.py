@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measure how the multi-process runner scales with the number of processes.
+# The workload is CPU-bound : each row is converted to a NGSI entity then serialized to JSON.
+
+import os
+import sys
+import time
+import tempfile
+
+from os.path import join
+
+from pyngsi.sink import SinkNull
+from pyngsi.agent import build_entity_sample_orion
+from pyngsi.runner import NgsiAgentRunner, partition_bytes
+
+ROWS = 400000
+
+
+def create_file(tmpdir: str) -> str:
+    filename = join(tmpdir, "rooms.csv")
+    with open(filename, "w", encoding="utf-8") as f:
+        for i in range(ROWS):
+            f.write(f"Room{i % 9 + 1};{i % 40}.5;{700 + i % 300}\n")
+    return filename
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = create_file(tmpdir)
+        baseline = None
+        n = 1
+        while n <= os.cpu_count():
+            runner = NgsiAgentRunner(partition_bytes(filename, n), SinkNull,
+                                     build_entity_sample_orion, processes=n)
+            start = time.perf_counter()
+            runner.run()
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{n:>3} processes{runner.stats.output / elapsed:>12.0f} rows/s"
+                  f"{baseline / elapsed:>8.2f}x")
+            n *= 2
+
+
+if __name__ == '__main__':
+    main()
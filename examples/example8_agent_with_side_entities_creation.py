@@ -9,6 +9,10 @@ from pyngsi.sources.source import Row
 from pyngsi.sources.more_sources import SourceSampleOrion
 from pyngsi.sink import SinkStdout
 from pyngsi.ngsi import DataModel
+from pyngsi.cache import Cache
+
+# remember the side entities already created, not to send them again
+cache = Cache()
 
 
 def build_entity(row: Row) -> DataModel:
@@ -22,7 +26,10 @@ def build_entity(row: Row) -> DataModel:
 def side_effect(row, sink, datamodel):
     m = DataModel(
         id=f"Building:MainBuilding:Room:{datamodel['id']}", type="Room")
+    if not cache.changed(m["id"], m):
+        return 0 # already created
     sink.write(m.json())
+    cache.put(m["id"], m) # once written, else sent again next time
     return 1 # number of entities created in the side_effect function
 
 
@@ -2,17 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import threading
 
 from dataclasses import dataclass
 from shortuuid import uuid
 from loguru import logger
 from datetime import datetime
-from typing import Callable, Union
+from typing import Any, Callable, Union
 from abc import ABC, abstractmethod
 
 from pyngsi.sources.source import Row, Source, SourceStream
 from pyngsi.sink import Sink, SinkStdout
 from pyngsi.ngsi import DataModel
+from pyngsi.metrics import Metrics
+from pyngsi.checkpoint import Checkpoint
+from pyngsi.deadletter import DeadLetterStore
+from pyngsi.cache import Cache
 from pyngsi.sources.server import Server
 from pyngsi.__init__ import __version__
 
@@ -77,6 +82,8 @@ class NgsiAgent(ABC):
         filtered: int = 0
         error: int = 0
         side_entities: int = 0
+        deadletter: int = 0
+        dropped: int = 0
 
         def __add__(self, o):
             return NgsiAgent.Stats(self.input + o.input,
@@ -84,7 +91,9 @@ class NgsiAgent(ABC):
                                    self.output + o.output,
                                    self.filtered + o.filtered,
                                    self.error + o.error,
-                                   self.side_entities + o.side_entities)
+                                   self.side_entities + o.side_entities,
+                                   self.deadletter + o.deadletter,
+                                   self.dropped + o.dropped)
 
         def __iadd__(self, o):
             self.input += o.input
@@ -93,6 +102,8 @@ class NgsiAgent(ABC):
             self.filtered += o.filtered
             self.error += o.error
             self.side_entities += o.side_entities
+            self.deadletter += o.deadletter
+            self.dropped += o.dropped
             return self
 
         def zero(self):
@@ -102,6 +113,8 @@ class NgsiAgent(ABC):
             self.filtered = 0
             self.error = 0
             self.side_entities = 0
+            self.deadletter = 0
+            self.dropped = 0
             return self
 
 class NgsiAgentPull(NgsiAgent):
@@ -114,7 +127,11 @@ class NgsiAgentPull(NgsiAgent):
                  source: Source = None,
                  sink: Sink = None,
                  process: Callable = lambda row, *args, **kwargs: row.record,
-                 side_effect: Callable = None):
+                 side_effect: Callable = None,
+                 metrics: Metrics = None,
+                 checkpoint: Checkpoint = None,
+                 deadletter: DeadLetterStore = None,
+                 cache: Cache = None):
         logger.info("init NGSI agent")
         self.source = source if source else SourceStream(sys.stdin)
         logger.info(f"source = [{self.source.__class__.__name__}]")
@@ -123,15 +140,63 @@ class NgsiAgentPull(NgsiAgent):
         self.process = process
         self.side_effect = side_effect
         self.stats = NgsiAgent.Stats()
+        self.metrics = metrics if metrics else Metrics()
+        if checkpoint and not self.source.resumable:
+            raise NgsiException(f"{self.source.__class__.__name__} cannot be resumed from a checkpoint")
+        self.checkpoint = checkpoint
+        self.deadletter = deadletter
+        # the cache is not wiped by reset(), so that it lasts across runs
+        self.cache = cache
+        self.stopping = False
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """let the sink, the dead-letter store and the cache expose their gauges"""
+        self.sink.register_metrics(self.metrics)
+        if self.deadletter:
+            self.deadletter.register_metrics(self.metrics)
+        if self.cache:
+            self.cache.register_metrics(self.metrics)
 
     @property
     def status(self):
         return self.stats
 
+    def stop(self):
+        """stop the intake, the row being processed is completed"""
+        self.stopping = True
+        if self.source is not None:
+            self.source.stop()
+
+    def _rows(self):
+        iterator = iter(self.source)
+        while not self.stopping:
+            try:
+                row = next(iterator)
+            except StopIteration:
+                return
+            yield row
+
+    def resume(self):
+        """seek the source to the last checkpoint if any"""
+        if not self.checkpoint:
+            return
+        position = self.checkpoint.load()
+        if position is not None:
+            logger.info(f"resume source from {position}")
+            try:
+                self.source.seek(position)
+            except NotImplementedError as e:  # a composite source may only find out when seeking
+                logger.warning(f"{e} : start from the beginning")
+
     def run(self):
         logger.info("start to acquire data")
-        for row in self.source:
+        self.resume()
+        self.source.attach(self.stats)
+        self.source.attach_deadletter(self.deadletter)
+        for row in self._rows():
             logger.debug(row)
+            stage, msg = "process", None
             try:
                 if row.provider is None:
                     row.provider = "user"
@@ -143,27 +208,60 @@ class NgsiAgentPull(NgsiAgent):
                     continue
                 self.stats.processed += 1
                 msg = x.json() if isinstance(x, DataModel) else x
-                self.sink.write(msg)
+                stage = "sink"
+                with self.metrics.sink_latency.time():
+                    self.sink.write(msg)
                 self.stats.output += 1
                 if self.side_effect:
+                    stage = "side_effect"
                     side_entities = self.side_effect(row, self.sink, x)
                     self.stats.side_entities += side_entities
+                if self.checkpoint and self.checkpoint.acknowledge():
+                    self._save(self.source.position())
             except Exception as e:
                 self.stats.error += 1
                 logger.error(f"Cannot process record : {e}")
+                if self.deadletter:
+                    self.deadletter.append(row, stage, e, msg)
+                    self.stats.deadletter += 1
+        self._sink_failures()
+        if self.checkpoint and not self.stopping:
+            self.checkpoint.clear()  # the source has been entirely read
         return self
 
+    def _save(self, position: Any):
+        """save the position, a row without position leaving the last checkpoint in place"""
+        if position is not None:
+            self.checkpoint.save(position)
+
+    def _sink_failures(self, writer: int = None):
+        """account for the writes that failed once sink.write() had returned, i.e. in a SinkSharded lane"""
+        if not self.stopping:  # else the sink is flushed within the shutdown deadline
+            self.sink.flush()
+        for msg, e in self.sink.failures(writer):
+            logger.error(f"Cannot write message : {e}")
+            self.stats.output -= 1
+            self.stats.error += 1
+            if self.deadletter:
+                self.deadletter.append(Row(None, None), "sink", e, msg)  # the row is not known anymore
+                self.stats.deadletter += 1
+
     def close(self):
         logger.info("close NGSI agent")
         logger.info(self.status)
-        # logger.info(f"close source")
-        # self.source.close()
+        logger.info(f"close source")
+        self.source.close()
         logger.info(f"close sink")
         self.sink.close()
+        if self.deadletter:
+            self.deadletter.close()
+        if self.cache:
+            self.cache.save()
 
     def reset(self):
         self.source.reset()
         self.stats.zero()
+        self.stopping = False
 
 
 class NgsiAgentServer(NgsiAgent):
@@ -194,7 +292,9 @@ class NgsiAgentServer(NgsiAgent):
                  server: pyngsi.sources.server.Server = None,
                  sink: Sink = None,
                  process: Callable = lambda row, *args, **kwargs: row.record,
-                 side_effect: Callable[[Row, Sink, DataModel], int] = None):
+                 side_effect: Callable[[Row, Sink, DataModel], int] = None,
+                 deadletter: DeadLetterStore = None,
+                 cache: Cache = None):
         logger.info("init NGSI agent")
         self.server = server
         logger.info(f"server = [{self.server.__class__.__name__}]")
@@ -206,6 +306,14 @@ class NgsiAgentServer(NgsiAgent):
         logger.info(f"side_effect = [{self.side_effect}]")
         self.server_status = self.ServerStatus()
         self.stats = NgsiAgent.Stats()
+        self.metrics = Metrics()
+        self.sink.register_metrics(self.metrics)
+        self.deadletter = deadletter
+        if deadletter:
+            deadletter.register_metrics(self.metrics)
+        self.cache = cache
+        if cache:
+            cache.register_metrics(self.metrics)
 
     @property
     def status(self):
@@ -229,6 +337,29 @@ class NgsiAgentServer(NgsiAgent):
         self.server.close()
         logger.info(f"close sink")
         self.sink.close()
+        if self.cache:
+            self.cache.save()
+
+
+class NgsiAgentRequest(NgsiAgentPull):
+
+    """
+    The NgsiAgentRequest processes the content of one request received by a NgsiAgentServer
+
+    It shares the sink, the metrics and the dead-letter store of the server agent, registered once by the server agent.
+    Requests being processed concurrently, it only accounts for the failures of its own writes to the sink.
+    """
+
+    def __init__(self, source: Source, agent: NgsiAgentServer):
+        super().__init__(source, agent.sink, agent.process, agent.side_effect, agent.metrics,
+                         deadletter=agent.deadletter)
+
+    def _register_metrics(self):
+        pass
+
+    def _sink_failures(self):
+        # run() writes to the sink from the thread processing the request
+        super()._sink_failures(threading.get_ident())
 
 
 def build_entity_unknown(row: Row) -> DataModel:
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lookup cache for process() and side_effect.
+
+Reference data (i.e. vessel details by MMSI, berth by code) is looked up once then served from memory.
+The cache belongs to the agent but is not wiped by agent.reset(), hence it lasts across Scheduler runs.
+It can also be persisted to a local file to survive a restart.
+"""
+
+import os
+import pickle
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+from loguru import logger
+
+_MISSING = object()
+
+
+class CacheException(Exception):
+    pass
+
+
+@dataclass(eq=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class Cache():
+    """
+    A thread-safe LRU cache with optional time-to-live and persistence.
+
+    maxsize is the maximum number of entries, the least recently used entry being evicted first.
+    ttl is the lifetime of an entry in seconds, None for no expiration.
+    filename, if given, is where the cache is loaded from and saved to.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = None, filename: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.filename = filename
+        self.entries: OrderedDict = OrderedDict()  # key -> (value, expires)
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        if filename:
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.time():
+                    self.entries.move_to_end(key)
+                    if count:
+                        self.stats.hits += 1
+                    return value
+                del self.entries[key]
+                self.stats.expirations += 1
+            if count:
+                self.stats.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any, ttl: float = _MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[Hashable], Any]) -> Any:
+        """return the cached value, or compute it and cache it"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute(key)
+            self.put(key, value)
+        return value
+
+    def memoize(self, f: Callable) -> Callable:
+        """decorator caching the results of a function of one hashable argument"""
+        @wraps(f)
+        def wrapper(key):
+            return self.get_or_compute(key, f)
+        return wrapper
+
+    def prefetch(self, items: Iterable[Tuple[Hashable, Any]]):
+        """bulk load (key, value) pairs, i.e. from a reference table or a single remote query"""
+        n = 0
+        for key, value in items:
+            self.put(key, value)
+            n += 1
+        logger.info(f"prefetched {n} entries")
+
+    def changed(self, key: Hashable, value: Any) -> bool:
+        """
+        Tell whether the value differs from the cached one.
+
+        Useful for side_effect to skip re-sending entities it already created :
+        the entity is put() in the cache once written, so that it is sent again if the write failed.
+        """
+        return self.get(key, _MISSING) != value
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def register_metrics(self, metrics):
+        metrics.gauge("cache_entries", self.__len__, "Number of entries in the cache")
+        metrics.counter("cache_hits_total", lambda: self.stats.hits, "Number of cache hits")
+        metrics.counter("cache_misses_total", lambda: self.stats.misses, "Number of cache misses")
+        metrics.counter("cache_evictions_total", lambda: self.stats.evictions, "Number of cache evictions")
+
+    def load(self):
+        try:
+            with open(self.filename, "rb") as f:
+                entries: Dict = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            raise CacheException(f"cannot load cache {self.filename} : {e}")
+        now = time.time()
+        with self.lock:
+            for key, (value, expires) in entries.items():
+                if expires is None or expires > now:
+                    self.entries[key] = (value, expires)
+        logger.info(f"loaded {len(self.entries)} entries from {self.filename}")
+
+    def save(self):
+        if not self.filename:
+            return
+        tmpname = f"{self.filename}.tmp"
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            with open(tmpname, "wb") as f:
+                pickle.dump(entries, f)
+            os.replace(tmpname, self.filename)
+        except Exception as e:
+            raise CacheException(f"cannot save cache {self.filename} : {e}")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checkpoints allow an agent to restart without processing again the rows already written.
+
+The agent persists the Source position every n acknowledged writes.
+On restart the Source is resumed from the last persisted position.
+"""
+
+import json
+import os
+
+from typing import Any
+from loguru import logger
+
+
+class CheckpointException(Exception):
+    pass
+
+
+class Checkpoint():
+    """
+    A Checkpoint persists a Source position to a local JSON file.
+
+    The file is replaced atomically, so that a crash never leaves a partial checkpoint.
+    """
+
+    def __init__(self, filename: str, every: int = 100):
+        self.filename = filename
+        self.every = every
+        self.pending = 0
+
+    def load(self) -> Any:
+        """return the last persisted position, None if none"""
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            raise CheckpointException(f"cannot read checkpoint {self.filename} : {e}")
+
+    def acknowledge(self) -> bool:
+        """count an acknowledged write, return True when the position is due to be saved"""
+        self.pending += 1
+        return self.pending >= self.every
+
+    def save(self, position: Any):
+        tmpname = f"{self.filename}.tmp"
+        try:
+            with open(tmpname, "w", encoding="utf-8") as f:
+                json.dump(position, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpname, self.filename)
+        except Exception as e:
+            raise CheckpointException(f"cannot write checkpoint {self.filename} : {e}")
+        logger.debug(f"checkpoint {position=}")
+        self.pending = 0
+
+    def clear(self):
+        """forget the position, i.e. once the Source has been entirely read"""
+        self.pending = 0
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
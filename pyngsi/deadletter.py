@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dead-letter store for rows that failed to be processed or written.
+
+Failed rows are appended to a JSON Lines file (gzipped if the filename ends with .gz),
+along with the failing stage, the exception and a timestamp.
+Entries are flushed by batches (and on close), so that a gzipped store is not cut into tiny compressed blocks.
+Once the cause is fixed, the rows are replayed in bulk through a given process and sink.
+"""
+
+import gzip
+import json
+import os
+import time
+import tempfile
+import threading
+
+from datetime import datetime
+from typing import Callable, Iterator, Sequence
+from loguru import logger
+
+from pyngsi.sources.source import Row
+from pyngsi.sink import Sink
+from pyngsi.ngsi import DataModel
+
+
+class DeadLetterException(Exception):
+    pass
+
+
+class DeadLetterStore():
+    """
+    An append-only store of failed rows.
+
+    Each entry holds the row (provider and record), the stage (process, sink or side_effect),
+    the exception, the timestamp, and the message sent to the sink if any.
+    """
+
+    def __init__(self, filename: str, flush_every: int = 100):
+        self.filename = filename
+        self.compressed = filename.endswith(".gz")
+        self.flush_every = flush_every
+        self.lock = threading.RLock()  # replay() reads the entries under the lock
+        self.file = None
+        self.pending = 0  # entries written since the last flush
+        self.count = sum(1 for _ in self.entries())
+        self.replayed = 0
+        self.replay_rate = 0.0  # rows per second during the last replay
+
+    def _open(self, mode: str):
+        if self.compressed:
+            return gzip.open(self.filename, f"{mode}t", encoding="utf-8")
+        return open(self.filename, mode, encoding="utf-8")
+
+    def append(self, row: Row, stage: str, exception: Exception, msg: str = None):
+        entry = {"time": datetime.now().isoformat(),
+                 "stage": stage,
+                 "exception": f"{exception.__class__.__name__}: {exception}",
+                 "provider": row.provider,
+                 "record": row.record}
+        if msg is not None:
+            entry["msg"] = msg
+        self.append_entry(entry)
+
+    def append_entry(self, entry: dict):
+        line = json.dumps(entry, default=str)
+        with self.lock:
+            try:
+                if self.file is None:
+                    self.file = self._open("a")
+                self.file.write(f"{line}\n")
+                self.pending += 1
+                if self.pending >= self.flush_every:
+                    self.flush_file()
+            except Exception as e:
+                raise DeadLetterException(f"cannot write to dead-letter store {self.filename} : {e}")
+            self.count += 1
+
+    def flush(self):
+        with self.lock:
+            self.flush_file()
+
+    def flush_file(self):
+        if self.file and self.pending:
+            self.file.flush()
+            self.pending = 0
+
+    def entries(self) -> Iterator[dict]:
+        self.flush()
+        if not os.path.exists(self.filename):
+            return
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def size(self) -> int:
+        """size of the store in bytes"""
+        try:
+            return os.path.getsize(self.filename)
+        except OSError:
+            return 0
+
+    def register_metrics(self, metrics):
+        metrics.gauge("deadletter_entries", lambda: self.count,
+                      "Number of entries in the dead-letter store")
+        metrics.gauge("deadletter_bytes", self.size,
+                      "Size of the dead-letter store in bytes")
+        metrics.gauge("deadletter_replay_rows_per_second", lambda: self.replay_rate,
+                      "Throughput of the last replay")
+
+    def replay(self, sink: Sink, process: Callable = None,
+               side_effect: Callable = None, stages: Sequence[str] = None):
+        """
+        Push the stored rows back through process and sink.
+
+        Without process, the message previously built is sent as is (or the raw record for process failures).
+        Rows failing again remain in the store, as well as rows whose stage is not selected.
+        """
+        from pyngsi.agent import NgsiAgent
+        stats = NgsiAgent.Stats()
+        # a stale file left by an interrupted replay must not be merged into this one
+        fd, tmpname = tempfile.mkstemp(prefix=f"{os.path.basename(self.filename)}.",
+                                       suffix=".replay.gz" if self.compressed else ".replay",
+                                       dir=os.path.dirname(self.filename) or ".")
+        os.close(fd)
+        remaining = DeadLetterStore(tmpname)
+        start = time.perf_counter()
+        with self.lock:
+            self.close_file()
+            for entry in self.entries():
+                if stages and entry["stage"] not in stages:
+                    remaining.append_entry(entry)
+                    continue
+                stats.input += 1
+                row = Row(entry["provider"], entry["record"])
+                stage, msg = "process", None
+                try:
+                    x = None
+                    if process:
+                        x = process(row)
+                        if not x:
+                            stats.filtered += 1
+                            continue
+                        msg = x.json() if isinstance(x, DataModel) else x
+                    else:
+                        msg = entry.get("msg", entry["record"])
+                    stats.processed += 1
+                    stage = "sink"
+                    sink.write(msg)
+                    stats.output += 1
+                    if side_effect and x is not None:
+                        stage = "side_effect"
+                        stats.side_entities += side_effect(row, sink, x)
+                except Exception as e:
+                    stats.error += 1
+                    stats.deadletter += 1
+                    remaining.append(row, stage, e, msg)
+            remaining.close()
+            if remaining.count:
+                os.replace(tmpname, self.filename)
+            else:
+                os.remove(tmpname)
+                if os.path.exists(self.filename):
+                    os.remove(self.filename)
+            self.count = remaining.count
+        elapsed = time.perf_counter() - start
+        self.replayed += stats.output
+        self.replay_rate = stats.input / elapsed if elapsed > 0 else 0.0
+        logger.info(f"replayed {stats.input} rows in {elapsed:.3f}s ({self.replay_rate:.0f} rows/s) : {stats}")
+        return stats
+
+    def close_file(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.close_file()
@@ -2,14 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import ftplib
+import glob
+import os
+import posixpath
 import ssl
 import tempfile
 import shutil
+import time
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from queue import Queue
 from loguru import logger
 from ftplib import FTP, FTP_TLS
-from typing import List
-from os.path import basename, join
+from typing import IO, Dict, Iterator, List, Tuple
+from os.path import dirname, join, getsize, exists
 
 # https://stackoverflow.com/questions/14659154/ftpes-session-reuse-required
 class MyFTP_TLS(ftplib.FTP_TLS):
@@ -30,18 +39,41 @@ class FtpClientException(Exception):
 
 class FtpClient():
 
+    """
+    A FtpClient holds a connection to a FTP server, and downloads files into a temp dir.
+
+    The connection can be long-lived : alive() checks it with NOOP, ensure_connected() reconnects if needed,
+    and start_keepalive() sends NOOP in background to keep it open between uses.
+    The temp dir is created on the first download and removed by clean(), hence once per use of the connection.
+    When tmpdir is given, files are downloaded there and the temp dir is left to its owner.
+    """
+
     def __init__(self, host: str, user: str = "anonymous",
-                 passwd: str = "guest", use_tls: bool = False):
+                 passwd: str = "guest", use_tls: bool = False, tmpdir: str = None):
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.use_tls = use_tls
+        self.lock = threading.RLock()  # a FTP connection handles one command at a time
+        self.keepalive: threading.Event = None
+        self.own_tmpdir = tmpdir is None
+        self.tmpdir = tmpdir
+        self.connect()
+
+    def connect(self):
         logger.debug("Connect to FTP server")
-        if use_tls:
-            self.ftp = MyFTP_TLS(host)
-            self.ftp.ssl_version = ssl.PROTOCOL_TLS
-        else:
-            self.ftp = FTP(host)
         try:
-            self.ftp.login(user, passwd)
+            if self.use_tls:
+                self.ftp = MyFTP_TLS(self.host)
+                self.ftp.ssl_version = ssl.PROTOCOL_TLS
+            else:
+                self.ftp = FTP(self.host)
+        except ftplib.all_errors as e:
+            raise FtpClientException(f"Cannot connect : {e}")
+        try:
+            self.ftp.login(self.user, self.passwd)
             self.ftp.set_pasv(True)
-            if use_tls:
+            if self.use_tls:
                 self.ftp.prot_p()
         except ftplib.error_perm as e:
             error_code = int(str(e).split()[0])
@@ -51,30 +83,137 @@ class FtpClient():
                 raise FtpClientException(f"Cannot connect : {e}")
         except ftplib.all_errors as e:
             raise FtpClientException(f"Cannot connect : {e}")
+
+    def alive(self) -> bool:
+        """check the connection with NOOP"""
         try:
-            # create temp dir to receive future downloads
-            self.tmpdir = tempfile.mkdtemp()
-        except Exception as e:
-            logger.critical(f"Cannot create temp dir : {e}")
+            with self.lock:
+                self.ftp.voidcmd("NOOP")
+            return True
+        except (*ftplib.all_errors, AttributeError) as e:
+            logger.info(f"FTP connection lost : {e}")
+            return False
+
+    def ensure_connected(self):
+        """reconnect if the connection has been lost, i.e. closed by the server while idle"""
+        if self.alive():
+            return
+        with self.lock:
+            try:
+                self.ftp.close()
+            except Exception:
+                pass
+            self.connect()
+        logger.info("Reconnected to FTP server")
+
+    def start_keepalive(self, interval: float = 60):
+        """send NOOP every interval seconds while the connection is idle"""
+        if self.keepalive:
+            return
+        self.keepalive = threading.Event()
+        threading.Thread(target=self._keepalive, args=(self.keepalive, interval),
+                         name="ftp-keepalive", daemon=True).start()
+
+    def _keepalive(self, stopped: threading.Event, interval: float):
+        while not stopped.wait(interval):
+            if self.lock.acquire(blocking=False):  # busy means alive
+                try:
+                    self.ftp.voidcmd("NOOP")
+                except ftplib.all_errors as e:
+                    logger.warning(f"FTP keepalive failed : {e}")
+                finally:
+                    self.lock.release()
+
+    def stop_keepalive(self):
+        if self.keepalive:
+            self.keepalive.set()
+            self.keepalive = None
+
+    def _local(self, remote: str) -> str:
+        """the local filename of a remote file, the remote folders are kept so that /a/x.csv and /b/x.csv differ"""
+        if self.tmpdir is None:
+            try:
+                # create temp dir to receive downloads
+                self.tmpdir = tempfile.mkdtemp()
+            except Exception as e:
+                logger.critical(f"Cannot create temp dir : {e}")
+        local = join(self.tmpdir, posixpath.normpath(f"/{remote}").lstrip("/"))
+        os.makedirs(dirname(local), exist_ok=True)
+        return local
 
     def retrieve_filelist(self, path: str) -> List[str]:
         filelist: List[str] = []
-        self.ftp.retrlines(f"NLST {path}", filelist.append)
+        with self.lock:
+            self.ftp.retrlines(f"NLST {path}", filelist.append)
         return filelist
 
-    def download(self, remote: str) -> str:
+    def retrieve_facts(self, path: str) -> List[Tuple[str, dict]]:
+        """list the files of a remote folder along with their size and modify time, using MLSD"""
+        try:
+            with self.lock:
+                entries = list(self.ftp.mlsd(path, facts=["type", "size", "modify"]))
+        except ftplib.error_perm as e:  # MLSD not supported, no facts
+            logger.warning(f"Cannot list {path} with MLSD : {e}")
+            return [(remote, {}) for remote in self.retrieve_filelist(path)]
+        return [(posixpath.join(path, name), facts) for name, facts in entries
+                if facts.get("type", "file") == "file"]
+
+    def download(self, remote: str, resume: bool = False, version: str = "") -> str:
+        """
+        Download a remote file into the temp dir.
+
+        With resume, the file is first downloaded into a .part file, kept when the transfer is interrupted.
+        The next download resumes from the end of the .part file (REST), provided that the remote version is the same.
+        """
         logger.debug(f"Download file {remote}")
+        local = self._local(remote)
         try:
-            local = join(self.tmpdir, basename(remote))
-            handle = open(local, 'wb')
-            self.ftp.retrbinary(f"RETR {remote}", handle.write)
-            handle.close()
+            if not resume:
+                with open(local, 'wb') as handle, self.lock:
+                    self.ftp.retrbinary(f"RETR {remote}", handle.write)
+                return local
+            part = f"{local}.{version}.part" if version else f"{local}.part"
+            for stale in glob.glob(f"{glob.escape(local)}.*part"):  # previous versions
+                if stale != part:
+                    os.remove(stale)
+            offset = getsize(part) if exists(part) else 0
+            if offset:
+                logger.info(f"Resume download of {remote} from {offset}")
+            with open(part, 'ab') as handle, self.lock:
+                self.ftp.retrbinary(f"RETR {remote}", handle.write, rest=offset or None)
+            os.replace(part, local)
         except Exception as e:
             raise FtpClientException(f"Cannot download {remote} : {e}")
         return local
 
+    @contextmanager
+    def stream(self, remote: str) -> Iterator[IO[bytes]]:
+        """open a remote file as a binary stream read while being transferred"""
+        logger.debug(f"Stream file {remote}")
+        with self.lock:
+            try:
+                self.ftp.voidcmd("TYPE I")
+                conn = self.ftp.transfercmd(f"RETR {remote}")
+            except ftplib.all_errors as e:
+                raise FtpClientException(f"Cannot stream {remote} : {e}")
+            try:
+                with conn.makefile("rb") as f:
+                    yield f
+            finally:
+                if isinstance(conn, ssl.SSLSocket):
+                    try:
+                        conn.unwrap()
+                    except (ssl.SSLError, OSError):
+                        pass
+                conn.close()
+                try:
+                    self.ftp.voidresp()
+                except ftplib.all_errors as e:  # i.e. the transfer has been aborted
+                    logger.warning(f"End of transfer {remote} : {e}")
+
     def close(self):
         logger.debug("Disconnect from FTP server")
+        self.stop_keepalive()
         try:
             self.ftp.quit()
             self.ftp.close()
@@ -82,8 +221,150 @@ class FtpClient():
             raise FtpClientException(f"Cannot disconnect : {e}")
 
     def clean(self):
-        if self.tmpdir:
+        """remove the temp dir and the files downloaded, a new one is created by the next download"""
+        if self.tmpdir and self.own_tmpdir:
             try:
                 shutil.rmtree(self.tmpdir)
             except Exception as e:
                 logger.error(f"Cannot remove temp directory : {e}")
+            self.tmpdir = None
+
+
+@dataclass
+class FtpStats:
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0  # wall-clock time of the downloads
+    retries: int = 0
+    errors: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """aggregate throughput in bytes per second"""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.files} files, {self.bytes} bytes in {self.seconds:.3f}s "
+                f"({self.throughput / 1024:.1f} KiB/s), {self.retries} retries, {self.errors} errors")
+
+
+class FtpClientPool():
+
+    """
+    A FtpClientPool downloads files in parallel over a pool of connections to the same FTP server.
+
+    Each connection is a FtpClient, with its own login and, using TLS, its own shared TLS session.
+    A failed download is retried up to retries times on a new connection, after a delay of backoff seconds.
+    Files are downloaded into a temp dir shared by the connections, removed by clean(), or into tmpdir if given.
+    The connections can be reused by subsequent download_all(), refresh() reopens the ones lost while idle.
+    """
+
+    def __init__(self, host: str, user: str = "anonymous", passwd: str = "guest", use_tls: bool = False,
+                 size: int = 4, retries: int = 2, backoff: float = 1.0, tmpdir: str = None):
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.use_tls = use_tls
+        self.size = size
+        self.retries = retries
+        self.backoff = backoff
+        self.own_tmpdir = tmpdir is None
+        self.tmpdir = tmpdir  # created by download_all() if None
+        self.clients: Queue = Queue()
+        for _ in range(size):
+            self.clients.put(None)  # connections are opened on demand
+        self.connected: List[FtpClient] = []
+        self.lock = threading.Lock()
+        self.stats = FtpStats()
+
+    def _connect(self) -> FtpClient:
+        client = FtpClient(self.host, self.user, self.passwd, self.use_tls, tmpdir=self.tmpdir)
+        with self.lock:
+            self.connected.append(client)
+        return client
+
+    def _discard(self, client: FtpClient):
+        with self.lock:
+            self.connected.remove(client)
+        try:
+            client.close()
+        except FtpClientException:
+            pass
+
+    def _download(self, remote: str, versions: Dict[str, str] = None) -> str:
+        client = self.clients.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    if client is None:
+                        client = self._connect()
+                    client.tmpdir = self.tmpdir
+                    if versions is None:
+                        local = client.download(remote)
+                    else:
+                        local = client.download(remote, resume=True, version=versions.get(remote, ""))
+                    with self.lock:
+                        self.stats.files += 1
+                        self.stats.bytes += getsize(local)
+                    return local
+                except (FtpClientException, OSError, EOFError) as e:
+                    if attempt == self.retries:
+                        with self.lock:
+                            self.stats.errors += 1
+                        raise FtpClientException(f"Cannot download {remote} after {attempt + 1} attempts : {e}")
+                    logger.warning(f"Retry download of {remote} : {e}")
+                    with self.lock:
+                        self.stats.retries += 1
+                    if client is not None:
+                        self._discard(client)
+                        client = None
+                    time.sleep(self.backoff * (attempt + 1))
+        finally:
+            self.clients.put(client)
+
+    def download_all(self, remotes: List[str], versions: Dict[str, str] = None) -> List[Tuple[str, str]]:
+        """
+        Download the files in parallel, return the (local_filename, remote_filename) downloaded in order.
+
+        Given the versions of the remote files, downloads are resumable, see FtpClient.download().
+        """
+        if self.tmpdir is None:
+            self.tmpdir = tempfile.mkdtemp()
+        downloaded = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.size, thread_name_prefix="ftp") as executor:
+            futures = [(remote, executor.submit(self._download, remote, versions)) for remote in remotes]
+            for remote, future in futures:
+                try:
+                    downloaded.append((future.result(), remote))
+                except FtpClientException as e:
+                    logger.error(e)
+        self.stats.seconds += time.perf_counter() - start
+        logger.info(f"Downloaded {self.stats}")
+        return downloaded
+
+    def refresh(self):
+        """close the idle connections lost, i.e. closed by the server, they are reopened on demand"""
+        for _ in range(self.size):
+            client = self.clients.get()
+            if client is not None and not client.alive():
+                self._discard(client)
+                client = None
+            self.clients.put(client)
+
+    def close(self):
+        for client in list(self.connected):
+            self._discard(client)
+        while not self.clients.empty():
+            self.clients.get()
+        for _ in range(self.size):
+            self.clients.put(None)
+
+    def clean(self):
+        if not self.own_tmpdir or self.tmpdir is None:
+            return
+        try:
+            shutil.rmtree(self.tmpdir)
+        except Exception as e:
+            logger.error(f"Cannot remove temp directory : {e}")
+        self.tmpdir = None
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compiled JSONPath expressions.
+
+Supported syntax :
+    $                     the root
+    .name or ['name']     child
+    .* or [*]             wildcard
+    ..name or ..*         recursive descent
+    [n] [start:end:step]  index and slice, negative values allowed
+    [0,2] ['a','b']       union
+    [?(@.name)]           filter on existence
+    [?(@.name op value)]  filter on comparison, op is one of == != < <= > >=
+
+An expression is compiled once into a chain of generators.
+Evaluating it never materializes intermediate lists.
+"""
+
+import json
+import re
+
+from typing import Any, Callable, Iterator, List
+
+Step = Callable[[Iterator], Iterator]
+
+
+class JsonPathException(Exception):
+    pass
+
+
+_NAME = re.compile(r"[A-Za-z_$@\-][\w\-$@]*")
+_FILTER = re.compile(r"\?\(\s*@((?:\.[\w\-]+|\[[^\]]*\])*)\s*(?:(==|!=|<=|>=|<|>)\s*(.+?))?\s*\)$", re.S)
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class JsonPath():
+    """
+    A compiled JSONPath expression.
+
+    find() returns a generator of the matching values.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.steps: List[Step] = _parse(expr)
+
+    def find(self, obj: Any) -> Iterator:
+        matches = iter((obj,))
+        for step in self.steps:
+            matches = step(matches)
+        return matches
+
+    def __repr__(self):
+        return f"JsonPath({self.expr!r})"
+
+
+def _child(name: str) -> Step:
+    def step(nodes):
+        for n in nodes:
+            if isinstance(n, dict) and name in n:
+                yield n[name]
+    return step
+
+
+def _wildcard(nodes):
+    for n in nodes:
+        if isinstance(n, dict):
+            yield from n.values()
+        elif isinstance(n, list):
+            yield from n
+
+
+def _index(i: int) -> Step:
+    def step(nodes):
+        for n in nodes:
+            if isinstance(n, list) and -len(n) <= i < len(n):
+                yield n[i]
+    return step
+
+
+def _slice(s: slice) -> Step:
+    def step(nodes):
+        for n in nodes:
+            if isinstance(n, list):
+                for i in range(*s.indices(len(n))):
+                    yield n[i]
+    return step
+
+
+def _union(selectors: List[Step]) -> Step:
+    def step(nodes):
+        for n in nodes:
+            for selector in selectors:
+                yield from selector(iter((n,)))
+    return step
+
+
+def _walk(node):
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        if isinstance(n, dict):
+            stack.extend(reversed(list(n.values())))
+        elif isinstance(n, list):
+            stack.extend(reversed(n))
+
+
+def _descendants(nodes):
+    for n in nodes:
+        yield from _walk(n)
+
+
+def _filter(predicate: Callable[[Any], bool]) -> Step:
+    def step(nodes):
+        for n in nodes:
+            children = n.values() if isinstance(n, dict) else n if isinstance(n, list) else ()
+            for c in children:
+                if predicate(c):
+                    yield c
+    return step
+
+
+def _literal(text: str) -> Any:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1]
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise JsonPathException(f"invalid literal {text}")
+
+
+def _predicate(expr: str) -> Callable[[Any], bool]:
+    m = _FILTER.match(expr)
+    if not m:
+        raise JsonPathException(f"invalid filter {expr}")
+    subpath, op, literal = m.groups()
+    steps = _parse(subpath) if subpath else []
+    missing = object()
+
+    def get(c):
+        matches = iter((c,))
+        for step in steps:
+            matches = step(matches)
+        return next(matches, missing)
+
+    if op is None:
+        return lambda c: get(c) is not missing
+    compare, value = _OPERATORS[op], _literal(literal)
+
+    def predicate(c):
+        v = get(c)
+        if v is missing:
+            return False
+        try:
+            return compare(v, value)
+        except TypeError:
+            return False
+    return predicate
+
+
+def _split_union(content: str) -> List[str]:
+    parts, current, quote = [], "", None
+    for ch in content:
+        if quote:
+            current += ch
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+            current += ch
+        elif ch == ",":
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    parts.append(current.strip())
+    return parts
+
+
+def _selector(part: str) -> Step:
+    if part == "*":
+        return _wildcard
+    if len(part) >= 2 and part[0] == part[-1] and part[0] in "'\"":
+        return _child(part[1:-1])
+    if ":" in part:
+        try:
+            bounds = [int(x) if x.strip() else None for x in part.split(":")]
+        except ValueError:
+            raise JsonPathException(f"invalid slice [{part}]")
+        if len(bounds) > 3:
+            raise JsonPathException(f"invalid slice [{part}]")
+        return _slice(slice(*bounds))
+    try:
+        return _index(int(part))
+    except ValueError:
+        raise JsonPathException(f"invalid selector [{part}]")
+
+
+def _bracket(content: str) -> Step:
+    content = content.strip()
+    if content.startswith("?"):
+        return _filter(_predicate(content))
+    parts = _split_union(content)
+    if len(parts) == 1:
+        return _selector(parts[0])
+    return _union([_selector(p) for p in parts])
+
+
+def _closing(expr: str, i: int) -> int:
+    """return the index of the bracket closing the one at i"""
+    depth, quote = 0, None
+    for j in range(i, len(expr)):
+        ch = expr[j]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+            if depth == 0:
+                return j
+    raise JsonPathException(f"unbalanced brackets in {expr}")
+
+
+def _parse(expr: str) -> List[Step]:
+    steps: List[Step] = []
+    i = 0
+    if expr.startswith("$") or expr.startswith("@"):
+        i = 1
+    elif expr and expr[0] not in ".[":
+        expr = "." + expr
+    while i < len(expr):
+        if expr.startswith("..", i):
+            steps.append(_descendants)
+            i += 2
+            if i < len(expr) and expr[i] == "[":
+                continue
+        elif expr[i] == ".":
+            i += 1
+        elif expr[i] == "[":
+            j = _closing(expr, i)
+            steps.append(_bracket(expr[i + 1:j]))
+            i = j + 1
+            continue
+        else:
+            raise JsonPathException(f"unexpected '{expr[i]}' at {i} in {expr}")
+        if i < len(expr) and expr[i] == "*":
+            steps.append(_wildcard)
+            i += 1
+            continue
+        m = _NAME.match(expr, i)
+        if not m:
+            raise JsonPathException(f"expected a name at {i} in {expr}")
+        steps.append(_child(m.group()))
+        i = m.end()
+    return steps
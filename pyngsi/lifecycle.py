@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Graceful shutdown.
+
+On SIGTERM/SIGINT the Lifecycle stops the intake, lets the in-flight rows go through process,
+then flushes the sinks within a deadline and closes them.
+Messages still buffered when the deadline expires are discarded and counted as dropped.
+"""
+
+import signal
+import threading
+import time
+
+from typing import Callable, List, Sequence
+from loguru import logger
+
+from pyngsi.sink import Sink
+
+
+class Lifecycle():
+    """
+    Lifecycle handles shutdown signals for the components registered with on_stop().
+    """
+
+    def __init__(self, deadline: float = 30,
+                 signals: Sequence[signal.Signals] = (signal.SIGTERM, signal.SIGINT)):
+        self.deadline = deadline
+        self.signals = signals
+        self.stopping = threading.Event()
+        self.callbacks: List[Callable[[], None]] = []
+        self.flushed = True  # false when writes were still in progress at the deadline
+
+    def install(self):
+        """install the signal handlers, must be called from the main thread"""
+        try:
+            for signum in self.signals:
+                signal.signal(signum, self.handle_signal)
+        except ValueError as e:
+            logger.warning(f"Cannot install signal handlers : {e}")
+        return self
+
+    def on_stop(self, callback: Callable[[], None]):
+        """register a callback that stops the intake"""
+        self.callbacks.append(callback)
+
+    def handle_signal(self, signum, frame):
+        logger.info(f"Received signal {signal.Signals(signum).name}")
+        self.stop()
+
+    def stop(self):
+        if self.stopping.is_set():
+            return
+        logger.info("Stop intake")
+        self.stopping.set()
+        for callback in self.callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error while stopping : {e}")
+
+    @property
+    def stopped(self) -> bool:
+        return self.stopping.is_set()
+
+    def flush(self, sink: Sink, deadline: float = None) -> int:
+        """flush the sink within the deadline, return the number of messages dropped"""
+        deadline = self.deadline if deadline is None else deadline
+        start = time.monotonic()
+        t = threading.Thread(target=sink.flush, name="sink-flush", daemon=True)
+        t.start()
+        t.join(deadline)
+        self.flushed = True
+        dropped = 0
+        if t.is_alive():
+            dropped = sink.discard()
+            logger.warning(f"Flush deadline of {deadline}s expired : {dropped} messages dropped")
+            # the writes in progress are given what is left of the deadline, i.e. nothing if expired
+            t.join(max(0.0, deadline - (time.monotonic() - start)))
+            if t.is_alive():
+                logger.warning(f"Sink not flushed, writes in progress : {', '.join(sink.busy()) or t.name}")
+                self.flushed = False
+                return dropped
+        logger.info(f"Sink flushed in {time.monotonic() - start:.3f}s")
+        return dropped
+
+    def shutdown(self, agent) -> int:
+        """flush and close the sink of the agent, record the dropped messages in the agent statistics"""
+        dropped = self.flush(agent.sink)
+        agent.stats.dropped += dropped
+        if not self.flushed:  # closing the sink would wait for the writes in progress
+            logger.warning("Agent not closed, the deadline has expired")
+            return dropped
+        agent.close()
+        return dropped
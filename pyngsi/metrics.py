@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Metrics exposed in the Prometheus text exposition format.
+
+Metrics are collected in memory while the agent is running.
+Rendering them never involves a remote call, hence the /metrics endpoint is cheap to scrape.
+"""
+
+import os
+import time
+import threading
+
+from bisect import bisect_left
+from dataclasses import fields
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram():
+    """
+    A thread-safe cumulative histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """return a context manager that observes the elapsed time of its block"""
+        return _Timer(self)
+
+    def expose(self, name: str, help: str = "", labels: str = "") -> List[str]:
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        sep = "," if labels else ""
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, c in zip(self.buckets, counts):
+            cumulative += c
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {total}")
+        lines.append(f"{name}_count{suffix} {count}")
+        return lines
+
+
+class _Timer():
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics():
+    """
+    Metrics holds the sink latency histogram and a set of gauges and counters.
+
+    A gauge is a callable evaluated at scrape time, i.e. the size of a queue.
+    A counter is evaluated the same way but only goes up, i.e. a number of cache hits.
+    Components such as pipelines or buffered sinks register their own gauges and counters.
+    """
+
+    def __init__(self, prefix: str = "pyngsi"):
+        self.prefix = prefix
+        self.sink_latency = Histogram()
+        self.gauges: Dict[Tuple[str, str], Tuple[str, Callable[[], float], str]] = {}
+        self.lock = threading.Lock()
+
+    def gauge(self, name: str, func: Callable[[], float], help: str = "", labels: str = ""):
+        """register a gauge evaluated each time metrics are exposed"""
+        with self.lock:
+            self.gauges[(name, labels)] = (help, func, "gauge")
+
+    def counter(self, name: str, func: Callable[[], float], help: str = "", labels: str = ""):
+        """register a counter, a monotonic value evaluated each time metrics are exposed"""
+        with self.lock:
+            self.gauges[(name, labels)] = (help, func, "counter")
+
+    def unregister_gauge(self, name: str, labels: str = ""):
+        with self.lock:
+            self.gauges.pop((name, labels), None)
+
+    def expose(self, status=None, stats=None) -> str:
+        """
+        Render the metrics.
+
+        :param status: either a SchedulerStatus or a ServerStatus
+        :param stats: the cumulated agent statistics
+        """
+        p = self.prefix
+        lines: List[str] = []
+        if status is not None:
+            lines += _counter(f"{p}_calls_total",
+                              "Number of calls", status.calls)
+            lines += _counter(f"{p}_calls_success_total",
+                              "Number of successful calls", status.calls_success)
+            lines += _counter(f"{p}_calls_error_total",
+                              "Number of failed calls", status.calls_error)
+            if status.starttime:
+                lines += _gauge(f"{p}_start_time_seconds", "Start time since epoch",
+                                status.starttime.timestamp())
+            if status.lastcalltime:
+                lines += _gauge(f"{p}_last_call_time_seconds", "Last call time since epoch",
+                                status.lastcalltime.timestamp())
+        if stats is not None:
+            for f in fields(stats):
+                lines += _counter(f"{p}_rows_{f.name}_total",
+                                  f"Number of rows {f.name}", getattr(stats, f.name))
+        lines += self.sink_latency.expose(f"{p}_sink_write_duration_seconds",
+                                          "Time spent writing to the sink")
+        with self.lock:
+            gauges = sorted(self.gauges.items())
+        declared = set()
+        for (name, labels), (help, func, kind) in gauges:
+            try:
+                value = func()
+            except Exception:
+                continue
+            if name not in declared:
+                lines += [f"# HELP {p}_{name} {help}",
+                          f"# TYPE {p}_{name} {kind}"]
+                declared.add(name)
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{p}_{name}{suffix} {value}")
+        lines += _gauge("process_resident_memory_bytes",
+                        "Resident memory size in bytes", process_memory())
+        lines += _counter("process_cpu_seconds_total",
+                          "Total user and system CPU time spent in seconds", time.process_time())
+        return "\n".join(lines) + "\n"
+
+
+def _counter(name: str, help: str, value) -> List[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {value}"]
+
+
+def _gauge(name: str, help: str, value) -> List[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+def process_memory() -> int:
+    """return the resident set size of the current process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Threaded pipeline mode for pull agents.
+
+The source read-ahead, the processing and the sink run in their own threads, connected by bounded queues.
+Reading (i.e. gzip decompression), processing and HTTP writes can overlap,
+while the bounded queues provide backpressure and keep memory bounded.
+"""
+
+import threading
+
+from queue import Queue
+from typing import Callable
+from loguru import logger
+
+from pyngsi.agent import NgsiAgent, NgsiAgentPull, NgsiException
+from pyngsi.sources.source import Source
+from pyngsi.sink import Sink
+from pyngsi.ngsi import DataModel
+from pyngsi.metrics import Metrics
+from pyngsi.checkpoint import Checkpoint
+from pyngsi.deadletter import DeadLetterStore
+from pyngsi.cache import Cache
+
+_END = object()  # end-of-stream marker
+
+
+class NgsiAgentPipeline(NgsiAgentPull):
+
+    """
+    The NgsiAgentPipeline pulls rows from the datasource as the NgsiAgentPull does, using a threaded pipeline.
+
+    read_ahead is the maximum number of rows read in advance from the source.
+    queue_size is the maximum number of processed messages waiting for the sink.
+    workers is the number of processing threads. With more than one worker, rows may be written out of order.
+    Hence checkpoints require a single worker.
+    """
+
+    def __init__(self,
+                 source: Source = None,
+                 sink: Sink = None,
+                 process: Callable = lambda row, *args, **kwargs: row.record,
+                 side_effect: Callable = None,
+                 metrics: Metrics = None,
+                 checkpoint: Checkpoint = None,
+                 deadletter: DeadLetterStore = None,
+                 cache: Cache = None,
+                 read_ahead: int = 1024,
+                 queue_size: int = 1024,
+                 workers: int = 1):
+        if checkpoint and workers > 1:
+            raise NgsiException("Checkpoints require a single worker")
+        super().__init__(source, sink, process, side_effect, metrics, checkpoint, deadletter, cache)
+        self.read_ahead = read_ahead
+        self.queue_size = queue_size
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.failure: Exception = None
+
+    def run(self):
+        logger.info("start to acquire data in pipeline mode")
+        rows = Queue(self.read_ahead)
+        msgs = Queue(self.queue_size)
+        self.failure = None
+        self.metrics.gauge("pipeline_queue_depth", rows.qsize,
+                           "Number of items waiting in the pipeline", 'stage="process"')
+        self.metrics.gauge("pipeline_queue_depth", msgs.qsize,
+                           "Number of items waiting in the pipeline", 'stage="sink"')
+        reader = threading.Thread(target=self._read, args=(rows,),
+                                  name="pipeline-reader", daemon=True)
+        processors = [threading.Thread(target=self._process, args=(rows, msgs),
+                                       name=f"pipeline-process-{i}", daemon=True)
+                      for i in range(self.workers)]
+        writer = threading.Thread(target=self._write, args=(msgs,),
+                                  name="pipeline-writer", daemon=True)
+        self.resume()
+        # rows filtered or rejected by the source are counted apart, by the reader thread only
+        source_stats = NgsiAgent.Stats()
+        self.source.attach(source_stats)
+        self.source.attach_deadletter(self.deadletter)
+        for t in [reader, writer, *processors]:
+            t.start()
+        reader.join()
+        for t in processors:
+            t.join()
+        msgs.put(_END)
+        writer.join()
+        self.stats.filtered += source_stats.filtered
+        self.stats.error += source_stats.error
+        self.stats.deadletter += source_stats.deadletter
+        self._sink_failures()
+        if self.failure:
+            raise self.failure
+        if self.checkpoint and not self.stopping:
+            self.checkpoint.clear()  # the source has been entirely read
+        return self
+
+    def _read(self, rows: Queue):
+        try:
+            for row in self._rows():
+                logger.debug(row)
+                if row.provider is None:
+                    row.provider = "user"
+                self.stats.input += 1
+                # the position travels along with the row until the write is acknowledged
+                position = self.source.position() if self.checkpoint else None
+                rows.put((row, position))
+        except Exception as e:
+            logger.error(f"Cannot read source : {e}")
+            self.failure = e
+        finally:
+            for _ in range(self.workers):
+                rows.put(_END)
+
+    def _process(self, rows: Queue, msgs: Queue):
+        while (item := rows.get()) is not _END:
+            row, position = item
+            try:
+                logger.trace(f"{row.provider=}\t{row.record=}")
+                x = self.process(row)
+                if not x:
+                    with self.lock:
+                        self.stats.filtered += 1
+                    continue
+                with self.lock:
+                    self.stats.processed += 1
+                msg = x.json() if isinstance(x, DataModel) else x
+                msgs.put((row, x, msg, position))
+            except Exception as e:
+                self._failed(row, "process", e)
+
+    def _write(self, msgs: Queue):
+        while (item := msgs.get()) is not _END:
+            row, x, msg, position = item
+            stage = "sink"
+            try:
+                with self.metrics.sink_latency.time():
+                    self.sink.write(msg)
+                with self.lock:
+                    self.stats.output += 1
+                if self.side_effect:
+                    stage = "side_effect"
+                    side_entities = self.side_effect(row, self.sink, x)
+                    with self.lock:
+                        self.stats.side_entities += side_entities
+                if self.checkpoint and self.checkpoint.acknowledge():
+                    self._save(position)
+            except Exception as e:
+                self._failed(row, stage, e, msg)
+
+    def _failed(self, row, stage: str, e: Exception, msg=None):
+        logger.error(f"Cannot process record : {e}")
+        with self.lock:
+            self.stats.error += 1
+        if self.deadletter:
+            self.deadletter.append(row, stage, e, msg)
+            with self.lock:
+                self.stats.deadletter += 1
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Multi-process runner for pull agents.
+
+The input is split into partitions, each partition being read by a NgsiAgentPull in a worker process.
+Each worker owns its sink, hence its connection. Statistics are aggregated in the parent process.
+
+Partitions, sink factory, process and side_effect are given to worker processes.
+On platforms where processes are not forked (i.e. Windows, macOS) they must be picklable : prefer module-level functions.
+"""
+
+import glob
+import os
+import zlib
+import multiprocessing
+import queue
+
+from functools import partial
+from typing import Callable, List, Sequence
+from loguru import logger
+
+from pyngsi.agent import NgsiAgent, NgsiAgentPull, NgsiException
+from pyngsi.sources.source import Source, SourceFileRange
+from pyngsi.sink import Sink, SinkStdout
+
+# a partition creates the Source to be read by a worker
+Partition = Callable[[], Source]
+
+
+def record(row, *args, **kwargs):
+    """the record of the row, default key and process, a module-level function being picklable"""
+    return row.record
+
+
+def partition_files(patterns: Sequence[str]) -> List[Partition]:
+    """one partition per file matching the glob patterns"""
+    filenames = sorted(set(f for p in patterns for f in glob.glob(p)))
+    return [partial(Source.from_file, f) for f in filenames]
+
+
+def partition_bytes(filename: str, n: int) -> List[Partition]:
+    """n partitions of a large uncompressed text file, split into newline-aligned byte ranges"""
+    return [partial(SourceFileRange, filename, start, end)
+            for start, end in SourceFileRange.split(filename, n)]
+
+
+def partition_hash(factory: Partition, n: int, key: Callable = record) -> List[Partition]:
+    """n partitions of the same input, each keeping the rows whose key hashes to its index"""
+    return [partial(SourceShard, factory, i, n, key) for i in range(n)]
+
+
+class SourceShard(Source):
+
+    """
+    A SourceShard delivers the rows of a Source whose key hashes to a given shard index.
+    """
+
+    def __init__(self, factory: Partition, index: int, count: int, key: Callable = record):
+        self.source = factory()
+        self.index = index
+        self.count = count
+        self.key = key
+
+    def __iter__(self):
+        for row in self.source:
+            if zlib.crc32(str(self.key(row)).encode("utf-8")) % self.count == self.index:
+                yield row
+
+
+def _work(partitions: Sequence[Partition], sink_factory: Callable[[], Sink],
+          process: Callable, side_effect: Callable, results):
+    stats = NgsiAgent.Stats()
+    try:
+        sink = sink_factory()
+        try:
+            for partition in partitions:
+                agent = NgsiAgentPull(partition(), sink, process, side_effect)
+                agent.run()
+                stats += agent.stats
+        finally:
+            sink.close()
+        results.put((os.getpid(), stats, None))
+    except Exception as e:
+        results.put((os.getpid(), stats, str(e)))
+
+
+class NgsiAgentRunner(NgsiAgent):
+
+    """
+    The NgsiAgentRunner runs NgsiAgentPull's on partitions of the input, in many worker processes.
+
+    Partitions are statically assigned to the workers in a round-robin way.
+    """
+
+    def __init__(self,
+                 partitions: Sequence[Partition],
+                 sink_factory: Callable[[], Sink] = SinkStdout,
+                 process: Callable = record,
+                 side_effect: Callable = None,
+                 processes: int = None):
+        logger.info("init NGSI agent runner")
+        self.partitions = list(partitions)
+        self.sink_factory = sink_factory
+        self.process = process
+        self.side_effect = side_effect
+        self.processes = min(processes if processes else os.cpu_count(), len(self.partitions)) or 1
+        logger.info(f"{len(self.partitions)} partitions, {self.processes} processes")
+        self.stats = NgsiAgent.Stats()
+
+    @property
+    def status(self):
+        return self.stats
+
+    def run(self):
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_work,
+                                           args=(self.partitions[i::self.processes], self.sink_factory,
+                                                 self.process, self.side_effect, results),
+                                           name=f"ngsi-worker-{i}")
+                   for i in range(self.processes)]
+        for w in workers:
+            w.start()
+        errors = []
+        pending = len(workers)
+        while pending:
+            try:
+                pid, stats, error = results.get(timeout=1)
+            except queue.Empty:
+                if not any(w.is_alive() for w in workers) and results.empty():
+                    errors.append(f"{pending} workers died unexpectedly")
+                    break
+                continue
+            pending -= 1
+            logger.info(f"worker {pid} done : {stats}")
+            self.stats += stats
+            if error:
+                errors.append(f"worker {pid} : {error}")
+        for w in workers:
+            w.join()
+        if errors:
+            raise NgsiException(f"Some workers failed : {errors}")
+        return self
+
+    def close(self):
+        logger.info("close NGSI agent runner")
+        logger.info(self.status)
@@ -5,10 +5,11 @@ import json
 import socket
 import signal
 import time
+import threading
 import schedule
 import _thread
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from cheroot.wsgi import Server as WSGIServer
 from loguru import logger
 from datetime import datetime
@@ -18,6 +19,9 @@ from enum import Enum, auto
 
 from pyngsi.sink import Sink
 from pyngsi.agent import NgsiAgent, NgsiAgentPull
+from pyngsi.metrics import CONTENT_TYPE
+from pyngsi.status import StatusPoller
+from pyngsi.lifecycle import Lifecycle
 from pyngsi.__init__ import __version__
 
 
@@ -60,7 +64,9 @@ class Scheduler():
                  wsgi_port: int = 8880,
                  debug: bool = False,
                  interval: int = 1,
-                 unit: UNIT = UNIT.minutes):
+                 unit: UNIT = UNIT.minutes,
+                 poller: StatusPoller = None,
+                 lifecycle: Lifecycle = None):
 
         self.agent = agent
         self.host = host
@@ -70,12 +76,21 @@ class Scheduler():
         self.interval = interval
         self.unit = unit
         self.status = SchedulerStatus()
+        # the stats of a job are folded into the status while /metrics may be scraped
+        self.lock = threading.Lock()
+        # remote status is polled in background, /status only reads the cache
+        self.poller = poller if poller else StatusPoller(agent.sink)
+        # on SIGTERM/SIGINT stop the intake, then flush and close the sink
+        self.lifecycle = lifecycle if lifecycle else Lifecycle()
+        self.lifecycle.on_stop(self.agent.stop)
 
         self.app = Flask(__name__)
         self.app.add_url_rule("/version", 'version',
                               self._version, methods=['GET'])
         self.app.add_url_rule("/status", 'status',
                               self._status, methods=['GET'])
+        self.app.add_url_rule("/metrics", 'metrics',
+                              self._metrics, methods=['GET'])
 
     def _flaskthread(self):
         if self.debug:
@@ -89,6 +104,8 @@ class Scheduler():
                 wsgi_server.stop()
 
     def _job(self):
+        if self.lifecycle.stopped:
+            return
         logger.info(f"start new job at {datetime.now()}")
         self.status.lastcalltime = datetime.now()
         self.status.calls += 1
@@ -104,13 +121,25 @@ class Scheduler():
 
         logger.info(self.agent.stats)
 
-        self.status.stats += self.agent.stats
+        self._fold()
+        if self.lifecycle.stopped:  # the cache is saved by close(), a new poll would delay the shutdown
+            return
+        if self.agent.cache:
+            self.agent.cache.save()
         self.agent.reset()
 
+    def _fold(self):
+        """move the stats of the agent into the cumulated stats"""
+        with self.lock:
+            self.status.stats += self.agent.stats
+            self.agent.stats.zero()
+
     def run(self):
         logger.info(
             f"HTTP server listens on http://{self.host}:{self.port}")
         self.status.starttime = datetime.now()
+        self.lifecycle.install()
+        self.poller.start()
         _thread.start_new_thread(self._flaskthread, ())
 
         logger.info("run job now")
@@ -129,10 +158,19 @@ class Scheduler():
             schedule.every(self.interval).days.do(self._job)
             tick = 128
 
-        while True:
+        while not self.lifecycle.stopped:
             logger.trace("tick")
             schedule.run_pending()
-            time.sleep(tick)
+            self.lifecycle.stopping.wait(tick)
+
+        self._shutdown()
+
+    def _shutdown(self):
+        logger.info("shutdown")
+        schedule.clear()
+        self.poller.stop()
+        self.lifecycle.shutdown(self.agent)  # the messages dropped are counted in the agent stats
+        self._fold()
 
     def _version(self):
         logger.trace("ask for version")
@@ -140,9 +178,18 @@ class Scheduler():
 
     def _status(self):
         logger.trace("ask for status")
-        remote_status = self.agent.sink.status()
-        if remote_status:
+        remote_status = self.poller.start().get()
+        if remote_status.state:
             return jsonify(poll_status=self.status,
-                           orion_status=remote_status)
+                           orion_status=remote_status.state,
+                           remote_health=remote_status)
         else:
             return jsonify(poll_status=self.status)
+
+    def _metrics(self):
+        logger.trace("ask for metrics")
+        # cumulated stats from previous jobs plus the stats of the running job
+        with self.lock:
+            stats = self.status.stats + self.agent.stats
+        text = self.agent.metrics.expose(self.status, stats)
+        return Response(text, content_type=CONTENT_TYPE)
@@ -7,6 +7,7 @@ Sinks.
 Sinks MUST respect the following protocol :
 Each Sink Class MUST implement write().
 Some Sinks MAY override close() if needed to free resources.
+Sinks that buffer messages MAY override flush() to wait until everything is written.
 
 SinkOrion is the one you will want to use in your project.
 Other sinks such as SinkStdout or SinkFile are useful during the development stage and for unit testing.
@@ -17,8 +18,16 @@ import gzip
 import requests
 import os
 import copy
+import json
+import re
+import threading
+import zlib
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from collections import deque
+from queue import Queue, Empty
+from typing import Callable, List, Tuple
 from loguru import logger
 from requests_toolbelt.utils import dump
 
@@ -33,6 +42,8 @@ class Sink(ABC):
     One can code its own Sink just by extending Sink.
     """
 
+    healthy: bool = True
+
     @abstractmethod
     def write(self, msg):
         pass
@@ -40,6 +51,33 @@ class Sink(ABC):
     def status(self):
         pass
 
+    def set_health(self, healthy: bool):
+        """health signal of the remote server, as observed by a StatusPoller"""
+        self.healthy = healthy
+
+    def register_metrics(self, metrics):
+        """give the Sink the opportunity to expose its own gauges"""
+        pass
+
+    def flush(self):
+        pass
+
+    def discard(self) -> int:
+        """drop the buffered messages, return how many were dropped"""
+        return 0
+
+    def busy(self) -> List[str]:
+        """describe the writes in progress, i.e. the lanes still writing"""
+        return []
+
+    def failures(self, writer: int = None) -> List[Tuple[object, Exception]]:
+        """
+        return then forget the messages whose write failed once write() had returned, along with the exception
+
+        Given a writer (a thread identifier), only the messages written by this thread are returned.
+        """
+        return []
+
     def close(self):
         pass
 
@@ -128,12 +166,14 @@ class SinkHttp(Sink):
         endpoint to ask server for its status and its processing statistics        
     proxy: str
         HTTP Proxy string (i.e http://127.0.0.1:8080)
+    fail_fast: bool
+        do not send anything while the server is known to be unhealthy
     """
 
     def __init__(self, hostname="127.0.0.1", port=8080, secure=False, baseurl="/",
                  post_endpoint="/", post_query="", status_endpoint="/status",
                  useragent=f"NgsiAgent v{version}",
-                 proxy=None):
+                 proxy=None, fail_fast=False):
         """
         Parameters
         ----------
@@ -147,6 +187,8 @@ class SinkHttp(Sink):
             HTTP User-Agent header sent in the request
         proxy: str
             HTTP Proxy string (i.e http://127.0.0.1:8080)
+        fail_fast: bool
+            do not send anything while the server is known to be unhealthy
         """
         logger.debug("init SinkHttp")
         if (baseurl[0] != "/"):
@@ -162,6 +204,7 @@ class SinkHttp(Sink):
         self.post_url = f"{prefix}{post_endpoint}?{post_query}" if post_query else f"{prefix}{post_endpoint}"
         self.status_url = f"{prefix}{status_endpoint}"
         self.proxy = proxy
+        self.fail_fast = fail_fast
         self.headers = {'Content-Type': 'application/json',
                         'User-Agent': useragent}
         self.session = requests.Session()
@@ -180,6 +223,9 @@ class SinkHttp(Sink):
             the NGSI data
         """
 
+        if self.fail_fast and not self.healthy:
+            raise SinkException(
+                f"cannot write to SinkHttp : server is unhealthy\nrecord={msg}")
         try:
             r = self.session.post(
                 self.post_url, msg, headers=self.headers,
@@ -225,11 +271,11 @@ class SinkOrion(SinkHttp):
     def __init__(self, hostname="127.0.0.1", port="1026", secure=False, baseurl="/",
                  post_endpoint="/v2/entities", post_query="options=upsert", status_endpoint="/version",
                  useragent=f"NgsiAgent v{version}", proxy=None,
-                 token=None, service=None, servicepath=None):
+                 token=None, service=None, servicepath=None, fail_fast=False):
         logger.debug("init SinkOrion")
         super().__init__(hostname, port, secure, baseurl,
                          post_endpoint, post_query, status_endpoint,
-                         useragent, proxy)
+                         useragent, proxy, fail_fast)
         if 'X-Auth-Token' in self.headers:
             logger.info(
                 "A token has already been provided to the pyngsi framework.")
@@ -259,3 +305,186 @@ class SinkOrion(SinkHttp):
             self.headers['Fiware-Service'] = service
         if servicepath is not None:
             self.headers['Fiware-ServicePath'] = servicepath
+
+
+_ENTITY_ID = re.compile(r'"id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def entity_id(msg) -> str:
+    """return the entity id of a NGSI message, either a dict or a JSON string"""
+    if isinstance(msg, dict):
+        return str(msg.get("id"))
+    m = _ENTITY_ID.search(msg)
+    # the id found is the one of the entity if no nested object opens before it, else the message is parsed
+    if m and "{" not in msg[msg.find("{") + 1:m.start()]:
+        return m.group(1)
+    try:
+        return str(json.loads(msg).get("id"))
+    except Exception:
+        return str(msg)
+
+
+@dataclass
+class LaneStats:
+    written: int = 0
+    errors: int = 0
+    queued: int = 0
+
+
+class _Lane():
+
+    _STOP = object()
+
+    def __init__(self, index: int, sink: Sink, queue_size: int, failed: deque):
+        self.index = index
+        self.queue = Queue(queue_size)
+        self.failed = failed
+        self.written = 0
+        self.errors = 0
+        self.thread: threading.Thread = None
+        self.start(sink)
+
+    def start(self, sink: Sink):
+        self.sink = sink
+        self.thread = threading.Thread(target=self._loop, name=f"sink-lane-{self.index}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(self._STOP)
+        self.thread.join()
+        self.thread = None
+        self.sink.close()
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                msg, writer = item
+                self.sink.write(msg)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                self.failed.append((msg, e, writer))
+                logger.error(f"lane {self.index} cannot write : {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> LaneStats:
+        return LaneStats(self.written, self.errors, self.queue.qsize())
+
+
+class SinkSharded(Sink):
+    """Write in parallel through many lanes, keeping the order of the updates of each entity
+
+    The entity id is hashed into one of the lanes.
+    Each lane owns its Sink (hence its connection) and its worker thread.
+    write() returns once the message is queued : a message is counted as output by the agent when queued,
+    the failed writes are given back by failures() then accounted as errors (and dead letters) by the agent.
+    Each message is queued along with the thread writing it, so that agents sharing the sink get back their own failures.
+    Once closed, the lanes are started again with new sinks on the next write.
+    """
+
+    def __init__(self, factory: Callable[[], Sink], lanes: int = 4, queue_size: int = 1024,
+                 key: Callable = entity_id):
+        """
+        Parameters
+        ----------
+        factory : Callable
+            Create the Sink of a lane, i.e. lambda: SinkOrion()
+        lanes : int
+            Number of lanes
+        queue_size : int
+            Maximum number of messages waiting in a lane
+        key : Callable
+            Return the key of a message, messages with the same key keep their order
+        """
+        logger.debug("init SinkSharded")
+        self.factory = factory
+        self.key = key
+        self.lock = threading.Lock()
+        self.failed: deque = deque()  # (msg, exception, writer thread)
+        self.lanes: List[_Lane] = [_Lane(i, factory(), queue_size, self.failed) for i in range(lanes)]
+
+    def write(self, msg):
+        k = self.key(msg).encode("utf-8")
+        lane = self.lanes[zlib.crc32(k) % len(self.lanes)]
+        if lane.thread is None:  # closed
+            self._start()
+        lane.queue.put((msg, threading.get_ident()))
+
+    def _start(self):
+        with self.lock:
+            for lane in self.lanes:
+                if lane.thread is None:
+                    lane.start(self.factory())
+
+    def busy(self) -> List[str]:
+        return [f"lane {lane.index}" for lane in self.lanes if lane.queue.unfinished_tasks]
+
+    def failures(self, writer: int = None) -> List[Tuple[object, Exception]]:
+        failed = []
+        with self.lock:
+            for _ in range(len(self.failed)):  # the lanes may append meanwhile
+                msg, e, thread = self.failed.popleft()
+                if writer is None or thread == writer:
+                    failed.append((msg, e))
+                else:
+                    self.failed.append((msg, e, thread))  # left for its writer
+        return failed
+
+    def status(self):
+        return self.lanes[0].sink.status()
+
+    def set_health(self, healthy: bool):
+        self.healthy = healthy
+        for lane in self.lanes:
+            lane.sink.set_health(healthy)
+
+    def stats(self) -> List[LaneStats]:
+        return [lane.stats() for lane in self.lanes]
+
+    def skew(self) -> float:
+        """ratio between the busiest lane and the average lane, 1.0 when perfectly balanced"""
+        written = [lane.written + lane.queue.qsize() for lane in self.lanes]
+        mean = sum(written) / len(written)
+        return max(written) / mean if mean else 1.0
+
+    def register_metrics(self, metrics):
+        for lane in self.lanes:
+            labels = f'lane="{lane.index}"'
+            metrics.gauge("sink_lane_queue_depth", lane.queue.qsize,
+                          "Number of messages waiting in the lane", labels)
+            metrics.gauge("sink_lane_written", lambda lane=lane: lane.written,
+                          "Number of messages written by the lane", labels)
+            metrics.gauge("sink_lane_errors", lambda lane=lane: lane.errors,
+                          "Number of write errors in the lane", labels)
+        metrics.gauge("sink_lane_skew", self.skew,
+                      "Ratio between the busiest lane and the average lane")
+
+    def flush(self):
+        """wait until all the lanes are drained"""
+        for lane in self.lanes:
+            lane.queue.join()
+        for lane in self.lanes:
+            lane.sink.flush()
+
+    def discard(self) -> int:
+        dropped = 0
+        for lane in self.lanes:
+            while True:
+                try:
+                    lane.queue.get_nowait()
+                except Empty:
+                    break
+                lane.queue.task_done()
+                dropped += 1
+        return dropped
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            for lane in self.lanes:
+                if lane.thread is not None:
+                    lane.stop()
@@ -5,7 +5,11 @@ import openpyxl
 import csv
 
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Union
 from loguru import logger
 
 from pyngsi.sources.source import Source, Row
@@ -47,20 +51,85 @@ class SourceSampleOrion(Source):
         pass
 
 
+def _sheet_values(filename: str, sheet: Union[int, str], read_only: bool) -> Iterator[tuple]:
+    """yield the values of the rows of a sheet"""
+    wb = openpyxl.load_workbook(filename, read_only=read_only, data_only=True)
+    try:
+        ws = wb[sheet] if isinstance(sheet, str) else wb.worksheets[sheet]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        if read_only:
+            wb.close()  # read-only workbooks keep the file open
+
+
+def _read_sheet(filename: str, sheet: Union[int, str]) -> List[tuple]:
+    return list(_sheet_values(filename, sheet, True))
+
+
 class SourceMicrosoftExcel(Source):
 
-    def __init__(self, filename, sheetid: int = 0, sheetname: str = None, ignore: int = 0):
+    """
+    A SourceMicrosoftExcel reads the rows of one or many sheets of a xlsx workbook.
+
+    The sheet is given by sheetname or sheetid. sheets is a list of sheet names or indexes, or "*" for all sheets.
+    When many sheets are read the provider of the rows is file!sheet.
+    ignore is the number of rows skipped at the start of each sheet.
+
+    read_only streams the rows instead of loading the whole workbook in memory.
+    With workers > 0, sheets are read by a pool of processes, each sheet being loaded in memory.
+
+    records is the type of the records :
+    "str" for the cell values joined by ";" (empty cells being empty strings),
+    "tuple" for the typed cell values,
+    "dict" for the typed cell values keyed by the header, i.e. the first row of the sheet after the ignored rows,
+    columns without header being keyed by their index.
+    """
+
+    def __init__(self, filename, sheetid: int = 0, sheetname: str = None, ignore: int = 0,
+                 read_only: bool = False, sheets: Union[str, Sequence[Union[int, str]]] = None,
+                 records: str = "str", workers: int = 0):
         logger.debug(f"{filename=}")
-        wb = openpyxl.load_workbook(filename, data_only=True)
-        ws = wb[sheetname] if sheetname else wb.worksheets[sheetid]
-        self.rows = ws.rows
+        if records not in ("str", "tuple", "dict"):
+            raise ValueError(f"records must be str, tuple or dict, not {records}")
+        self.filename = filename
         self.provider = Path(filename).name
-        for _ in range(ignore):  # skip lines
-            next(self.rows)
+        self.ignore = ignore
+        self.read_only = read_only
+        self.records = records
+        self.workers = workers
+        if sheets is None:
+            self.sheets = [sheetname if sheetname else sheetid]
+            self.providers = [self.provider]
+        else:
+            wb = openpyxl.load_workbook(filename, read_only=True)
+            names = wb.sheetnames
+            wb.close()
+            self.sheets = names if sheets == "*" else list(sheets)
+            self.providers = [f"{self.provider}!{s if isinstance(s, str) else names[s]}" for s in self.sheets]
+
+    def _values(self) -> Iterator[Iterable[tuple]]:
+        """yield the values of the sheets, in order"""
+        if not self.workers or len(self.sheets) == 1:
+            for sheet in self.sheets:
+                yield _sheet_values(self.filename, sheet, self.read_only)
+            return
+        with ProcessPoolExecutor(self.workers) as executor:
+            for values in executor.map(partial(_read_sheet, self.filename), self.sheets):
+                yield values
 
     def __iter__(self):
-        for row in self.rows:
-            record = ";".join(
-                [str(cell.value) if cell.value else "" for cell in row])
-            logger.debug(f"{self.provider=}{record=}")
-            yield Row(self.provider, record)
+        for provider, values in zip(self.providers, self._values()):
+            values = islice(values, self.ignore, None)
+            if self.records == "str":
+                for row in values:
+                    record = ";".join(
+                        [str(value) if value else "" for value in row])
+                    logger.debug(f"{provider=}{record=}")
+                    yield Row(provider, record)
+            elif self.records == "tuple":
+                for row in values:
+                    yield Row(provider, row)
+            else:
+                header = [str(h) if h is not None else i for i, h in enumerate(next(values, ()))]
+                for row in values:
+                    yield Row(provider, dict(zip(header, row)))
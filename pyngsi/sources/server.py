@@ -3,12 +3,18 @@
 
 import os
 import json
+import shutil
 import socket
 import signal
+import tempfile
+import threading
 import time
+import uuid
 
-
-from flask import Flask, request, jsonify
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from flask import Flask, Response, request, jsonify
 from cheroot.wsgi import Server as WSGIServer
 from loguru import logger
 from datetime import datetime
@@ -17,6 +23,11 @@ from werkzeug.utils import secure_filename
 
 from pyngsi.sources.source import Source, SourceStream, SourceSingle
 from pyngsi.sources.source_json import SourceJson
+from pyngsi.sources.source_ndjson import SourceNdjson
+from pyngsi.jsonpath import JsonPath
+from pyngsi.metrics import CONTENT_TYPE
+from pyngsi.status import StatusPoller
+from pyngsi.lifecycle import Lifecycle
 
 from pyngsi.__init__ import __version__ as version
 
@@ -25,6 +36,27 @@ class ServerException(Exception):
     pass
 
 
+@dataclass
+class Job():
+    """an upload processed in background, its stats are the ones of the agent while running"""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: str = "queued"  # queued, running, done or failed
+    submitted: datetime = field(default_factory=datetime.now)
+    started: datetime = None
+    finished: datetime = None
+    message: str = None
+    agent: object = None
+
+    @property
+    def ended(self) -> bool:
+        return self.state in ("done", "failed")
+
+    def status(self) -> dict:
+        return dict(id=self.id, state=self.state, submitted=self.submitted, started=self.started,
+                    finished=self.finished, message=self.message,
+                    statistics=self.agent.stats if self.agent else None)
+
+
 class Server():
     """
     A Server acts both as a Source and as an Agent
@@ -39,7 +71,10 @@ class Server():
         self.agent = None
         self.provider = provider
         self.ignore_header = ignore_header
-        self.jsonpath = jsonpath
+        # compiled once, shared by all the requests
+        self.jsonpath = JsonPath(jsonpath) if isinstance(jsonpath, str) else jsonpath
+        # requests are processed concurrently
+        self.lock = threading.Lock()
 
     def set_agent(self, agent):
         self.agent = agent
@@ -50,9 +85,19 @@ class Server():
     def close(self):
         pass
 
-    def _process_content(self, src: Source):
+    def _count(self, counter: str):
+        """increment a counter of the server status, requests being processed concurrently"""
+        if not self.agent:
+            return
+        with self.lock:
+            status = self.agent.server_status
+            setattr(status, counter, getattr(status, counter) + 1)
+            if counter == "calls":
+                status.lastcalltime = datetime.now()
+
+    def _process_content(self, src: Source, job: Job = None):
         logger.info(f"{src=}")
-        from pyngsi.agent import NgsiAgentPull
+        from pyngsi.agent import NgsiAgentRequest
         if not src:
             logger.info("no source")
             return
@@ -62,14 +107,19 @@ class Server():
         try:
             if self.ignore_header:
                 src = src.skip_header()
-            agent = NgsiAgentPull(src, self.agent.sink,
-                                  self.agent.process, self.agent.side_effect)
+            agent = NgsiAgentRequest(src, self.agent)
+            if job:
+                job.agent = agent
             logger.info(f"{self.ignore_header=}")
             logger.info(f"{self.jsonpath=}")
-            agent.run()
-            agent.close()
+            # the sink and the dead-letter store are shared by the requests, closed along with the server agent
+            try:
+                agent.run()
+            finally:
+                agent.source.close()
             if self.agent:
-                self.agent.stats += agent.stats
+                with self.lock:
+                    self.agent.stats += agent.stats
             return agent.stats
         except Exception as e:
             logger.error(f"cannot parse content : {e}")
@@ -81,7 +131,12 @@ class ServerHttpUpload(Server):
     ServerHttpUpload allows receiving data from HTTP clients
 
     ServerHttpUpload handles raw binary (curl --data) and multipart/form-data (curl --form).
-    ServerHttpUpload handles formats text and json.
+    ServerHttpUpload handles formats text, json and json lines (.jsonl, .ndjson or Content-Type application/x-ndjson).
+
+    With workers > 0, uploads are processed in background by a pool of worker threads.
+    An upload is answered 202 with a job id, its state and statistics are then available at /jobs/<id>.
+    Up to queue_size uploads wait for a worker, beyond that uploads are answered 429 with a Retry-After header.
+    The last max_jobs jobs finished are kept.
     """
 
     def __init__(self,
@@ -92,7 +147,12 @@ class ServerHttpUpload(Server):
                  debug: bool = False,
                  provider: str = None,
                  ignore_header: bool = False,
-                 jsonpath: str = None):
+                 jsonpath: str = None,
+                 poller: StatusPoller = None,
+                 workers: int = 0,
+                 queue_size: int = 16,
+                 retry_after: int = 5,
+                 max_jobs: int = 1000):
 
         super().__init__(provider, ignore_header, jsonpath)
         self.host = host
@@ -100,20 +160,35 @@ class ServerHttpUpload(Server):
         self.wsgi_port = wsgi_port
         self.endpoint = endpoint
         self.debug = debug
+        self.poller = poller
+        self.workers = workers
+        self.retry_after = retry_after
+        self.max_jobs = max_jobs
+        self.jobs: OrderedDict = OrderedDict()
+        self.upload_dir: str = None  # the uploaded files read by registered sources, created on first use
+        if workers:
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix="upload")
+            # the jobs running or waiting for a worker
+            self.slots = threading.BoundedSemaphore(workers + queue_size)
 
         self.app = Flask(__name__)
         self.app.add_url_rule("/version", 'version',
                               self._version, methods=['GET'])
         self.app.add_url_rule("/status", 'status',
                               self._status, methods=['GET'])
+        self.app.add_url_rule("/metrics", 'metrics',
+                              self._metrics, methods=['GET'])
         self.app.add_url_rule(endpoint, 'upload',
                               self._upload, methods=['POST'])
+        self.app.add_url_rule("/jobs/<job_id>", 'job',
+                              self._job, methods=['GET'])
 
     def run(self):
         logger.info(
             f"HTTP server listens on http://{self.host}:{self.port}{self.endpoint}")
         if self.agent:
             self.agent.server_status.starttime = datetime.now()
+            self._poller()
 
         if self.debug:
             self.app.run(host=self.host, port=self.port, debug=self.debug)
@@ -131,44 +206,122 @@ class ServerHttpUpload(Server):
 
     def _status(self):
         logger.trace("ask for status")
-        remote_status = self.agent.sink.status()
-        if remote_status:
+        remote_status = self._poller().get()
+        if remote_status.state:
             return jsonify(server_status=self.agent.server_status,
                            ngsi_stats=self.agent.stats,
-                           orion_status=remote_status)
+                           orion_status=remote_status.state,
+                           remote_health=remote_status)
         else:
             return jsonify(server_status=self.agent.server_status,
                            ngsi_stats=self.agent.stats)
 
+    def _poller(self) -> StatusPoller:
+        # the agent is not known at init time, so the poller is created on first use
+        if not self.poller:
+            self.poller = StatusPoller(self.agent.sink)
+        return self.poller.start()
+
+    def _metrics(self):
+        logger.trace("ask for metrics")
+        if not self.agent:
+            return Response("", content_type=CONTENT_TYPE)
+        text = self.agent.metrics.expose(self.agent.server_status,
+                                         self.agent.stats)
+        return Response(text, content_type=CONTENT_TYPE)
+
+    def _job(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return jsonify(status=404, message=f"unknown job {job_id}"), 404
+        return jsonify(job.status())
+
     def _upload(self):
-        
-        if self.agent:
-            self.agent.server_status.lastcalltime = datetime.now()
-            self.agent.server_status.calls += 1
+
+        self._count("calls")
 
         logger.info("received request")
 
+        # reject before reading the upload
+        if self.workers and not self.slots.acquire(blocking=False):
+            logger.warning("upload queue full")
+            self._count("calls_error")
+            response = jsonify(status=429, message="too many uploads in progress")
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response, 429
+
         try:
 
             src, filename = self._create_source(request)
 
         except Exception as e:
-            if self.agent:
-                self.agent.server_status.calls_error += 1
+            if self.workers:
+                self.slots.release()
+            self._count("calls_error")
             return jsonify({'status': 400, 'message': e})
 
         logger.info(src)
+        if self.workers:
+            job = Job()
+            self._add_job(job)
+            self.executor.submit(self._run_job, job, src, filename)
+            response = jsonify(status=202, message="content accepted", job=job.id)
+            response.headers["Location"] = f"/jobs/{job.id}"
+            return response, 202
+
         stats = self._process_content(src)
+        self._remove(filename)
+
+        self._count("calls_success")
+        #return jsonify({'status': 200, 'message': 'content uploaded successfully'})
+        return jsonify(status=200, message="content uploaded successfully", statistics=stats)
+
+    def _add_job(self, job: Job):
+        with self.lock:
+            self.jobs[job.id] = job
+            ended = [job_id for job_id, j in self.jobs.items() if j.ended]
+            for job_id in ended[:max(0, len(ended) - self.max_jobs)]:  # the oldest ones
+                del self.jobs[job_id]
+
+    def _run_job(self, job: Job, src: Source, filename: str):
+        job.state, job.started = "running", datetime.now()
+        state, message = "failed", None
+        try:
+            self._process_content(src, job)
+            state, message = "done", "content uploaded successfully"
+            self._count("calls_success")
+        except Exception as e:
+            message = str(e)
+            self._count("calls_error")
+        finally:
+            self._remove(filename)
+            self.slots.release()
+            # the job is reported ended once its slot is free
+            job.finished, job.message, job.state = datetime.now(), message, state
+
+    def _save(self, file) -> str:
+        """save the uploaded file under its own directory, uploads with the same name being processed concurrently"""
+        with self.lock:
+            if self.upload_dir is None:
+                self.upload_dir = tempfile.mkdtemp(prefix="pyngsi-upload-")
+        filename = os.path.join(tempfile.mkdtemp(dir=self.upload_dir), secure_filename(file.filename))
+        file.save(filename)
+        return filename
+
+    def _remove(self, filename: str):
         if filename:
             try:
                 os.remove(filename)
+                os.rmdir(os.path.dirname(filename))
             except Exception as e:
                 logger.warning(f"Cannot remove file {filename}: {e}")
 
-        if self.agent:
-            self.agent.server_status.calls_success += 1
-        #return jsonify({'status': 200, 'message': 'content uploaded successfully'})
-        return jsonify(status=200, message="content uploaded successfully", statistics=stats)
+    def close(self):
+        if self.workers:
+            logger.info("wait for the uploads in progress")
+            self.executor.shutdown(wait=True)
+        if self.upload_dir:
+            shutil.rmtree(self.upload_dir, ignore_errors=True)
 
     def _create_source(self, request: request):
         src: Source = None
@@ -184,16 +337,19 @@ class ServerHttpUpload(Server):
             logger.debug(f"{ext=}")
             if ext in Source.registered_extensions:  # extension registred by user
                 klass, kwargs = Source.registered_extensions[ext]
-                filename = secure_filename(filename)
-                file.save(filename)
+                filename = self._save(file)
                 src = klass(filename, **kwargs)
-            elif ext not in ("txt", "csv", "json"):
+            elif ext not in ("txt", "csv", "json", "jsonl", "ndjson"):
                 raise ServerException(f"unknown extension {ext}")
             elif ext == 'json':  # JSON extension
                 filename = None # here we don't save the file
                 data = json.load(file)
                 src = SourceJson(data, provider=provider,
                                  jsonpath=self.jsonpath)
+            elif ext in ("jsonl", "ndjson"):  # JSON Lines extension
+                filename = None # here we don't save the file
+                data = file.read().decode('utf-8')
+                src = SourceNdjson(data.splitlines(), provider=provider)
             else:  # processed as text
                 filename = None # here we don't save the file
                 data = file.read().decode('utf-8')
@@ -204,6 +360,10 @@ class ServerHttpUpload(Server):
                 data = request.get_json()
                 src = SourceJson(data, provider=self.provider,
                                  jsonpath=self.jsonpath)
+            elif request.mimetype in ("application/x-ndjson", "application/jsonl"):
+                logger.info("request is json lines")
+                data = request.get_data().decode("utf-8", errors="replace")
+                src = SourceNdjson(data.splitlines(), provider=self.provider)
             else:
                 logger.info("request is plain text")
                 data = request.get_data().decode("utf-8", errors="replace")
@@ -224,7 +384,8 @@ class ServerUdp(Server):
                  port: int = 10110,
                  bufsize: int = 1024,
                  provider: str = "UDP Server",
-                 ignore_header: bool = False):
+                 ignore_header: bool = False,
+                 lifecycle: Lifecycle = None):
         """
         Parameters
         ----------
@@ -234,6 +395,8 @@ class ServerUdp(Server):
             The server port
         bufsize : int
             Buffer size
+        lifecycle : Lifecycle
+            Handles shutdown signals
         """
         super().__init__(provider, ignore_header)
         self.hostname = host
@@ -246,9 +409,10 @@ class ServerUdp(Server):
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.s.bind((host, port))
         logger.info(f"UDP server started")
-        signal.signal(signal.SIGINT, self.handle_signal)
-        signal.signal(signal.SIGQUIT, self.handle_signal)
-        signal.signal(signal.SIGTERM, self.handle_signal)
+        self.lifecycle = lifecycle if lifecycle else Lifecycle(
+            signals=(signal.SIGINT, signal.SIGQUIT, signal.SIGTERM))
+        self.lifecycle.on_stop(self._interrupt)
+        self.lifecycle.install()
 
     def run(self):
         logger.info("ready...")
@@ -271,6 +435,9 @@ class ServerUdp(Server):
                     logger.error(e)
                     if self.agent:
                         self.agent.server_status.calls_error += 1
+        if self.agent:
+            # the datagram being processed is done, now flush the sink within the deadline
+            self.agent.stats.dropped += self.lifecycle.flush(self.agent.sink)
 
     def close(self):
         self.s.close()
@@ -278,8 +445,9 @@ class ServerUdp(Server):
 
     def handle_signal(self, signum, frame):
         """Properly clean resources when a signal is received"""
-        logger.info("Received SIGNAL : ")
+        self.lifecycle.handle_signal(signum, frame)
+
+    def _interrupt(self):
         logger.info("Stopping loop...")
         self.interrupted = True
         self.s.close()
-        time.sleep(1)
@@ -14,19 +14,26 @@ import gzip
 import json
 import time
 import glob
+import threading
 
 from dataclasses import dataclass
 from collections.abc import Iterable
+from collections import deque
 from loguru import logger
 from os.path import basename
 from typing import List, Callable, Tuple, Any, Sequence
-from more_itertools import take
+from more_itertools import take, consume, chunked
 from itertools import islice, chain
 from zipfile import ZipFile
 from io import TextIOWrapper
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Full
 
-from pyngsi.utils import stream_from
+from pyngsi.utils import stream_from, nbytes
+
+# the rows prefetched by SourceFiles are queued by chunks of this number of rows
+PREFETCH_CHUNK = 512
 
 
 @dataclass(eq=True)
@@ -58,6 +65,19 @@ class Source(Iterable):
     def __iter__(self):
         yield from self.rows
 
+    def position(self) -> Any:
+        """return the position after the last delivered row, None if the Source cannot be resumed"""
+        return None
+
+    def seek(self, position: Any):
+        """resume the Source from a position previously returned by position()"""
+        raise NotImplementedError(f"{self.__class__.__name__} cannot be resumed")
+
+    @property
+    def resumable(self) -> bool:
+        """tell whether the Source can be resumed with seek()"""
+        return type(self).seek is not Source.seek
+
     def head(self, n: int = 10) -> List[Row]:
         """return a list built from the first n elements"""
         return take(n, self)
@@ -80,6 +100,45 @@ class Source(Iterable):
         iterator = iter(self)
         return Source((next(iterator) for _ in range(n)))
 
+    def map(self, f: Callable[[Any], Any]):
+        """return a new Source whose records are transformed by f"""
+        return self._then("map", f)
+
+    def filter(self, f: Callable[[Any], bool]):
+        """return a new Source keeping only the records for which f is true"""
+        return self._then("filter", f)
+
+    def flat_map(self, f: Callable[[Any], Iterable]):
+        """return a new Source delivering each record of the iterable returned by f"""
+        return self._then("flat_map", f)
+
+    def batch(self, n: int):
+        """return a new Source whose records are lists of n consecutive records, the last one may be shorter"""
+        return self._then("batch", n)
+
+    def window(self, n: int, step: int = 1):
+        """return a new Source whose records are tuples of n consecutive records, sliding by step"""
+        return self._then("window", (n, step))
+
+    def _then(self, kind: str, arg: Any):
+        return SourceTransform(self, [(kind, arg)])
+
+    def attach(self, stats):
+        """give the Source the agent statistics, so that it can count the rows it filters out"""
+        pass
+
+    def attach_deadletter(self, deadletter):
+        """give the Source the agent dead-letter store, so that it can store the records it fails to transform"""
+        pass
+
+    def stop(self):
+        """interrupt a Source waiting for new rows"""
+        pass
+
+    def close(self):
+        """release the resources kept between runs, i.e. connections"""
+        pass
+
     @classmethod
     def from_stream(cls, stream: Iterable = sys.stdin, provider: str = "user", **kwargs):
         """automatically create the Source from a stream"""
@@ -88,7 +147,9 @@ class Source(Iterable):
     @classmethod
     def from_file(cls, filename: str, provider: str = "user", **kwargs):
         from pyngsi.sources.source_json import SourceJson
-        """automatically create the Source from a filename, figuring out the extension, handles text, json and gzip compression"""
+        from pyngsi.sources.source_ndjson import SourceNdjson
+        from pyngsi.sources.source_archive import SourceArchive, TAR_EXTENSIONS
+        """automatically create the Source from a filename, figuring out the extension, handles text, json, json lines, tar archives and gzip compression"""
         if "*" in cls.registered_extensions:
             klass, kwargs = cls.registered_extensions["*"]
             return klass(filename, **kwargs)
@@ -96,28 +157,30 @@ class Source(Iterable):
         if ext in cls.registered_extensions:
             klass, kwargs = cls.registered_extensions[ext]
             return klass(filename, **kwargs)
+        if filename.endswith(TAR_EXTENSIONS):
+            return SourceArchive(filename, **kwargs)
         stream, suffixes = stream_from(filename)
         ext = suffixes[-1]
         if ext == ".json":
             json_obj = json.load(stream)
             return SourceJson(json_obj, provider=basename(filename), **kwargs)
-        return SourceStream(stream, provider=basename(filename), **kwargs)
+        if ext in (".jsonl", ".ndjson"):
+            return SourceNdjson(stream, provider=basename(filename), **kwargs)
+        return SourceFile(filename, stream, provider=basename(filename), **kwargs)
 
     @classmethod
-    def from_files(cls, filenames: Sequence[str], provider: str = "user", **kwargs):
-        sources = [Source.from_file(f) for f in filenames]
-        return SourceMany(sources)
+    def from_files(cls, filenames: Sequence[str], provider: str = "user", prefetch: int = 0, **kwargs):
+        """chain local files, each file being opened only when it is reached, see SourceFiles"""
+        return SourceFiles(filenames, prefetch=prefetch, **kwargs)
 
     @classmethod
-    def from_glob(cls, pattern: str, provider: str = "user", **kwargs):
-        sources = [Source.from_file(f) for f in glob.glob(pattern)]
-        return SourceMany(sources)   
+    def from_glob(cls, pattern: str, provider: str = "user", prefetch: int = 0, **kwargs):
+        return SourceFiles(glob.glob(pattern), prefetch=prefetch, **kwargs)
 
     @classmethod
-    def from_globs(cls, patterns: Sequence[str], provider: str = "user", **kwargs):
+    def from_globs(cls, patterns: Sequence[str], provider: str = "user", prefetch: int = 0, **kwargs):
         filenames = chain.from_iterable([glob.glob(p) for p in patterns])
-        sources = [Source.from_file(f) for f in filenames]
-        return SourceMany(sources)        
+        return SourceFiles(filenames, prefetch=prefetch, **kwargs)
 
     @classmethod
     def register_extension(cls, ext: str, src, **kwargs):
@@ -146,20 +209,111 @@ class Source(Iterable):
 
 class SourceStream(Source):
 
+    """
+    A SourceStream reads lines from a stream.
+
+    Its position is the number of lines read.
+    """
+
     def __init__(self, stream: Iterable, provider: str = "user", ignore_header: bool = False):
         if ignore_header:
             next(stream)
         self.stream = stream
         self.provider = provider
+        self.start = 0
+        self.line = 0
 
     def __iter__(self):
-        for line in self.stream:
+        iterator = iter(self.stream)
+        consume(iterator, self.start)
+        self.line = self.start
+        for line in iterator:
+            self.line += 1
             yield Row(self.provider, line.rstrip("\r\n"))
 
+    def position(self) -> dict:
+        return {"line": self.line}
+
+    def seek(self, position: dict):
+        self.start = self.line = position["line"]
+
     def reset(self):
         pass
 
 
+class SourceFile(SourceStream):
+
+    """
+    A SourceFile reads lines from a local text file, possibly gzip or zip compressed.
+
+    Its position is the byte offset of the next line in the uncompressed content.
+    Hence it is resumed without reading again the lines already delivered.
+    """
+
+    def __init__(self, filename: str, stream: Iterable = None, provider: str = None, ignore_header: bool = False):
+        if stream is None:
+            stream, _ = stream_from(filename)
+        super().__init__(stream, provider if provider else basename(filename))
+        self.filename = filename
+        self.offset = 0
+        if ignore_header:
+            self.offset = nbytes(next(stream))
+
+    def __iter__(self):
+        for line in self.stream:
+            self.line += 1
+            self.offset += nbytes(line)
+            yield Row(self.provider, line.rstrip("\r\n"))
+
+    def position(self) -> dict:
+        return {"file": self.filename, "line": self.line, "offset": self.offset}
+
+    def seek(self, position: dict):
+        if position.get("file") != self.filename:
+            logger.warning(f"Cannot resume {self.filename} from {position}")
+            return
+        if hasattr(self.stream, "close"):
+            self.stream.close()
+        self.stream, _ = stream_from(self.filename, position["offset"])
+        self.line = position["line"]
+        self.offset = position["offset"]
+
+
+class SourceFileRange(Source):
+
+    """
+    A SourceFileRange reads the lines of a local uncompressed text file starting within a byte range.
+
+    A line belongs to the range where it starts, hence contiguous ranges deliver each line exactly once.
+    """
+
+    def __init__(self, filename: str, start: int = 0, end: int = None, provider: str = None):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.provider = provider if provider else basename(filename)
+
+    def __iter__(self):
+        with open(self.filename, "rb") as f:
+            if self.start:
+                f.seek(self.start - 1)
+                if f.read(1) != b"\n":
+                    f.readline()  # the line started in the previous range
+            offset = f.tell()
+            for line in f:
+                if self.end is not None and offset >= self.end:
+                    break
+                offset += len(line)
+                yield Row(self.provider, line.decode("utf-8").rstrip("\r\n"))
+
+    @staticmethod
+    def split(filename: str, n: int) -> List[Tuple[int, int]]:
+        """split a file into n contiguous byte ranges"""
+        size = Path(filename).stat().st_size
+        bounds = [size * i // n for i in range(n)] + [size]
+        return [(bounds[i], bounds[i + 1]) for i in range(n) if bounds[i] < bounds[i + 1]]
+
+
 class SourceStdin(SourceStream):
 
     def __init__(self, **kwargs):
@@ -181,12 +335,337 @@ class SourceSingle(Source):
         yield Row(self.provider, self.row)
 
 
+class SourceTransform(Source):
+
+    """
+    A SourceTransform applies lazy stages (map, filter, flat_map, batch, window) to the records of a Source.
+
+    Chained stages are fused : they are compiled into a single loop where each record is pushed from one stage to the next.
+    A Row is only created when a stage changes the record.
+    Records filtered out are counted in the agent statistics.
+    A stage raising on a record drops this record only : it is counted as an error,
+    and stored in the dead-letter store along with the stage name (map, filter, ...).
+    The position is the one of the underlying Source, provided that stages do not regroup records.
+    """
+
+    def __init__(self, source: Source, stages: Sequence[Tuple[str, Any]]):
+        self.source = source
+        self.stages = list(stages)
+        self.provider = getattr(source, "provider", "user")
+        self.stats = None
+        self.deadletter = None
+        self.current = self.provider  # provider of the row being transformed
+
+    def _then(self, kind: str, arg: Any):
+        return SourceTransform(self.source, self.stages + [(kind, arg)])
+
+    def attach(self, stats):
+        self.stats = stats
+        self.source.attach(stats)
+
+    def attach_deadletter(self, deadletter):
+        self.deadletter = deadletter
+        self.source.attach_deadletter(deadletter)
+
+    def stop(self):
+        self.source.stop()
+
+    def close(self):
+        self.source.close()
+
+    def _compile(self, out: list):
+        push, flushes = out.append, []
+        for kind, arg in reversed(self.stages):
+            push, flush = getattr(self, f"_stage_{kind}")(push, arg)
+            if flush:
+                flushes.insert(0, flush)
+        return push, flushes
+
+    def _failed(self, kind: str, record: Any, e: Exception):
+        logger.error(f"Cannot {kind} record : {e}")
+        if self.stats is not None:
+            self.stats.error += 1
+        if self.deadletter is not None:
+            self.deadletter.append(Row(self.current, record), kind, e)
+            if self.stats is not None:
+                self.stats.deadletter += 1
+
+    # the stages calling a user function catch its errors, the next stages catching their own
+
+    def _stage_map(self, push, f):
+        def map(record):
+            try:
+                r = f(record)
+            except Exception as e:
+                self._failed("map", record, e)
+                return
+            push(r)
+        return map, None
+
+    def _stage_filter(self, push, f):
+        stats = self.stats
+
+        def filter(record):
+            try:
+                keep = f(record)
+            except Exception as e:
+                self._failed("filter", record, e)
+                return
+            if keep:
+                push(record)
+            elif stats is not None:
+                stats.filtered += 1
+        return filter, None
+
+    def _stage_flat_map(self, push, f):
+        def flat_map(record):
+            try:
+                for r in f(record):
+                    push(r)
+            except Exception as e:
+                self._failed("flat_map", record, e)
+        return flat_map, None
+
+    def _stage_batch(self, push, n):
+        buffer = []
+
+        def batch(record):
+            nonlocal buffer
+            buffer.append(record)
+            if len(buffer) == n:
+                push(buffer)
+                buffer = []
+
+        def flush():
+            if buffer:
+                push(buffer)
+        return batch, flush
+
+    def _stage_window(self, push, arg):
+        n, step = arg
+        window = deque(maxlen=n)
+        count = 0
+
+        def slide(record):
+            nonlocal count
+            window.append(record)
+            count += 1
+            if count >= n and (count - n) % step == 0:
+                push(tuple(window))
+        return slide, None
+
+    def __iter__(self):
+        out = []
+        push, flushes = self._compile(out)
+        provider = self.provider
+        for row in self.source:
+            self.current = row.provider
+            push(row.record)
+            if not out:
+                continue
+            provider = row.provider
+            if len(out) == 1:
+                record = out.pop()
+                yield row if record is row.record else Row(provider, record)
+            else:
+                records = out[:]
+                out.clear()
+                for record in records:
+                    yield Row(provider, record)
+        for flush in flushes:
+            flush()
+        for record in out:
+            yield Row(provider, record)
+
+    def position(self) -> Any:
+        if any(kind not in ("map", "filter") for kind, _ in self.stages):
+            return None
+        return self.source.position()
+
+    def seek(self, position: Any):
+        self.source.seek(position)
+
+    @property
+    def resumable(self) -> bool:
+        # the stages regrouping or splitting records emit rows that do not match the inner positions
+        return self.source.resumable and all(kind in ("map", "filter") for kind, _ in self.stages)
+
+    def reset(self):
+        self.source.reset()
+
+
 class SourceMany(Source):
 
+    """
+    A SourceMany chains many sources.
+
+    Its position is the index of the current source along with the position inside this source.
+    """
+
     def __init__(self, sources: Sequence[Source], provider: str = "user"):
         self.sources = sources
         self.provider = provider
+        self.start = 0
+        self.current = 0
 
     def __iter__(self):
+        for i in range(self.start, len(self.sources)):
+            self.current = i
+            yield from self.sources[i]
+
+    def position(self) -> dict:
+        if not self.sources:
+            return None
+        position = self.sources[self.current].position()
+        return {"index": self.current, "position": position} if position is not None else None
+
+    def seek(self, position: dict):
+        self.start = self.current = position["index"]
+        self.sources[self.start].seek(position["position"])
+
+    @property
+    def resumable(self) -> bool:
+        return all(src.resumable for src in self.sources)
+
+    def attach(self, stats):
         for src in self.sources:
-            yield from src
+            src.attach(stats)
+
+
+class SourceFiles(SourceMany):
+
+    """
+    A SourceFiles chains local files, each file being opened by Source.from_file() only when it is reached.
+
+    With prefetch > 0, a pool of prefetch threads reads (and decompresses) the next files
+    while the current one is being processed. The rows read ahead are queued by chunks :
+    up to buffer rows of each of the prefetch + 1 files are held in memory, whatever the size of the files.
+
+    Its position is the index of the current file along with the position inside this file,
+    the number of rows delivered when prefetching.
+    """
+
+    def __init__(self, filenames: Iterable[str], prefetch: int = 0, buffer: int = 8192, **kwargs):
+        super().__init__([])
+        self.filenames = list(filenames)
+        self.prefetch = prefetch
+        self.chunk = min(buffer, PREFETCH_CHUNK)
+        self.depth = max(1, buffer // self.chunk)
+        self.kwargs = kwargs
+        self.source: Source = None
+        self.row = 0
+        self.resume_at: dict = None
+        self.stats = None
+
+    def open(self, i: int) -> Source:
+        src = Source.from_file(self.filenames[i], **self.kwargs)
+        if self.stats is not None:
+            src.attach(self.stats)
+        return src
+
+    def _load(self, i: int, rows: Queue, stopping: threading.Event):
+        """read the file i into the bounded queue, by chunks of rows, until stopping"""
+        def put(item) -> bool:
+            while not stopping.is_set():
+                try:
+                    rows.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+        try:
+            for chunk in chunked(self.open(i), self.chunk):
+                if not put(chunk):
+                    return
+            put(None)
+        except Exception as e:  # raised when the file is reached
+            put(e)
+
+    def done(self, i: int):
+        """called once all the rows of the file i have been processed"""
+        pass
+
+    def __iter__(self):
+        resume_at, self.resume_at = self.resume_at, None
+        if self.prefetch:
+            yield from self._prefetched(resume_at)
+            return
+        for i in range(self.start, len(self.filenames)):
+            self.current = i
+            self.source = self.open(i)
+            skip = 0
+            if resume_at is not None and i == self.start:
+                if "row" in resume_at:  # saved while prefetching
+                    skip = resume_at["row"]
+                else:
+                    self.source.seek(resume_at)
+            rows = iter(self.source)
+            consume(rows, skip)
+            yield from rows
+            if hasattr(self.source, "close"):
+                self.source.close()
+            self.source = None
+            self.done(i)
+
+    def _prefetched(self, resume_at: dict):
+        stopping = threading.Event()
+        with ThreadPoolExecutor(self.prefetch, thread_name_prefix="prefetch") as executor:
+            indexes = iter(range(self.start, len(self.filenames)))
+
+            def submit(i: int):
+                rows = Queue(self.depth)
+                executor.submit(self._load, i, rows, stopping)
+                return i, rows
+            pending = deque(submit(i) for i in islice(indexes, self.prefetch + 1))
+            try:
+                while pending:
+                    i, rows = pending.popleft()
+                    for j in islice(indexes, 1):
+                        pending.append(submit(j))
+                    self.current = i
+                    self.row = 0
+                    skip = 0
+                    if resume_at is not None and i == self.start:
+                        if "row" not in resume_at:
+                            logger.warning(f"Cannot resume {self.filenames[i]} from {resume_at} while prefetching")
+                        skip = self.row = resume_at.get("row", 0)
+                    while (chunk := rows.get()) is not None:
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        if skip:
+                            chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                        for row in chunk:
+                            self.row += 1
+                            yield row
+                    self.done(i)
+            finally:
+                stopping.set()  # the threads blocked on a full queue give up
+
+    def position(self) -> dict:
+        if self.prefetch:
+            return {"index": self.current, "position": {"row": self.row}}
+        position = self.source.position() if self.source else None
+        return {"index": self.current, "position": position} if position is not None else None
+
+    def seek(self, position: dict):
+        self.start = self.current = position["index"]
+        self.resume_at = position["position"]
+
+    @staticmethod
+    def seekable(filename: str) -> bool:
+        """tell whether the Source opened by Source.from_file() for this file can be resumed"""
+        from pyngsi.sources.source_archive import TAR_EXTENSIONS
+        registered = Source.registered_extensions
+        ext = (''.join(Path(filename).suffixes))[1:]
+        if "*" in registered or ext in registered:
+            klass, _ = registered.get("*") or registered[ext]
+            return klass.seek is not Source.seek
+        return not filename.endswith(TAR_EXTENSIONS)
+
+    @property
+    def resumable(self) -> bool:
+        # prefetched files resume by row count, whatever their type
+        return self.prefetch > 0 or all(self.seekable(filename) for filename in self.filenames)
+
+    def attach(self, stats):
+        self.stats = stats
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import tarfile
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from fnmatch import fnmatch
+from io import BytesIO, TextIOWrapper
+from os.path import basename
+from typing import IO, Iterator, Sequence, Union
+from zipfile import ZipFile
+from loguru import logger
+
+from pyngsi.sources.source import Row, Source, SourceStream
+from pyngsi.sources.source_json import SourceJsonStream
+from pyngsi.sources.source_ndjson import SourceNdjson
+
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class SourceArchiveException(Exception):
+    pass
+
+
+def is_archive(filename: str) -> bool:
+    return filename.endswith(TAR_EXTENSIONS) or filename.endswith(".zip")
+
+
+def member_source(member: str, binary: IO[bytes], provider: str) -> Source:
+    """return the Source reading an archive member, according to its extension"""
+    stream = TextIOWrapper(binary, encoding="utf-8", newline="")
+    if member.endswith(".json"):  # decoded element by element, not loaded at once
+        return SourceJsonStream(stream=stream, provider=provider)
+    if member.endswith((".jsonl", ".ndjson")):
+        return SourceNdjson(stream, provider=provider)
+    return SourceStream(stream, provider=provider)
+
+
+def _read_member(filename: str, member: str) -> bytes:
+    with ZipFile(filename) as zf:
+        return zf.read(member)
+
+
+class SourceArchive(Source):
+
+    """
+    A SourceArchive streams the members of a local zip or tar (possibly gzip, bz2 or xz compressed) archive.
+
+    Members are read without being extracted to disk.
+    Only the members whose name matches one of the patterns are read, i.e. patterns=["*.csv", "data/*.json"].
+    Members are read as json, json lines or text according to their extension.
+    The provider of the rows is archive!member.
+
+    Zip members are compressed independently : with workers > 0, a pool of threads decompresses
+    up to 2 x workers members in advance. Tar archives are compressed as a whole hence read sequentially.
+    """
+
+    def __init__(self, filename: str, patterns: Union[str, Sequence[str]] = "*", provider: str = None,
+                 workers: int = 0):
+        if not is_archive(filename):
+            raise SourceArchiveException(f"unknown archive format {filename}")
+        self.filename = filename
+        self.patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        self.provider = provider if provider else basename(filename)
+        self.workers = workers
+        self.stats = None
+
+    def match(self, member: str) -> bool:
+        return any(fnmatch(member, p) for p in self.patterns)
+
+    def attach(self, stats):
+        self.stats = stats
+
+    def _rows(self, member: str, binary: IO[bytes]) -> Iterator[Row]:
+        logger.info(f"read {self.filename}!{member}")
+        src = member_source(member, binary, f"{self.provider}!{member}")
+        if self.stats is not None:
+            src.attach(self.stats)
+        yield from src
+
+    def __iter__(self):
+        if self.filename.endswith(".zip"):
+            yield from self._zip()
+        else:
+            yield from self._tar()
+
+    def _zip(self):
+        with ZipFile(self.filename) as zf:
+            members = [m.filename for m in zf.infolist() if not m.is_dir() and self.match(m.filename)]
+            if not self.workers:
+                for member in members:
+                    with zf.open(member) as binary:
+                        yield from self._rows(member, binary)
+                return
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="unzip") as executor:
+            pending: deque = deque()
+            try:
+                for member in members:
+                    pending.append((member, executor.submit(_read_member, self.filename, member)))
+                    if len(pending) >= 2 * self.workers:
+                        yield from self._decompressed(*pending.popleft())
+                while pending:
+                    yield from self._decompressed(*pending.popleft())
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def _decompressed(self, member: str, future) -> Iterator[Row]:
+        yield from self._rows(member, BytesIO(future.result()))
+
+    def _tar(self):
+        with tarfile.open(self.filename, mode="r:*") as tf:  # members are listed and read in order
+            for info in tf:
+                if not info.isfile() or not self.match(info.name):
+                    continue
+                yield from self._rows(info.name, tf.extractfile(info))
+
+    def reset(self):
+        pass
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+
+from datetime import datetime, date
+from itertools import islice
+from os.path import basename
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Union
+from more_itertools import consume
+from loguru import logger
+
+from pyngsi.sources.source import Row, SourceStream
+from pyngsi.utils import stream_from
+
+
+class SourceCsvException(Exception):
+    pass
+
+
+def _bool(value: str) -> bool:
+    if value == "":  # never raises, so empty values are not caught by the fallback
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "y", "t")
+
+
+def _latlon(value: str):
+    """parse a "lat,lon" or "lat lon" pair"""
+    lat, lon = value.replace(",", " ").split()
+    return float(lat), float(lon)
+
+
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": _bool,
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "latlon": _latlon,
+}
+
+
+def converter(spec: Union[str, Callable[[str], Any]]) -> Callable[[str], Any]:
+    """
+    Return the function converting a column value.
+
+    spec is either a callable, a name from CONVERTERS, or "datetime:<format>" for a strptime() format.
+    Empty values are converted to None, except for str columns.
+    """
+    if callable(spec):
+        f = spec
+    elif spec.startswith("datetime:"):
+        fmt = spec[len("datetime:"):]
+        def f(v): return datetime.strptime(v, fmt)
+    elif spec in CONVERTERS:
+        f = CONVERTERS[spec]
+    else:
+        raise SourceCsvException(f"unknown column type {spec}")
+    return f
+
+
+def _or_none(f: Callable[[str], Any]) -> Callable[[str], Any]:
+    if f is str:
+        return f
+    return lambda v: f(v) if v != "" else None
+
+
+class SourceCsv(SourceStream):
+
+    """
+    A SourceCsv reads delimited text with the csv module and delivers typed records.
+
+    stream is either an iterable of lines or a filename (possibly gzip or zip compressed),
+    hence SourceCsv can be given to Source.register_extension().
+    header is True to read column names from the first line, or the list of column names.
+    mapping renames columns, i.e. {"temp": "temperature"}.
+    types gives the type of the columns by name (or by index without header), see converter().
+    Columns without type are kept as strings.
+    records is "dict" or "tuple". Without header, dict keys are column indexes.
+
+    Rows are converted in batches of batch_size rows, column by column.
+    Rows that cannot be converted are logged and counted in malformed, and as errors in the agent statistics.
+
+    Its position is the number of rows read after the header.
+    """
+
+    def __init__(self, stream: Union[str, Iterable[str]], provider: str = "user", delimiter: str = ";",
+                 header: Union[bool, Sequence[str]] = False, mapping: Dict[str, str] = None,
+                 types: Dict[Union[str, int], Union[str, Callable]] = None, records: str = "dict",
+                 batch_size: int = 1024, **fmtparams):
+        if isinstance(stream, str):
+            filename = stream
+            stream, _ = stream_from(filename)
+            if provider == "user":
+                provider = basename(filename)
+        if records not in ("dict", "tuple"):
+            raise SourceCsvException(f"records must be dict or tuple, not {records}")
+        super().__init__(stream, provider)
+        self.reader = csv.reader(stream, delimiter=delimiter, **fmtparams)
+        self.mapping = mapping if mapping else {}
+        self.types = {self.mapping.get(k, k): v for k, v in types.items()} if types else {}
+        self.records = records
+        self.batch_size = batch_size
+        self.malformed = 0
+        self.stats = None
+        self.columns: List = None
+        self.converters: List = None
+        if header is True:
+            self._set_columns(next(self.reader))
+        elif header:
+            self._set_columns(list(header))
+
+    def _set_columns(self, names: List):
+        self.columns = [self.mapping.get(name, name) for name in names]
+        unknown = set(self.types) - set(self.columns)
+        if unknown:
+            raise SourceCsvException(f"types given for unknown columns {unknown}")
+        self.converters = [converter(self.types[c]) if c in self.types else None for c in self.columns]
+        self.safe_converters = [_or_none(f) if f else None for f in self.converters]
+
+    def attach(self, stats):
+        self.stats = stats
+
+    def _malformed(self, line: int, reason: str):
+        self.malformed += 1
+        if self.stats is not None:
+            self.stats.error += 1
+        logger.warning(f"malformed row at line {line} of {self.provider} : {reason}")
+
+    def _convert(self, rows: List[List[str]]) -> List[tuple]:
+        """convert a batch of rows column by column, fallback to row by row on error"""
+        columns = list(zip(*rows))
+        try:
+            for i, (f, safe) in enumerate(zip(self.converters, self.safe_converters)):
+                if f is not None:
+                    try:
+                        columns[i] = list(map(f, columns[i]))
+                    except ValueError:  # maybe empty values
+                        columns[i] = list(map(safe, columns[i]))
+            return list(zip(*columns))
+        except Exception:
+            return [self._convert_row(row) for row in rows]
+
+    def _convert_row(self, row: List[str]):
+        try:
+            return tuple(v if f is None else f(v) for f, v in zip(self.safe_converters, row))
+        except Exception as e:
+            return e
+
+    def __iter__(self):
+        consume(self.reader, self.start)
+        self.line = self.start
+        provider = self.provider
+        while True:
+            batch = list(islice(self.reader, self.batch_size))
+            if not batch:
+                return
+            if self.columns is None:
+                self._set_columns(list(range(len(next((r for r in batch if r), [])))))
+            ncols = len(self.columns)
+            first = self.line
+            rows, lines = [], []
+            for i, row in enumerate(batch, first + 1):
+                if len(row) == ncols:
+                    rows.append(row)
+                    lines.append(i)
+                elif row:
+                    self._malformed(i, f"{len(row)} columns instead of {ncols}")
+            converted = self._convert(rows) if rows else []
+            if self.records == "dict":
+                columns = self.columns
+                converted = [v if isinstance(v, Exception) else dict(zip(columns, v)) for v in converted]
+            self.line = first
+            for i, values in zip(lines, converted):
+                self.line = i
+                if isinstance(values, Exception):
+                    self._malformed(i, str(values))
+                    continue
+                yield Row(provider, values)
+            self.line = first + len(batch)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import time
+
+from fnmatch import fnmatch
+from typing import Dict, List, Sequence, Union
+from loguru import logger
+
+from pyngsi.sources.source import SourceFiles
+from pyngsi.checkpoint import Checkpoint
+
+
+class SourceDirectoryException(Exception):
+    pass
+
+
+def file_hash(filename: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SourceDirectory(SourceFiles):
+
+    """
+    A SourceDirectory reads the new or changed files dropped in a local directory.
+
+    Each time it is iterated (i.e. on each Scheduler run), the directory is scanned for the files matching the patterns.
+    A manifest of the files processed (size, mtime, content hash) is kept in the local JSON file manifest,
+    so that only new or changed files are read. A file whose mtime changed but not its content is not read again.
+
+    A file modified less than settle seconds ago is taken as still being written : it is left for the next scan.
+
+    Files are read as Source.from_file() does, with workers > 0 the next files are read by a pool of threads.
+    Once processed, a file is recorded in the manifest then, according to after :
+    None keeps it, "move" moves it to the done directory, "delete" deletes it.
+    """
+
+    def __init__(self, path: str, patterns: Union[str, Sequence[str]] = "*", manifest: str = None,
+                 workers: int = 0, after: str = None, done: str = None, settle: float = 1.0, **kwargs):
+        if after not in (None, "move", "delete"):
+            raise SourceDirectoryException(f"after must be None, move or delete, not {after}")
+        if after == "move" and not done:
+            raise SourceDirectoryException("done directory required to move processed files")
+        super().__init__([], prefetch=workers, **kwargs)
+        self.path = path
+        self.patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        self.store = Checkpoint(manifest) if manifest else None
+        self.manifest: Dict[str, dict] = {}
+        self.after = after
+        self.done_dir = done
+        self.settle = settle
+        self.entries: List[dict] = []
+
+    def scan(self) -> List[str]:
+        """return the files to be read, update the manifest with the files touched but unchanged"""
+        if self.store:
+            self.manifest = self.store.load() or {}
+        present, filenames, entries = set(), [], []
+        now = time.time()
+        with os.scandir(self.path) as it:
+            for e in sorted(it, key=lambda e: e.name):
+                if not e.is_file() or not any(fnmatch(e.name, p) for p in self.patterns):
+                    continue
+                present.add(e.name)
+                st = e.stat()
+                if now - st.st_mtime < self.settle:
+                    logger.debug(f"{e.name} is being written")
+                    continue
+                entry = {"size": st.st_size, "mtime": st.st_mtime}
+                known = self.manifest.get(e.name)
+                if known and known["size"] == entry["size"] and known["mtime"] == entry["mtime"]:
+                    continue
+                entry["hash"] = file_hash(e.path)
+                if known and known.get("hash") == entry["hash"]:
+                    self.manifest[e.name] = entry
+                    continue
+                filenames.append(e.path)
+                entries.append(dict(entry, name=e.name))
+        for name in set(self.manifest) - present:  # files gone
+            del self.manifest[name]
+        logger.info(f"{len(filenames)} new or changed files in {self.path}")
+        self.entries = entries
+        return filenames
+
+    def __iter__(self):
+        self.filenames = self.scan()
+        self.start = self.current = 0
+        yield from super().__iter__()
+        self._save()
+
+    def done(self, i: int):
+        entry = dict(self.entries[i])
+        name = entry.pop("name")
+        if self.after == "move":
+            os.makedirs(self.done_dir, exist_ok=True)
+            shutil.move(self.filenames[i], os.path.join(self.done_dir, name))  # done may be on another filesystem
+        elif self.after == "delete":
+            os.remove(self.filenames[i])
+        if self.after:
+            self.manifest.pop(name, None)
+        else:
+            self.manifest[name] = entry
+        self._save()
+
+    @property
+    def resumable(self) -> bool:
+        return False  # each scan starts over, the manifest records the files processed
+
+    def _save(self):
+        if self.store:
+            self.store.save(self.manifest)
+
+    def reset(self):
+        pass
@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from typing import Tuple, List, Callable
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from os.path import exists, getsize
+from typing import IO, Dict, Tuple, List, Callable
+from zipfile import ZipFile
 from loguru import logger
-from pyngsi.ftpclient import FtpClient
+from pyngsi.ftpclient import FtpClient, FtpClientException, FtpClientPool, FtpStats
+from pyngsi.checkpoint import Checkpoint
 
 from pyngsi.sources.source import Source
+from pyngsi.sources.source_archive import member_source
 
 
-# a file downloaded from FTP : (local_filename, remote_filename)
+# a file downloaded from FTP : (local_filename, remote_filename), no local file when streamed
 FtpFile = Tuple[str, str]
 
+# zip files streamed are spooled to disk beyond this size
+SPOOL_SIZE = 16 * 1024 * 1024
+
 
 class SourceFtp(Source):
     """
@@ -23,6 +36,27 @@ class SourceFtp(Source):
     Once the files are downloaded (into a temp dir), the connection to the FTP Server is closed.
     Then the Source reads the downloaded files to deliver rows as usual, by iterating on file records.
     At the end, when the Source is closed, the temp dir is cleaned.
+
+    With connections > 1, files are downloaded in parallel over a pool of connections,
+    a failed download being retried up to retries times on a new connection.
+    Download statistics (files, bytes, throughput) are available in ftp_stats.
+
+    With stream, files are not downloaded : each file is read while being transferred,
+    decompressed on the fly if gzip, then read as json, json lines or text as SourceArchive members are.
+    The connection is kept open until all files are read.
+    Zip files cannot be read sequentially, they are spooled in memory (on disk beyond spool_size bytes).
+
+    With manifest, the SourceFtp is incremental : remote files are listed with MLSD,
+    and only the files whose size or modify time differ from the ones recorded in the local JSON file manifest are read.
+    A file is recorded once processed. Downloads go to workdir (default manifest.d), each file being removed once processed.
+    An interrupted download is resumed (REST) on the next run, provided the remote file has not changed.
+
+    With persistent, the connections are not closed at the end of a run but reused by the next ones (reset()),
+    saving the connection, TLS and login handshakes on each Scheduler run.
+    While idle, a NOOP is sent every keepalive seconds, and a connection found dead is reopened before use.
+    The persistent connections are closed by close().
+
+    Its position is the remote filename being read along with the position inside this file.
     """
 
     def __init__(self, host: str, user: str = "anonymous",
@@ -31,7 +65,15 @@ class SourceFtp(Source):
                  use_tls: bool = False,
                  f_match: Callable[[str], bool] = lambda x: False,
                  provider: str = "user",
-                 source_factory=Source.from_file):
+                 source_factory=Source.from_file,
+                 connections: int = 1,
+                 retries: int = 2,
+                 stream: bool = False,
+                 spool_size: int = SPOOL_SIZE,
+                 manifest: str = None,
+                 workdir: str = None,
+                 persistent: bool = False,
+                 keepalive: float = 60):
         """
         Parameters
         ----------
@@ -47,31 +89,137 @@ class SourceFtp(Source):
         self.f_match = f_match
         self.provider = provider
         self.source_factory = source_factory
+        self.connections = connections
+        self.retries = retries
+        self.stream = stream
+        self.spool_size = spool_size
+        self.manifest = manifest
+        self.workdir = workdir
+        self.persistent = persistent
+        self.keepalive = keepalive
+        self.ftp: FtpClient = None
+        self.pool: FtpClientPool = None
+
+        # incremental mode : only new or changed files, downloads kept in workdir to be resumed
+        self.store = Checkpoint(manifest) if manifest else None
+        if manifest and not stream:
+            self.workdir = workdir if workdir else f"{manifest}.d"
+            os.makedirs(self.workdir, exist_ok=True)
+
+        self._poll()
+
+    def _connect(self):
+        if self.ftp is not None and self.persistent:
+            self.ftp.ensure_connected()
+            return
+        self.ftp = FtpClient(self.host, self.user, self.passwd, self.use_tls, tmpdir=self.workdir)
+        if self.persistent and self.keepalive:
+            self.ftp.start_keepalive(self.keepalive)
+
+    def _poll(self):
+        """list the remote files then download them"""
+        self.ftp_stats = FtpStats()
+        self.resume_from = None
+        self.current: FtpFile = None
+        self.source: Source = None
+        self.synced: Dict[str, dict] = (self.store.load() or {}) if self.store else {}
+        self.facts: Dict[str, dict] = {}
 
         # connect to FTP server
-        self.ftp = FtpClient(host, user, passwd, use_tls)
+        self._connect()
 
         # retrieve a list of files we're interested in
-        remote_files = self._retrieve_filelist(paths, f_match)
+        if self.store:
+            remote_files = self._retrieve_changed(self.paths, self.f_match)
+        else:
+            remote_files = self._retrieve_filelist(self.paths, self.f_match)
+
+        if self.stream:  # files are streamed when iterating, keep connected
+            self.downloaded_files: List[FtpFile] = [(None, remote) for remote in remote_files]
+            return
 
         # download files : a list of (local_filename, remote_filename)
-        self.downloaded_files: List[FtpFile] = self._download_files(
-            remote_files)
+        if self.connections > 1:
+            if not self.persistent:
+                self.ftp.close()
+            if self.pool is None:
+                self.pool = FtpClientPool(self.host, self.user, self.passwd, self.use_tls,
+                                          self.connections, self.retries, tmpdir=self.workdir)
+            else:
+                self.pool.refresh()
+            self.pool.stats = self.ftp_stats
+            versions = {r: facts.get("modify", "") for r, facts in self.facts.items()} if self.store else None
+            self.downloaded_files: List[FtpFile] = self.pool.download_all(remote_files, versions)
+            if not self.persistent:
+                self.pool.close()
+        else:
+            self.downloaded_files: List[FtpFile] = self._download_files(
+                remote_files)
+            if not self.persistent:
+                # disconnect from FTP server
+                self.ftp.close()
 
         if len(self.downloaded_files) != len(remote_files):
             logger.critical(f"Some files have not been downloaded.")
 
-        # disconnect from FTP server
-        self.ftp.close()
-
     def __iter__(self):
-        for ftpfile in self.downloaded_files:
+        files = self.downloaded_files
+        resume_from, self.resume_from = self.resume_from, None
+        if resume_from:
+            remotes = [remotename for _, remotename in files]
+            if resume_from["remote"] in remotes:
+                files = files[remotes.index(resume_from["remote"]):]
+            else:
+                logger.warning(f"Cannot resume from {resume_from['remote']} : not found")
+                resume_from = None
+        for ftpfile in files:
             localname, remotename = ftpfile
-            logger.info(f"process local {localname}")
             provider = self.provider if self.provider else f"ftp://{self.host}{remotename}"
-            source = self.source_factory(localname, provider)
-            yield from source
+            self.current = ftpfile
+            if self.stream:
+                logger.info(f"stream remote {remotename}")
+                with self.ftp.stream(remotename) as binary:
+                    self.source = self._streamed(remotename, binary, provider)
+                    yield from self._rows(resume_from)
+            else:
+                logger.info(f"process local {localname}")
+                self.source = self.source_factory(localname, provider)
+                yield from self._rows(resume_from)
+            resume_from = None
+            if self.store:
+                self._synced(ftpfile)
+        if self.stream and not self.persistent:
+            self.ftp.close()
         self.ftp.clean()
+        if self.pool:
+            self.pool.clean()
+
+    def _rows(self, resume_from: dict):
+        if resume_from:
+            self.source.seek(resume_from["position"])
+        yield from self.source
+
+    def _streamed(self, remote: str, binary: IO[bytes], provider: str) -> Source:
+        """decompress a remote file while it is being transferred"""
+        if remote.endswith(".gz"):
+            return member_source(remote[:-3], gzip.GzipFile(fileobj=binary), provider)
+        if remote.endswith(".zip"):  # the zip directory is at the end, rewind needed
+            spool = tempfile.SpooledTemporaryFile(self.spool_size)
+            shutil.copyfileobj(binary, spool)
+            spool.seek(0)
+            zf = ZipFile(spool)
+            member = zf.namelist()[0]
+            return member_source(member, zf.open(member), provider)
+        return member_source(remote, binary, provider)
+
+    def position(self) -> dict:
+        if self.source is None:
+            return None
+        position = self.source.position()
+        return {"remote": self.current[1], "position": position} if position is not None else None
+
+    def seek(self, position: dict):
+        self.resume_from = position
 
     def _retrieve_filelist(self, paths, f_match=lambda x: True) -> List[str]:
         remote_files = []
@@ -82,14 +230,69 @@ class SourceFtp(Source):
         logger.info(f"Found {len(remote_files)} matching files")
         return remote_files
 
+    def _retrieve_changed(self, paths, f_match=lambda x: True) -> List[str]:
+        """list the files with MLSD, keep the ones whose size or modify time differ from the manifest"""
+        remote_files = []
+        for path in paths:
+            for remote, facts in self.ftp.retrieve_facts(path):
+                if not f_match(remote):
+                    continue
+                entry = {"size": facts.get("size"), "modify": facts.get("modify")}
+                if facts and self.synced.get(remote) == entry:
+                    continue
+                self.facts[remote] = entry
+                remote_files.append(remote)
+        logger.info(f"Found {len(remote_files)} new or changed matching files")
+        return remote_files
+
+    def _synced(self, ftpfile: FtpFile):
+        """record a processed file in the manifest"""
+        localname, remotename = ftpfile
+        self.synced[remotename] = self.facts.get(remotename, {})
+        self.store.save(self.synced)
+        if localname and exists(localname):
+            os.remove(localname)
+            # remove the remote folders left empty in workdir
+            folder, workdir = os.path.dirname(localname), os.path.normpath(self.workdir)
+            while os.path.normpath(folder) != workdir and not os.listdir(folder):
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
+
+    def _download(self, remote: str) -> str:
+        if self.store:
+            return self.ftp.download(remote, resume=True, version=self.facts.get(remote, {}).get("modify") or "")
+        return self.ftp.download(remote)
+
     def _download_files(self, remote_files: List[str]) -> List[FtpFile]:
-        try:
-            downloaded_files = [(self.ftp.download(remote), remote)
-                                for remote in remote_files]
-        except Exception as e:
-            logger.critical(f"Problem while downloading files : {e}")
+        start = time.perf_counter()
+        downloaded_files = []
+        for remote in remote_files:
+            try:
+                downloaded_files.append((self._download(remote), remote))
+            except Exception as e:
+                self.ftp_stats.errors += 1
+                logger.critical(f"Problem while downloading files : {e}")
+        self.ftp_stats.seconds += time.perf_counter() - start
+        self.ftp_stats.files += len(downloaded_files)
+        self.ftp_stats.bytes += sum(getsize(local) for local, _ in downloaded_files if exists(local))
+        logger.info(f"Downloaded {self.ftp_stats}")
         return downloaded_files
 
+    def close(self):
+        """close the persistent connections and remove the temp dirs"""
+        if self.pool:
+            self.pool.close()
+            self.pool.clean()
+            self.pool = None
+        if self.ftp:
+            try:
+                self.ftp.close()
+            except FtpClientException as e:  # i.e. already closed by the server
+                logger.warning(e)
+            self.ftp.clean()
+            self.ftp = None
+
     def reset(self):
-        self.__init__(self.host, self.user, self.passwd,
-                      self.paths, self.f_match, self.provider, self.source_factory)
+        if not self.persistent:
+            self.close()
+        self._poll()
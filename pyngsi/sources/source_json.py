@@ -4,35 +4,71 @@
 import sys
 import json
 import gzip
+import re
 
-from typing import Tuple, List, Callable
+from typing import Tuple, List, Callable, Union
 from loguru import logger
 from os.path import basename
 from zipfile import ZipFile
 from io import TextIOWrapper
+from itertools import islice
 
 from pyngsi.sources.source import Row, Source
+from pyngsi.utils import stream_from
+from pyngsi.jsonpath import JsonPath
 
 
 class SourceJson(Source):
-    """Read JSON formatted data from Standard Input"""
+    """
+    Read JSON formatted data from Standard Input
 
-    def __init__(self, input: str, provider: str = "user", jsonpath: str = None):
+    jsonpath is either a list of keys, or a JSONPath expression (i.e. "$.dataset.data[?(@.speed > 0)]").
+    An expression is compiled once, then its matches are delivered as they are found.
+    A match that is a list delivers its elements.
+
+    Its position is the index of the next element.
+    """
+
+    def __init__(self, input: str, provider: str = "user", jsonpath: Union[str, List, JsonPath] = None):
         self.json_obj = input
         self.provider = provider
-        self.path = jsonpath
+        self.path = JsonPath(jsonpath) if isinstance(jsonpath, str) else jsonpath
+        self.start = 0
+        self.index = 0
 
     def __iter__(self):
+        self.index = self.start
+        if isinstance(self.path, JsonPath):
+            for j in islice(self._matches(), self.start, None):
+                self.index += 1
+                yield Row(self.provider, j)
+            return
+
         obj = self.json_obj
         if self.path:
             obj = self.jsonpath(self.path)
 
         if isinstance(obj, list):
-            for j in obj:
+            for j in islice(obj, self.start, None):
+                self.index += 1
                 yield Row(self.provider, j)
-        else:
+        elif self.start == 0:
+            self.index = 1
             yield Row(self.provider, obj)
 
+    def _matches(self):
+        for match in self.path.find(self.json_obj):
+            if isinstance(match, list):
+                yield from match
+            else:
+                yield match
+
+    def position(self) -> dict:
+        return {"index": self.index}
+
+    def seek(self, position: dict):
+        self.start = self.index = position["index"]
+
     def jsonpath(self, path: List):
         obj = self.json_obj
         for p in path:
@@ -44,3 +80,209 @@ class SourceJson(Source):
 
     def reset(self):
         pass
+
+
+class SourceJsonException(Exception):
+    pass
+
+
+_WS = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_STRUCT = re.compile(r'["\[\]{}]')
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")  # what may follow a number cut off at the end of the buffer
+_CUT = 6  # the longest token that may be cut off at the end of the buffer yet fail to decode, i.e. \uXXXX or false
+
+
+class JsonReader():
+    """
+    An incremental JSON reader.
+
+    The text stream is read chunk by chunk.
+    Values are decoded one at a time, and the values that are not wanted are skipped without being decoded.
+    Hence memory is bounded by the size of the largest decoded value.
+    A value spanning many chunks is read with reads doubling in size, so that it is decoded a few times only.
+    Malformed JSON is reported as soon as it is read, a value larger than max_size characters is rejected.
+    """
+
+    def __init__(self, stream, chunk_size: int = 65536, max_size: int = 1 << 28):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = None) -> bool:
+        if self.eof:
+            return False
+        if len(self.buf) - self.pos >= self.max_size:
+            raise SourceJsonException(f"JSON value larger than {self.max_size} characters")
+        data = self.stream.read(size if size else self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """return the next non-whitespace character, empty at the end of the stream"""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, c: str):
+        found = self.peek()
+        if found != c:
+            raise SourceJsonException(f"expected '{c}' but found '{found}'")
+        self.pos += 1
+
+    def decode(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # the error is not due to the end of the buffer, reading more would not fix it
+                if e.pos + _CUT < len(self.buf) and not e.msg.startswith("Unterminated string"):
+                    raise SourceJsonException(f"invalid JSON : {e}")
+                if self._fill(size):
+                    size *= 2
+                    continue
+                raise SourceJsonException(f"invalid JSON : {e}")
+            # a number may have been cut off, i.e. 12 decoded from 12. or 1 from 1e
+            if isinstance(obj, (int, float)) and not isinstance(obj, bool) \
+                    and _NUMBER_TAIL.fullmatch(self.buf, end) and self._fill(size):
+                size *= 2
+                continue
+            self.pos = end
+            return obj
+
+    def skip(self):
+        """skip the next value without decoding it"""
+        if self.peek() not in "[{":
+            self.decode()
+            return
+        depth = 0
+        i = self.pos
+        size = self.chunk_size
+        while True:
+            m = _STRUCT.search(self.buf, i)
+            if m is None:
+                i = len(self.buf)
+            elif m.group() == '"':
+                sm = _STRING.match(self.buf, m.start())
+                if sm:
+                    i = sm.end()
+                    continue
+                i, m = m.start(), None  # truncated string, scan it again once filled
+            if m is None:
+                offset = i - self.pos
+                if not self._fill(size):
+                    raise SourceJsonException("unexpected end of JSON")
+                size *= 2
+                i = self.pos + offset
+                continue
+            i = m.end()
+            depth += 1 if m.group() in "[{" else -1
+            if depth == 0:
+                self.pos = i
+                return
+
+    def descend(self, path: List):
+        """move to the value at the given path of keys and indexes"""
+        for p in path:
+            if isinstance(p, int):
+                self.expect("[")
+                for _ in range(p):
+                    self.skip()
+                    self.expect(",")
+                continue
+            self.expect("{")
+            while True:
+                if self.peek() == "}":
+                    raise KeyError(p)
+                key = self.decode()
+                self.expect(":")
+                if key == p:
+                    break
+                self.skip()
+                if self.peek() == ",":
+                    self.pos += 1
+
+    def elements(self, start: int = 0):
+        """yield the elements of the array at the current position, or the value itself if not an array"""
+        if self.peek() != "[":
+            if start == 0:
+                yield self.decode()
+            return
+        self.pos += 1
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        i = 0
+        while True:
+            if i < start:
+                self.skip()
+            else:
+                yield self.decode()
+            i += 1
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise SourceJsonException(f"expected ',' or ']' but found '{c}'")
+
+
+class SourceJsonStream(Source):
+    """
+    Read a huge JSON document incrementally
+
+    Elements of the array found at jsonpath are decoded and delivered one at a time.
+    The document is read from a file (handling gzip and zip compression) or from a given text stream.
+    Its position is the index of the next element.
+    An element larger than max_size characters raises a SourceJsonException.
+    """
+
+    def __init__(self, filename: str = None, provider: str = None, jsonpath: List = None,
+                 stream=None, chunk_size: int = 65536, max_size: int = 1 << 28):
+        self.filename = filename
+        self.stream = stream
+        self.provider = provider if provider else (basename(filename) if filename else "user")
+        self.path = jsonpath if jsonpath else []
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.start = 0
+        self.index = 0
+
+    def __iter__(self):
+        stream = self.stream if self.stream else stream_from(self.filename)[0]
+        reader = JsonReader(stream, self.chunk_size, self.max_size)
+        self.index = self.start
+        try:
+            try:
+                reader.descend(self.path)
+            except KeyError as e:
+                logger.warning(f"jsonpath {self.path} not found : {e}")
+                return
+            for obj in reader.elements(self.start):
+                self.index += 1
+                yield Row(self.provider, obj)
+        finally:
+            if not self.stream:
+                stream.close()
+
+    def position(self) -> dict:
+        return {"index": self.index}
+
+    def seek(self, position: dict):
+        self.start = self.index = position["index"]
+
+    def reset(self):
+        pass
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from os.path import basename
+from typing import Iterator, List, Tuple
+from loguru import logger
+
+from pyngsi.sources.source import Row, Source
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def split_lines(data: bytes) -> List[str]:
+    """decode a newline-aligned chunk and split it into lines, the same way Source.from_file() does"""
+    if b"\r" in data:  # universal newlines
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    lines = data.decode("utf-8").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def chunks(mm, size: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """yield (start, end) newline-aligned chunks"""
+    start = 0
+    while start < size:
+        end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def _read_chunk(filename: str, start: int, end: int) -> List[str]:
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return split_lines(mm[start:end])
+
+
+class SourceMmap(Source):
+
+    """
+    A SourceMmap reads a local uncompressed text file through a memory map.
+
+    The file is split into newline-aligned chunks, each chunk being decoded and split into lines in bulk.
+    With workers > 0, chunks are decoded by a pool of processes, up to 2 x workers chunks in advance.
+    Rows are the same as the ones delivered by Source.from_file().
+    """
+
+    def __init__(self, filename: str, provider: str = None, chunk_size: int = CHUNK_SIZE, workers: int = 0):
+        self.filename = filename
+        self.provider = provider if provider else basename(filename)
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def __iter__(self):
+        size = os.path.getsize(self.filename)
+        if size == 0:
+            return
+        with open(self.filename, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if self.workers:
+                    yield from self._parallel(mm, size)
+                else:
+                    provider = self.provider
+                    for start, end in chunks(mm, size, self.chunk_size):
+                        for line in split_lines(mm[start:end]):
+                            yield Row(provider, line)
+
+    def _parallel(self, mm, size: int):
+        logger.debug(f"split {self.filename} with {self.workers} workers")
+        provider = self.provider
+        with ProcessPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for start, end in chunks(mm, size, self.chunk_size):
+                pending.append(executor.submit(_read_chunk, self.filename, start, end))
+                if len(pending) >= 2 * self.workers:
+                    for line in pending.popleft().result():
+                        yield Row(provider, line)
+            while pending:
+                for line in pending.popleft().result():
+                    yield Row(provider, line)
+
+    def reset(self):
+        pass
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from typing import Iterable, List, Tuple
+from os.path import basename
+from more_itertools import consume
+from loguru import logger
+
+from pyngsi.sources.source import Row, SourceStream
+from pyngsi.utils import stream_from
+
+# outcome of the decoding of a line
+OK, BLANK, MALFORMED = 0, 1, 2
+
+
+def decode_lines(lines: List[str]) -> List[Tuple[int, object]]:
+    """decode a batch of JSON lines, return an (outcome, record or error) tuple per line"""
+    loads = json.loads
+    decoded = []
+    for line in lines:
+        if not line or line.isspace():
+            decoded.append((BLANK, None))
+            continue
+        try:
+            decoded.append((OK, loads(line)))
+        except ValueError as e:
+            decoded.append((MALFORMED, str(e)))
+    return decoded
+
+
+class SourceNdjson(SourceStream):
+
+    """
+    A SourceNdjson reads newline-delimited JSON (aka JSON Lines) from a stream.
+
+    Records are delivered already decoded.
+    Lines are decoded in batches of batch_size lines.
+    With workers > 0, batches are decoded by a pool of processes, up to 2 x workers batches in advance.
+    Blank lines are skipped. Malformed lines are logged and counted in malformed, and as errors in the agent statistics.
+
+    Its position is the number of lines read.
+    """
+
+    def __init__(self, stream: Iterable, provider: str = "user", batch_size: int = 1024, workers: int = 0):
+        super().__init__(stream, provider)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.malformed = 0
+        self.stats = None
+
+    @classmethod
+    def from_file(cls, filename: str, **kwargs):
+        """open a local .jsonl or .ndjson file, possibly gzip or zip compressed"""
+        stream, _ = stream_from(filename)
+        return cls(stream, provider=basename(filename), **kwargs)
+
+    def attach(self, stats):
+        self.stats = stats
+
+    def _batches(self):
+        iterator = iter(self.stream)
+        consume(iterator, self.start)
+        while True:
+            lines = list(islice(iterator, self.batch_size))
+            if not lines:
+                return
+            yield lines
+
+    def _decoded(self):
+        if not self.workers:
+            for lines in self._batches():
+                yield decode_lines(lines)
+            return
+        logger.debug(f"decode JSON lines with {self.workers} workers")
+        with ProcessPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for lines in self._batches():
+                pending.append(executor.submit(decode_lines, lines))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def __iter__(self):
+        self.line = self.start
+        provider = self.provider
+        for decoded in self._decoded():
+            for outcome, value in decoded:
+                self.line += 1
+                if outcome == OK:
+                    yield Row(provider, value)
+                elif outcome == MALFORMED:
+                    self.malformed += 1
+                    if self.stats is not None:
+                        self.stats.error += 1
+                    logger.warning(f"malformed JSON at line {self.line} of {provider} : {value}")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from os.path import basename
+from typing import Iterator, Sequence, Union
+from loguru import logger
+
+from pyngsi.sources.source import Row, Source
+from pyngsi.checkpoint import Checkpoint
+
+
+class _Tail():
+    """the state of a followed file"""
+
+    def __init__(self, filename: str, chunk_size: int = 65536):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.provider = basename(filename)
+        self.f = None
+        self.inode = None
+        self.offset = 0  # offset of the next line to deliver
+        self.buffer = b""  # incomplete last line
+
+    def open(self, offset: int = 0, inode: int = None, from_end: bool = False) -> bool:
+        try:
+            f = open(self.filename, "rb")
+        except FileNotFoundError:
+            return False
+        st = os.fstat(f.fileno())
+        if inode is not None and inode == st.st_ino and offset <= st.st_size:
+            self.offset = offset
+        elif from_end:
+            self.offset = st.st_size
+        else:
+            self.offset = 0
+        f.seek(self.offset)
+        self.f, self.inode, self.buffer = f, st.st_ino, b""
+        return True
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def lines(self) -> Iterator[bytes]:
+        """read the complete lines appended since the last call, chunk by chunk"""
+        while True:
+            data = self.f.read(self.chunk_size)
+            if not data:
+                return
+            lines = (self.buffer + data).split(b"\n")
+            self.buffer = lines.pop()
+            yield from lines
+
+
+class SourceTail(Source):
+
+    """
+    A SourceTail follows local files as they grow, as tail -F does, and delivers the lines appended.
+
+    Rotated files (a new file under the same name) are read to the end, then the new file is followed from its start.
+    Truncated files are followed from their start.
+    from_end starts following files from their end, otherwise files are read from their start.
+
+    When idle, files are polled with an adaptive delay, doubling from poll_min up to poll_max seconds.
+    The wait is interrupted by stop().
+    The SourceTail ends when no line has been appended for idle_timeout seconds, never if None.
+
+    Files are read by chunks of chunk_size bytes, so that a large file is not loaded at once.
+
+    Its position is the inode and the byte offset of the next line of each file.
+    Given a checkpoint, the SourceTail resumes from it and saves its position every checkpoint.every lines processed,
+    and when it ends.
+    """
+
+    def __init__(self, filenames: Union[str, Sequence[str]], from_end: bool = False,
+                 poll_min: float = 0.01, poll_max: float = 0.5, idle_timeout: float = None,
+                 checkpoint: Checkpoint = None, chunk_size: int = 65536):
+        filenames = [filenames] if isinstance(filenames, str) else filenames
+        self.tails = [_Tail(f, chunk_size) for f in filenames]
+        self.from_end = from_end
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.idle_timeout = idle_timeout
+        self.checkpoint = checkpoint
+        self.resume_at: dict = {}
+        self.stopping = threading.Event()
+
+    def position(self) -> dict:
+        return {t.filename: {"inode": t.inode, "offset": t.offset} for t in self.tails if t.inode is not None}
+
+    def seek(self, position: dict):
+        self.resume_at = position
+
+    def stop(self):
+        self.stopping.set()
+
+    def _open(self, t: _Tail, from_end: bool = False):
+        resume_at = self.resume_at.get(t.filename, {})
+        if t.open(resume_at.get("offset", 0), resume_at.get("inode"), from_end):
+            logger.info(f"follow {t.filename} from offset {t.offset}")
+
+    def _changed(self, t: _Tail) -> str:
+        """tell whether the file has been rotated or truncated, once its lines have been read"""
+        try:
+            st = os.stat(t.filename)
+        except FileNotFoundError:
+            return None  # rotated but not yet recreated, keep the old one
+        if st.st_ino != t.inode:
+            logger.info(f"{t.filename} rotated")
+            return "rotated"
+        if st.st_size < t.offset + len(t.buffer):
+            logger.info(f"{t.filename} truncated")
+            return "truncated"
+        return None
+
+    def _read(self, t: _Tail):
+        for line in t.lines():
+            t.offset += len(line) + 1
+            yield Row(t.provider, line.decode("utf-8", errors="replace").rstrip("\r"))
+            # the agent has processed the row when the generator resumes
+            if self.checkpoint and self.checkpoint.acknowledge():
+                self.checkpoint.save(self.position())
+
+    def __iter__(self):
+        self.stopping.clear()
+        if self.checkpoint and not self.resume_at:
+            self.resume_at = self.checkpoint.load() or {}
+        for t in self.tails:
+            self._open(t, self.from_end)
+        self.resume_at = {}
+        delay = self.poll_min
+        last = time.monotonic()
+        try:
+            while not self.stopping.is_set():
+                n = 0
+                for t in self.tails:
+                    if t.f is None:
+                        self._open(t)
+                        if t.f is None:
+                            continue
+                    for row in self._read(t):
+                        n += 1
+                        yield row
+                    changed = self._changed(t)
+                    if changed == "rotated":
+                        for row in self._read(t):  # lines written before the rotation
+                            n += 1
+                            yield row
+                    if changed:
+                        t.close()
+                        self._open(t)
+                if n:
+                    delay = self.poll_min
+                    last = time.monotonic()
+                    continue
+                if self.idle_timeout is not None and time.monotonic() - last >= self.idle_timeout:
+                    logger.info(f"no line appended for {self.idle_timeout}s")
+                    break
+                self.stopping.wait(delay)
+                delay = min(2 * delay, self.poll_max)
+        finally:
+            if self.checkpoint:
+                self.checkpoint.save(self.position())
+            for t in self.tails:
+                t.close()
+
+    def reset(self):
+        pass
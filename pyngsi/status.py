@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Remote status polled in the background.
+
+The status of the remote server (i.e. Orion /version) is requested by a background thread at periodic intervals.
+HTTP status endpoints only read the cached result, hence never wait for the remote server.
+"""
+
+import threading
+import time
+
+from dataclasses import dataclass
+from datetime import datetime
+from loguru import logger
+
+from pyngsi.sink import Sink
+
+DOWN = "Down or Unreachable"
+
+
+@dataclass
+class RemoteStatus:
+    """
+    Last known status of the remote server
+    """
+    state: dict = None
+    healthy: bool = None
+    lastcheck: datetime = None
+    age: float = None
+    stale: bool = True
+    error: str = None
+
+
+class StatusPoller():
+    """
+    StatusPoller polls sink.status() in a daemon thread and caches the result.
+
+    The cached status is considered stale when older than ttl seconds.
+    When feed_sink is set, the health signal is forwarded to the sink so that it can fail fast.
+    """
+
+    def __init__(self, sink: Sink, interval: float = 30, ttl: float = 90, feed_sink: bool = False):
+        self.sink = sink
+        self.interval = interval
+        self.ttl = ttl
+        self.feed_sink = feed_sink
+        self.state: dict = None
+        self.healthy: bool = None
+        self.error: str = None
+        self.lastcheck: float = None  # monotonic
+        self.lastcheck_dt: datetime = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="status-poller", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            self.poll()
+            self.stop_event.wait(self.interval)
+
+    def poll(self):
+        """request the remote status once and update the cache"""
+        error = None
+        try:
+            state = self.sink.status()
+        except Exception as e:
+            logger.error(f"Cannot get remote status : {e}")
+            state, error = None, str(e)
+        if state is None:
+            healthy = None if error is None else False
+        else:
+            healthy = state.get("state") != DOWN
+            if not healthy:
+                error = str(state.get("exception", DOWN))
+                state = {k: str(v) for k, v in state.items()}
+        with self.lock:
+            self.state = state
+            self.healthy = healthy
+            self.error = error
+            self.lastcheck = time.monotonic()
+            self.lastcheck_dt = datetime.now()
+        if self.feed_sink and healthy is not None:
+            self.sink.set_health(healthy)
+
+    def get(self) -> RemoteStatus:
+        """return the last known remote status, without any remote call"""
+        with self.lock:
+            if self.lastcheck is None:
+                return RemoteStatus()
+            age = time.monotonic() - self.lastcheck
+            return RemoteStatus(self.state, self.healthy, self.lastcheck_dt,
+                                round(age, 3), age > self.ttl, self.error)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from os.path import join
+
+from pyngsi.cache import Cache, CacheStats
+from pyngsi.sources.more_sources import SourceSampleOrion
+from pyngsi.sink import SinkNull
+from pyngsi.agent import NgsiAgentPull, build_entity_sample_orion
+from pyngsi.ngsi import DataModel
+
+
+def test_cache_lru():
+    cache = Cache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now the most recently used
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats == CacheStats(hits=3, misses=0, evictions=1)
+
+
+def test_cache_ttl():
+    cache = Cache(ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+
+
+def test_cache_memoize():
+    calls = []
+    cache = Cache()
+
+    @cache.memoize
+    def lookup(mmsi):
+        calls.append(mmsi)
+        return f"vessel {mmsi}"
+
+    assert lookup(1) == lookup(1) == "vessel 1"
+    assert calls == [1]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+def test_cache_prefetch_and_changed():
+    cache = Cache()
+    cache.prefetch([("Room1", "v1"), ("Room2", "v2")])
+    assert len(cache) == 2
+    assert not cache.changed("Room1", "v1")
+    assert cache.changed("Room1", "v2")
+    assert cache.changed("Room3", "v3")
+
+
+def test_cache_persistence(tmp_path):
+    filename = join(tmp_path, "cache.pickle")
+    cache = Cache(filename=filename)
+    cache.put("a", {"name": "berth A"})
+    cache.save()
+    assert Cache(filename=filename).get("a") == {"name": "berth A"}
+
+
+def test_agent_side_effect_sent_once():
+    cache = Cache()
+
+    def side_effect(row, sink, datamodel):
+        m = DataModel(id=f"Building:MainBuilding:Room:{datamodel['id']}", type="Room")
+        if not cache.changed(m["id"], m):
+            return 0
+        sink.write(m.json())
+        cache.put(m["id"], m)
+        return 1
+
+    src = SourceSampleOrion(count=10, delay=0)
+    agent = NgsiAgentPull(src, SinkNull(), build_entity_sample_orion, side_effect, cache=cache)
+    agent.run()
+    agent.reset()
+    assert len(cache) == 9  # Room1 to Room9, the cache is not wiped by reset()
+    assert cache.stats.hits == 1
+
+
+def test_agent_side_effect_retried_after_failed_write():
+    from pyngsi.sink import Sink
+    cache = Cache()
+    attempts = []
+
+    class SinkFailingOnce(Sink):
+        def write(self, msg):
+            attempts.append(msg)
+            if len(attempts) == 2:  # the first side entity
+                raise IOError("connection reset")
+
+    def side_effect(row, sink, datamodel):
+        m = DataModel(id=f"Building:MainBuilding:Room:{datamodel['id']}", type="Room")
+        if not cache.changed(m["id"], m):
+            return 0
+        sink.write(m.json())
+        cache.put(m["id"], m)
+        return 1
+
+    for _ in range(2):
+        src = SourceSampleOrion(count=1, delay=0)
+        agent = NgsiAgentPull(src, SinkFailingOnce(), build_entity_sample_orion, side_effect, cache=cache)
+        agent.run()
+    assert len(attempts) == 4  # the side entity is sent again on the second run
+    assert len(cache) == 1
+
+
+def test_cache_metrics():
+    from pyngsi.metrics import Metrics
+    cache = Cache()
+    metrics = Metrics()
+    cache.register_metrics(metrics)
+    cache.get("a")
+    text = metrics.expose()
+    assert "# TYPE pyngsi_cache_misses_total counter" in text
+    assert "pyngsi_cache_misses_total 1" in text
+    assert "# TYPE pyngsi_cache_entries gauge" in text
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import gzip
+
+from os.path import join, exists
+
+from pyngsi.sources.source import Source, SourceStream, SourceFile
+from pyngsi.sources.source_json import SourceJson
+from pyngsi.sink import Sink
+from pyngsi.agent import NgsiAgentPull
+from pyngsi.checkpoint import Checkpoint
+
+
+class SinkCrash(Sink):
+
+    def __init__(self, crash_after: int = None):
+        self.written = []
+        self.crash_after = crash_after
+
+    def write(self, msg):
+        if len(self.written) == self.crash_after:
+            raise KeyboardInterrupt()  # not caught by the agent
+        self.written.append(msg)
+
+
+def create_file(tmp_path, name="data.txt"):
+    filename = join(tmp_path, name)
+    lines = [f"line{i};élément" for i in range(10)]
+    content = "\r\n".join(lines) + "\r\n"
+    if name.endswith(".gz"):
+        with gzip.open(filename, "wt", encoding="utf-8", newline="") as f:
+            f.write(content)
+    else:
+        with open(filename, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+    return filename, lines
+
+
+@pytest.mark.parametrize("name", ["data.txt", "data.txt.gz"])
+def test_resume_file(tmp_path, name):
+    filename, lines = create_file(tmp_path, name)
+    checkpoint = Checkpoint(join(tmp_path, "checkpoint.json"), every=2)
+
+    sink = SinkCrash(crash_after=5)
+    agent = NgsiAgentPull(Source.from_file(filename), sink, checkpoint=checkpoint)
+    with pytest.raises(KeyboardInterrupt):
+        agent.run()
+    assert checkpoint.load()["line"] == 4
+
+    sink = SinkCrash()
+    agent = NgsiAgentPull(Source.from_file(filename), sink, checkpoint=checkpoint)
+    agent.run()
+    assert sink.written == lines[4:]
+    assert not exists(checkpoint.filename)
+
+
+def test_source_file_position(tmp_path):
+    filename, lines = create_file(tmp_path)
+    src = SourceFile(filename)
+    it = iter(src)
+    for _ in range(3):
+        next(it)
+    position = src.position()
+    assert position["offset"] == sum(len(f"{x}\r\n".encode("utf-8")) for x in lines[:3])
+    src = SourceFile(filename)
+    src.seek(position)
+    assert [row.record for row in src] == lines[3:]
+
+
+def test_source_stream_seek():
+    src = SourceStream(["a", "b", "c"])
+    src.seek({"line": 2})
+    assert [row.record for row in src] == ["c"]
+    assert src.position() == {"line": 3}
+
+
+def test_source_json_seek():
+    src = SourceJson([1, 2, 3])
+    src.seek({"index": 1})
+    assert [row.record for row in src] == [2, 3]
+    assert src.position() == {"index": 3}
+
+
+def test_source_many_resume(tmp_path):
+    filename, lines = create_file(tmp_path)
+    src = Source.from_files([filename, filename])
+    it = iter(src)
+    for _ in range(12):
+        next(it)
+    position = src.position()
+    assert position["index"] == 1
+    src = Source.from_files([filename, filename])
+    src.seek(position)
+    assert [row.record for row in src] == lines[2:]
+
+
+def test_checkpoint_requires_resumable_source(tmp_path):
+    from pyngsi.agent import NgsiException
+    from pyngsi.sources.source import SourceSingle
+    checkpoint = Checkpoint(join(tmp_path, "checkpoint.json"))
+    with pytest.raises(NgsiException):
+        NgsiAgentPull(SourceSingle("Room1;23;720"), SinkCrash(), checkpoint=checkpoint)
+    with pytest.raises(NgsiException):
+        NgsiAgentPull(SourceSingle("Room1;23;720").map(str.upper), SinkCrash(), checkpoint=checkpoint)
+    assert NgsiAgentPull(SourceStream(["a"]).map(str.upper), SinkCrash(), checkpoint=checkpoint)
+    with pytest.raises(NgsiException):
+        NgsiAgentPull(SourceStream(["a"]).batch(2), SinkCrash(), checkpoint=checkpoint)
+    with pytest.raises(NgsiException):
+        NgsiAgentPull(SourceStream(["a"]).flat_map(list), SinkCrash(), checkpoint=checkpoint)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_row_without_position_keeps_checkpoint(tmp_path, pipeline):
+    from pyngsi.pipeline import NgsiAgentPipeline
+
+    class SourcePartial(SourceStream):
+        def position(self):
+            return super().position() if self.line <= 3 else None  # e.g. past a non-seekable file
+
+    checkpoint = Checkpoint(join(tmp_path, "checkpoint.json"), every=1)
+    agent_class = NgsiAgentPipeline if pipeline else NgsiAgentPull
+    sink = SinkCrash()
+    agent = agent_class(SourcePartial([str(i) for i in range(10)]), sink, checkpoint=checkpoint)
+    agent.process = lambda row: (row.record == "6" and agent.stop()) or row.record
+    agent.run()
+    assert "6" in sink.written
+    assert checkpoint.load() == {"line": 3}
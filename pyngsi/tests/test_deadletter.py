@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from os.path import join
+
+from pyngsi.sources.source import SourceStream
+from pyngsi.sink import Sink, SinkNull
+from pyngsi.agent import NgsiAgent, NgsiAgentPull
+from pyngsi.pipeline import NgsiAgentPipeline
+from pyngsi.deadletter import DeadLetterStore
+
+
+class SinkRefuse(Sink):
+
+    def __init__(self, refused: str):
+        self.refused = refused
+        self.written = []
+
+    def write(self, msg):
+        if msg == self.refused:
+            raise IOError("refused")
+        self.written.append(msg)
+
+
+def process(row):
+    return str(int(row.record))
+
+
+@pytest.mark.parametrize("name", ["dlq.jsonl", "dlq.jsonl.gz"])
+def test_agent_deadletter(tmp_path, name):
+    store = DeadLetterStore(join(tmp_path, name))
+    src = SourceStream(["1", "x", "3"])
+    agent = NgsiAgentPull(src, SinkRefuse("3"), process, deadletter=store)
+    agent.run()
+    agent.close()
+    assert agent.stats == NgsiAgent.Stats(3, 2, 1, 0, 2, 0, 2)
+    entries = list(store.entries())
+    assert len(entries) == 2
+    assert entries[0]["stage"] == "process"
+    assert entries[0]["record"] == "x"
+    assert entries[0]["exception"].startswith("ValueError")
+    assert entries[1]["stage"] == "sink"
+    assert entries[1]["msg"] == "3"
+    assert store.count == 2
+    assert store.size() > 0
+
+
+def test_pipeline_deadletter(tmp_path):
+    store = DeadLetterStore(join(tmp_path, "dlq.jsonl"))
+    agent = NgsiAgentPipeline(SourceStream(["1", "x", "3"]), SinkNull(), process, deadletter=store)
+    agent.run()
+    assert agent.stats.deadletter == 1
+    assert [e["record"] for e in store.entries()] == ["x"]
+
+
+def test_replay(tmp_path):
+    store = DeadLetterStore(join(tmp_path, "dlq.jsonl"))
+    agent = NgsiAgentPull(SourceStream(["1", "x", "3"]), SinkRefuse("3"), process, deadletter=store)
+    agent.run()
+    agent.close()
+
+    # only replay the sink failures, now that the sink accepts them
+    sink = SinkRefuse(None)
+    stats = store.replay(sink, stages=["sink"])
+    assert sink.written == ["3"]
+    assert stats.output == 1
+    assert store.count == 1
+
+    # the process failure still fails
+    stats = store.replay(sink, process=process)
+    assert stats.error == 1
+    assert [e["record"] for e in store.entries()] == ["x"]
+
+    # fixed process
+    stats = store.replay(sink, process=lambda row: "fixed")
+    assert sink.written == ["3", "fixed"]
+    assert store.count == 0
+    assert list(store.entries()) == []
+    assert store.replayed == 2
+
+
+def test_gzip_store_flushed_by_batches(tmp_path):
+    from pyngsi.sources.source import Row
+    sizes = []
+    for flush_every in (1, 100):
+        store = DeadLetterStore(join(tmp_path, f"dlq{flush_every}.jsonl.gz"), flush_every=flush_every)
+        for i in range(1000):
+            store.append(Row("user", f"Room{i};23;710"), "process", ValueError("bad record"))
+        store.close()
+        assert len(list(store.entries())) == 1000
+        sizes.append(store.size())
+    assert sizes[1] < sizes[0] / 2
+
+
+def test_replay_ignores_stale_file(tmp_path):
+    import json
+    filename = join(tmp_path, "dlq.jsonl")
+    with open(f"{filename}.replay", "w") as f:  # left by an interrupted replay
+        f.write(json.dumps({"stage": "sink", "provider": "user", "record": "stale"}) + "\n")
+    store = DeadLetterStore(filename)
+    agent = NgsiAgentPull(SourceStream(["1", "x"]), SinkNull(), process, deadletter=store)
+    agent.run()
+    agent.close()
+    store.replay(SinkNull(), process=process)
+    store.replay(SinkNull(), process=process)
+    assert [e["record"] for e in store.entries()] == ["x"]
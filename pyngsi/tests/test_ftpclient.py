@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import pytest
 
 from loguru import logger
 from os.path import basename
 
-from pyngsi.ftpclient import FtpClient
+from pyngsi.ftpclient import FtpClient, FtpClientPool
 
 
 @pytest.fixture
@@ -53,3 +54,118 @@ def test_download(mock_ftp):
         read_data = f.read()
     assert read_data == "1;23.0;720"
     ftp.clean()
+
+
+REMOTE_FILES = {f"/pub/data/file{i}.txt": f"{i};23.0;720\n".encode() for i in range(8)}
+
+
+@pytest.fixture
+def ftp_server(mocker):
+    """a local stand-in FTP server serving REMOTE_FILES, the first download of file3 fails"""
+    failures = {"/pub/data/file3.txt": 1}
+    mocker.patch("ftplib.FTP.connect")
+    mocker.patch("ftplib.FTP.sock")
+    mocker.patch("ftplib.FTP.login")
+    mocker.patch("ftplib.FTP.quit")
+    mocker.patch("ftplib.FTP.close")
+
+    def retrbinary(cmd, callback):
+        remote = cmd.split(" ", 1)[1]
+        if failures.get(remote):
+            failures[remote] -= 1
+            raise EOFError("connection lost")
+        callback(REMOTE_FILES[remote])
+    mocker.patch("ftplib.FTP.retrbinary", side_effect=retrbinary)
+
+
+def test_pool_download_all(ftp_server):
+    pool = FtpClientPool("ftp.example.com", size=3, retries=1, backoff=0)
+    downloaded = pool.download_all(list(REMOTE_FILES))
+    assert [remote for _, remote in downloaded] == list(REMOTE_FILES)
+    for local, remote in downloaded:
+        with open(local, "rb") as f:
+            assert f.read() == REMOTE_FILES[remote]
+    assert pool.stats.files == 8
+    assert pool.stats.bytes == sum(len(x) for x in REMOTE_FILES.values())
+    assert pool.stats.retries == 1
+    assert pool.stats.errors == 0
+    assert pool.stats.throughput > 0
+    assert len(pool.connected) <= 3
+    pool.close()
+    assert pool.connected == []
+    tmpdir = pool.tmpdir
+    pool.clean()
+    assert not os.path.exists(tmpdir)
+
+
+def test_pool_gives_up(ftp_server):
+    pool = FtpClientPool("ftp.example.com", size=2, retries=0, backoff=0)
+    downloaded = pool.download_all(list(REMOTE_FILES))
+    assert len(downloaded) == 7
+    assert pool.stats.errors == 1
+    pool.close()
+    pool.clean()
+
+
+def test_stream(mock_ftp, mocker):
+    import socket
+    server, client = socket.socketpair()
+    server.sendall(b"1;23.0;720\n2;21.0;711\n")
+    server.close()
+    mocker.patch("ftplib.FTP.voidcmd")
+    mocker.patch("ftplib.FTP.transfercmd", return_value=client)
+    voidresp = mocker.patch("ftplib.FTP.voidresp")
+    ftp = FtpClient("ftp.ncdc.noaa.gov")
+    with ftp.stream("/pub/data/rooms.txt") as f:
+        assert f.read() == b"1;23.0;720\n2;21.0;711\n"
+    assert voidresp.call_count == 1
+    ftp.close()
+    ftp.clean()
+
+
+def test_reconnect(mock_ftp, mocker):
+    import ftplib
+    voidcmd = mocker.patch("ftplib.FTP.voidcmd")
+    ftp = FtpClient("ftp.ncdc.noaa.gov")
+    ftp.ensure_connected()
+    assert ftplib.FTP.login.call_count == 1
+    voidcmd.side_effect = EOFError("connection closed by the server")
+    assert not ftp.alive()
+    ftp.ensure_connected()
+    assert ftplib.FTP.login.call_count == 2
+    ftp.close()
+
+
+def test_keepalive(mock_ftp, mocker):
+    import time
+    voidcmd = mocker.patch("ftplib.FTP.voidcmd")
+    ftp = FtpClient("ftp.ncdc.noaa.gov")
+    ftp.start_keepalive(0.01)
+    time.sleep(0.1)
+    ftp.close()
+    assert voidcmd.call_count > 0
+    assert ftp.keepalive is None
+
+
+def test_pool_same_basename(mocker):
+    files = {"/a/data.csv": b"a1\n" * 1000, "/b/data.csv": b"b1\n" * 1000}
+    mocker.patch("ftplib.FTP.connect")
+    mocker.patch("ftplib.FTP.sock")
+    mocker.patch("ftplib.FTP.login")
+    mocker.patch("ftplib.FTP.quit")
+    mocker.patch("ftplib.FTP.close")
+
+    def retrbinary(cmd, callback):
+        data = files[cmd.split(" ", 1)[1]]
+        for i in range(0, len(data), 100):
+            callback(data[i:i + 100])
+    mocker.patch("ftplib.FTP.retrbinary", side_effect=retrbinary)
+    pool = FtpClientPool("ftp.example.com", size=2, backoff=0)
+    downloaded = pool.download_all(list(files))
+    assert len({local for local, _ in downloaded}) == 2
+    for local, remote in downloaded:
+        assert local.endswith(remote)
+        with open(local, "rb") as f:
+            assert f.read() == files[remote]
+    pool.close()
+    pool.clean()
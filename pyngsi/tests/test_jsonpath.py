@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from types import GeneratorType
+
+from pyngsi.jsonpath import JsonPath, JsonPathException
+
+STORE = {"store": {
+    "book": [
+        {"category": "reference", "author": "Nigel Rees", "price": 8.95},
+        {"category": "fiction", "author": "Evelyn Waugh", "price": 12.99},
+        {"category": "fiction", "author": "Herman Melville", "isbn": "0-553-21311-3", "price": 8.99},
+        {"category": "fiction", "author": "J. R. R. Tolkien", "isbn": "0-395-19395-8", "price": 22.99}
+    ],
+    "bicycle": {"color": "red", "price": 19.95}
+}}
+
+
+def find(expr, obj=STORE):
+    return list(JsonPath(expr).find(obj))
+
+
+def test_child():
+    assert find("$.store.bicycle.color") == ["red"]
+    assert find("$['store']['bicycle']['color']") == ["red"]
+    assert find("store.bicycle.color") == ["red"]
+    assert find("$.store.unknown") == []
+
+
+def test_wildcard():
+    assert find("$.store.book[*].author") == ["Nigel Rees", "Evelyn Waugh", "Herman Melville", "J. R. R. Tolkien"]
+    assert find("$.store.bicycle.*") == ["red", 19.95]
+
+
+def test_recursive_descent():
+    assert find("$..author") == ["Nigel Rees", "Evelyn Waugh", "Herman Melville", "J. R. R. Tolkien"]
+    assert find("$.store..price") == [8.95, 12.99, 8.99, 22.99, 19.95]
+    assert find("$..book[0].author") == ["Nigel Rees"]
+
+
+def test_index_and_slice():
+    assert find("$.store.book[-1].author") == ["J. R. R. Tolkien"]
+    assert find("$.store.book[9]") == []
+    assert [b["price"] for b in find("$.store.book[1:3]")] == [12.99, 8.99]
+    assert [b["price"] for b in find("$.store.book[::2]")] == [8.95, 8.99]
+    assert [b["price"] for b in find("$.store.book[0,3]")] == [8.95, 22.99]
+
+
+def test_filter():
+    assert find("$.store.book[?(@.isbn)].price") == [8.99, 22.99]
+    assert find("$.store.book[?(@.price < 10)].author") == ["Nigel Rees", "Herman Melville"]
+    assert find("$..book[?(@.category == 'reference')].author") == ["Nigel Rees"]
+    assert find("$.store.book[?(@.category != \"fiction\")].price") == [8.95]
+
+
+def test_lazy():
+    matches = JsonPath("$[*].x").find([{"x": i} for i in range(3)])
+    assert isinstance(matches, GeneratorType)
+    assert next(matches) == 0
+
+
+def test_invalid():
+    with pytest.raises(JsonPathException):
+        JsonPath("$.store[")
+    with pytest.raises(JsonPathException):
+        JsonPath("$.store[?(@.price ~ 1)]")
+    with pytest.raises(JsonPathException):
+        JsonPath("$.store[a:b]")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import time
+
+from pyngsi.sources.source import SourceStream
+from pyngsi.sink import Sink, SinkNull, SinkSharded
+from pyngsi.agent import NgsiAgentPull
+from pyngsi.pipeline import NgsiAgentPipeline
+from pyngsi.lifecycle import Lifecycle
+
+
+def test_signal_stops_intake():
+    lifecycle = Lifecycle(signals=(signal.SIGUSR1,)).install()
+    agent = NgsiAgentPull(SourceStream([str(i) for i in range(10)]), SinkNull())
+    lifecycle.on_stop(agent.stop)
+
+    def process(row):
+        if row.record == "2":
+            os.kill(os.getpid(), signal.SIGUSR1)
+        return row.record
+
+    agent.process = process
+    try:
+        agent.run()
+    finally:
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    assert lifecycle.stopped
+    assert agent.stats.input == 3
+    assert agent.stats.output == 3  # the in-flight row has been processed
+
+
+def test_pipeline_drains_after_stop():
+    lifecycle = Lifecycle()
+    agent = NgsiAgentPipeline(SourceStream([str(i) for i in range(1000)]), SinkNull(), read_ahead=10)
+    lifecycle.on_stop(agent.stop)
+    agent.process = lambda row: lifecycle.stop() or row.record
+    agent.run()
+    assert agent.stats.input < 1000
+    assert agent.stats.output == agent.stats.input  # rows already read went through
+
+
+def test_flush_deadline_drops():
+
+    class SinkSlow(Sink):
+        def write(self, msg):
+            time.sleep(0.05)
+
+    sink = SinkSharded(SinkSlow, lanes=1)
+    agent = NgsiAgentPull(SourceStream([f'{{"id": "{i}"}}' for i in range(100)]), sink)
+    # stopped by a signal while the last row is processed, the sink is not flushed by run()
+    agent.process = lambda row: (row.record == '{"id": "99"}' and agent.stop()) or row.record
+    agent.run()
+    dropped = Lifecycle(deadline=0.2).shutdown(agent)
+    assert dropped > 0
+    assert agent.stats.dropped == dropped
+    sink.flush()  # the write in progress at the deadline
+    assert sum(lane.written for lane in sink.stats()) + dropped == 100
+
+
+def test_flush_deadline_bounded():
+    import threading
+    released = threading.Event()
+
+    class SinkHung(Sink):
+        def write(self, msg):
+            released.wait(5)
+
+    sink = SinkSharded(SinkHung, lanes=2)
+    agent = NgsiAgentPull(SourceStream([f'{{"id": "{i}"}}' for i in range(10)]), sink)
+    agent.process = lambda row: (row.record == '{"id": "9"}' and agent.stop()) or row.record
+    agent.run()
+    lifecycle = Lifecycle(deadline=0.2)
+    start = time.monotonic()
+    dropped = lifecycle.shutdown(agent)
+    assert time.monotonic() - start < 1
+    assert not lifecycle.flushed
+    assert dropped > 0
+    assert sink.busy()
+    released.set()
+
+
+def test_scheduler_shutdown(mocker):
+    from pyngsi.scheduler import Scheduler
+
+    class SinkSlow(Sink):
+        def write(self, msg):
+            time.sleep(0.05)
+
+    sink = SinkSharded(SinkSlow, lanes=1)
+    src = SourceStream([f'{{"id": "{i}"}}' for i in range(50)])
+    agent = NgsiAgentPull(src, sink)
+    lifecycle = Lifecycle(deadline=0.2)
+    scheduler = Scheduler(agent, lifecycle=lifecycle)
+    agent.process = lambda row: (row.record == '{"id": "49"}' and lifecycle.stop()) or row.record
+    reset = mocker.spy(src, "reset")
+    scheduler._job()
+    assert reset.call_count == 0  # no new poll once stopped
+    scheduler._shutdown()
+    dropped = scheduler.status.stats.dropped
+    assert dropped > 0
+    text = scheduler.app.test_client().get("/metrics").get_data(as_text=True)
+    assert f"pyngsi_rows_dropped_total {dropped}" in text
+    assert "pyngsi_rows_input_total 50" in text
+    sink.flush()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pyngsi.metrics import Histogram, Metrics, CONTENT_TYPE
+from pyngsi.sources.more_sources import SourceSampleOrion
+from pyngsi.sources.server import ServerHttpUpload
+from pyngsi.sink import SinkNull
+from pyngsi.agent import NgsiAgent
+
+
+def test_histogram():
+    h = Histogram(buckets=(0.1, 1.0))
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5.0)
+    lines = h.expose("latency", "help")
+    assert 'latency_bucket{le="0.1"} 1' in lines
+    assert 'latency_bucket{le="1.0"} 2' in lines
+    assert 'latency_bucket{le="+Inf"} 3' in lines
+    assert "latency_count 3" in lines
+
+
+def test_metrics_expose():
+    metrics = Metrics()
+    metrics.gauge("queue_depth", lambda: 7, "Queue depth", labels='stage="sink"')
+    text = metrics.expose(stats=NgsiAgent.Stats(5, 4, 4, 1, 0, 0))
+    assert "pyngsi_rows_input_total 5" in text
+    assert "pyngsi_rows_filtered_total 1" in text
+    assert 'pyngsi_queue_depth{stage="sink"} 7' in text
+    assert "process_resident_memory_bytes" in text
+
+
+def test_agent_observes_sink_latency():
+    src = SourceSampleOrion(count=5, delay=0)
+    agent = NgsiAgent.create_agent(src, SinkNull())
+    agent.run()
+    assert agent.metrics.sink_latency.count == 5
+
+
+def test_server_metrics_endpoint():
+    server = ServerHttpUpload()
+    agent = NgsiAgent.create_agent(server, SinkNull())
+    server.set_agent(agent)
+    client = server.app.test_client()
+    client.post("/upload", data="Room1;23;710")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert "pyngsi_calls_total 1" in text
+    assert "pyngsi_rows_output_total 1" in text
+    assert "pyngsi_sink_write_duration_seconds_count 1" in text
+
+
+def test_scheduler_metrics_count_jobs_once(mocker):
+    from pyngsi.scheduler import Scheduler
+    src = SourceSampleOrion(count=5, delay=0)
+    agent = NgsiAgent.create_agent(src, SinkNull())
+    scheduler = Scheduler(agent)
+    client = scheduler.app.test_client()
+    scraped = []
+    reset = agent.reset
+    # scraped once the job stats have been cumulated, before the agent is reset
+    mocker.patch.object(agent, "reset", lambda: scraped.append(client.get("/metrics").get_data(as_text=True)) or reset())
+    scheduler._job()
+    scheduler._job()
+    assert "pyngsi_rows_output_total 5" in scraped[0]
+    assert "pyngsi_rows_output_total 10" in scraped[1]
+    assert "pyngsi_calls_total 2" in client.get("/metrics").get_data(as_text=True)
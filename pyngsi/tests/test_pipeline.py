@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pyngsi.sources.source import Source, SourceStream
+from pyngsi.sources.more_sources import SourceSampleOrion
+from pyngsi.sink import SinkNull
+from pyngsi.agent import NgsiAgent, build_entity_sample_orion
+from pyngsi.pipeline import NgsiAgentPipeline
+
+
+def test_pipeline(mocker):
+    src = SourceSampleOrion(count=5, delay=0)
+    sink = SinkNull()
+    mocker.spy(sink, "write")
+    agent = NgsiAgentPipeline(src, sink, build_entity_sample_orion, read_ahead=2, queue_size=2)
+    agent.run()
+    agent.close()
+    assert sink.write.call_count == 5  # pylint: disable=no-member
+    assert agent.stats == NgsiAgent.Stats(5, 5, 5, 0, 0)
+
+
+def test_pipeline_keeps_order():
+    src = SourceStream([str(i) for i in range(100)])
+    written = []
+    sink = SinkNull()
+    sink.write = written.append
+    agent = NgsiAgentPipeline(src, sink, read_ahead=4, queue_size=4)
+    agent.run()
+    assert written == [str(i) for i in range(100)]
+
+
+def test_pipeline_many_workers():
+    src = SourceStream(["1", "", "x", "4"] * 25)
+    agent = NgsiAgentPipeline(src, SinkNull(),
+                              process=lambda row: row.record and int(row.record),
+                              workers=4)
+    agent.run()
+    assert agent.stats == NgsiAgent.Stats(100, 50, 50, 25, 25)
+
+
+def test_pipeline_source_failure():
+    def rows():
+        yield from SourceStream(["1", "2"])
+        raise IOError("broken stream")
+    agent = NgsiAgentPipeline(Source(rows()), SinkNull())
+    with pytest.raises(IOError):
+        agent.run()
+    assert agent.stats.output == 2
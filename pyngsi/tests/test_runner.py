@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from os.path import join
+
+from pyngsi.sources.source import SourceStream
+from pyngsi.sink import SinkNull
+from pyngsi.agent import NgsiAgent, NgsiException
+from pyngsi.runner import NgsiAgentRunner, partition_files, partition_bytes, partition_hash
+
+
+def create_files(tmp_path, count=3, lines=10):
+    for i in range(count):
+        with open(join(tmp_path, f"data{i}.txt"), "w") as f:
+            f.writelines(f"{i};{j}\n" for j in range(lines))
+    return join(tmp_path, "data*.txt")
+
+
+def test_runner_files(tmp_path):
+    pattern = create_files(tmp_path)
+    partitions = partition_files([pattern])
+    assert len(partitions) == 3
+    runner = NgsiAgentRunner(partitions, SinkNull, processes=2)
+    runner.run()
+    assert runner.stats == NgsiAgent.Stats(30, 30, 30, 0, 0)
+
+
+def test_runner_bytes(tmp_path):
+    create_files(tmp_path, count=1, lines=1000)
+    filename = join(tmp_path, "data0.txt")
+    runner = NgsiAgentRunner(partition_bytes(filename, 4), SinkNull)
+    runner.run()
+    assert runner.stats.output == 1000
+
+
+def test_runner_hash():
+    rows = [str(i) for i in range(100)]
+    partitions = partition_hash(lambda: SourceStream(rows), 3)
+    runner = NgsiAgentRunner(partitions, SinkNull, processes=3)
+    runner.run()
+    assert runner.stats.input == 100
+
+
+def test_runner_worker_failure(tmp_path):
+    runner = NgsiAgentRunner(partition_files([join(tmp_path, "*.txt")]) + [lambda: 1 / 0], SinkNull)
+    with pytest.raises(NgsiException):
+        runner.run()
+
+
+def test_runner_picklable():
+    import pickle
+    from functools import partial
+    partitions = partition_hash(partial(SourceStream, ["a", "b"]), 2)
+    runner = NgsiAgentRunner(partitions, SinkNull)
+    # given to the workers as is when processes are spawned
+    pickle.dumps((runner.partitions, runner.sink_factory, runner.process))
+
+
+def test_runner_worker_closes_sink():
+    import queue
+    from pyngsi.runner import _work
+    closed = []
+
+    class SinkClosed(SinkNull):
+        def close(self):
+            closed.append(self)
+
+    results = queue.Queue()
+    _work([lambda: SourceStream(["a"]), lambda: 1 / 0], SinkClosed, lambda row: row.record, None, results)
+    _, stats, error = results.get()
+    assert stats.output == 1
+    assert "division by zero" in error
+    assert len(closed) == 1
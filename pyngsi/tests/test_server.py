@@ -39,3 +39,175 @@ def test_upload_multipart(client):
     response = client.post(
         "/upload", content_type="multipart/form-data", data=data)
     assert response.status_code == 200
+
+
+def test_upload_ndjson(client):
+    data = b'{"room": "Room1", "temperature": 23.0}\n{"room": "Room2", "temperature": 21.0}\n'
+    response = client.post("/upload", data=data, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    data = dict(
+        file=(BytesIO(data), "rooms.jsonl")
+    )
+    response = client.post(
+        "/upload", content_type="multipart/form-data", data=data)
+    assert response.status_code == 200
+
+
+def test_upload_async():
+    import threading
+    import time
+    from pyngsi.agent import NgsiAgentServer
+    from pyngsi.sink import SinkNull
+    released = threading.Event()
+
+    def process(row, *args, **kwargs):
+        released.wait(5)
+        return row.record
+    server = ServerHttpUpload(workers=1, queue_size=0, retry_after=3)
+    agent = NgsiAgentServer(server, SinkNull(), process)
+    server.set_agent(agent)
+    client = server.app.test_client()
+    response = client.post("/upload", data=b"Room1;23;710\nRoom2;21;711\n", content_type="text/plain")
+    assert response.status_code == 202
+    job_id = response.get_json()["job"]
+    assert response.headers["Location"] == f"/jobs/{job_id}"
+
+    # the worker is busy, no room in the queue
+    response = client.post("/upload", data=b"Room3;22;705\n", content_type="text/plain")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+
+    released.set()
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["state"] == "done":
+            break
+        time.sleep(0.05)
+    assert job["state"] == "done"
+    assert job["statistics"]["input"] == 2
+    assert job["statistics"]["output"] == 2
+    assert client.get("/jobs/unknown").status_code == 404
+    response = client.post("/upload", data=b"Room3;22;705\n", content_type="text/plain")
+    assert response.status_code == 202
+    server.close()
+    assert agent.stats.input == 3
+
+
+def test_upload_jobs_share_sink():
+    import time
+    from pyngsi.agent import NgsiAgentServer
+    from pyngsi.sink import Sink, SinkSharded
+
+    written, closed = [], []
+
+    class SinkRecord(Sink):
+        def write(self, msg):
+            written.append(msg)
+
+        def close(self):
+            closed.append(self)
+
+    server = ServerHttpUpload(workers=2, queue_size=8)
+    agent = NgsiAgentServer(server, SinkSharded(SinkRecord, lanes=2), lambda row: {"id": row.record})
+    server.set_agent(agent)
+    client = server.app.test_client()
+    jobs = []
+    for i in range(6):
+        response = client.post("/upload", data=f"Room{i}a\nRoom{i}b\n".encode(), content_type="text/plain")
+        assert response.status_code == 202
+        jobs.append(response.get_json()["job"])
+    for job_id in jobs:
+        for _ in range(100):
+            if client.get(f"/jobs/{job_id}").get_json()["state"] == "done":
+                break
+            time.sleep(0.05)
+        assert client.get(f"/jobs/{job_id}").get_json()["state"] == "done"
+    server.close()
+    assert len(written) == 12
+    assert closed == []  # the shared sink is closed along with the server agent
+    assert agent.server_status.calls == 6
+    assert agent.server_status.calls_success == 6
+    assert agent.stats.output == 12
+
+
+def wait_jobs(client, jobs):
+    import time
+    for job_id in jobs:
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").get_json()
+            if job["state"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+    return [client.get(f"/jobs/{job_id}").get_json() for job_id in jobs]
+
+
+def test_upload_jobs_own_sink_failures(mocker):
+    from pyngsi.agent import NgsiAgentServer
+    from pyngsi.sink import Sink, SinkSharded
+
+    class SinkPicky(Sink):
+        def write(self, msg):
+            if msg["id"].startswith("bad"):
+                raise IOError("rejected")
+
+    sink = SinkSharded(SinkPicky, lanes=2)
+    spy = mocker.spy(sink, "register_metrics")
+    server = ServerHttpUpload(workers=2, queue_size=8)
+    agent = NgsiAgentServer(server, sink, lambda row: {"id": row.record})
+    server.set_agent(agent)
+    client = server.app.test_client()
+    jobs = []
+    for data in (b"bad1\nok1\nok2\n", b"ok3\nok4\n", b"bad2\nbad3\n"):
+        response = client.post("/upload", data=data, content_type="text/plain")
+        jobs.append(response.get_json()["job"])
+    jobs = wait_jobs(client, jobs)
+    server.close()
+    assert [(job["statistics"]["output"], job["statistics"]["error"]) for job in jobs] == [(2, 1), (2, 0), (0, 2)]
+    assert agent.stats.error == 3
+    assert spy.call_count == 1  # registered once, by the server agent
+
+
+def test_upload_jobs_same_filename():
+    import os
+    import threading
+    from pyngsi.agent import NgsiAgentServer
+    from pyngsi.sink import Sink
+    from pyngsi.sources.source import Source, SourceFile
+
+    both = threading.Barrier(2, timeout=5)
+    written, paths = [], []
+
+    class SourceDat(SourceFile):
+        def __init__(self, filename, **kwargs):
+            paths.append(filename)
+            super().__init__(filename, **kwargs)
+
+    class SinkRecord(Sink):
+        def write(self, msg):
+            written.append(msg)
+
+    def process(row, *args, **kwargs):
+        if row.record.endswith("1"):
+            both.wait()  # both jobs are reading their file
+        return row.record
+
+    Source.register_extension("dat", SourceDat)
+    try:
+        server = ServerHttpUpload(workers=2, queue_size=8)
+        agent = NgsiAgentServer(server, SinkRecord(), process)
+        server.set_agent(agent)
+        client = server.app.test_client()
+        jobs = []
+        for i in range(2):
+            data = dict(file=(BytesIO(f"job{i}:1\njob{i}:2\n".encode()), "rooms.dat"))
+            response = client.post("/upload", content_type="multipart/form-data", data=data)
+            jobs.append(response.get_json()["job"])
+        jobs = wait_jobs(client, jobs)
+        assert [job["state"] for job in jobs] == ["done", "done"]
+        assert sorted(written) == ["job0:1", "job0:2", "job1:1", "job1:2"]
+        assert len(set(paths)) == 2
+        assert all(os.path.basename(path) == "rooms.dat" and not os.path.exists(path) for path in paths)
+        server.close()
+        assert not os.path.exists(server.upload_dir)
+    finally:
+        Source.unregister_extension("dat")
@@ -151,3 +151,88 @@ def test_sink_orion_status_with_auth_env(mocker, requests_mock):
                       json={'orion': {'version': '2.2.0-next'}})
     status = sink.status()
     assert status["orion"]["version"] == "2.2.0-next"
+
+
+def test_sink_sharded_keeps_entity_order():
+    import time
+    import random
+    from pyngsi.sink import Sink, SinkSharded
+
+    written = []
+
+    class SinkSlow(Sink):
+        def write(self, msg):
+            time.sleep(random.random() / 1000)
+            written.append(msg)
+
+    sink = SinkSharded(SinkSlow, lanes=4)
+    for i in range(50):
+        for room in range(8):
+            sink.write({"id": f"Room{room}", "seq": i})
+    sink.flush()
+    assert len(written) == 400
+    for room in range(8):
+        seqs = [msg["seq"] for msg in written if msg["id"] == f"Room{room}"]
+        assert seqs == list(range(50))
+    assert sum(lane.written for lane in sink.stats()) == 400
+    assert sink.skew() >= 1.0
+    sink.close()
+
+
+def test_entity_id_top_level():
+    from pyngsi.sink import entity_id
+    assert entity_id('{"id": "Room1", "type": "Room"}') == "Room1"
+    assert entity_id('{"location": {"id": "Site1"}, "id": "Room1"}') == "Room1"
+    assert entity_id('{"type": "Room", "refs": [{"id": "Site2"}], "id": "Room2"}') == "Room2"
+    assert entity_id('{"name": "a {b}", "id": "Room3"}') == "Room3"
+    assert entity_id({"id": "Room4"}) == "Room4"
+
+
+def test_sink_sharded_metrics():
+    from pyngsi.sink import SinkSharded
+    from pyngsi.metrics import Metrics
+    sink = SinkSharded(SinkNull, lanes=2)
+    metrics = Metrics()
+    sink.register_metrics(metrics)
+    sink.write('{"id": "Room1", "type": "Room"}')
+    sink.close()
+    text = metrics.expose()
+    assert 'pyngsi_sink_lane_written{lane="0"}' in text
+    assert "pyngsi_sink_lane_skew" in text
+
+
+def test_sink_sharded_reopened_after_close():
+    from pyngsi.sink import SinkSharded
+    sink = SinkSharded(SinkNull, lanes=2)
+    sink.write({"id": "Room1"})
+    sink.close()
+    sink.close()
+    sink.write({"id": "Room2"})  # lanes started again
+    sink.flush()
+    assert sum(lane.written for lane in sink.stats()) == 2
+    sink.close()
+
+
+def test_sink_sharded_failures_counted_by_agent(tmp_path):
+    from pyngsi.sink import Sink, SinkSharded
+    from pyngsi.agent import NgsiAgentPull
+    from pyngsi.sources.source import SourceStream
+    from pyngsi.deadletter import DeadLetterStore
+
+    class SinkFailing(Sink):
+        def write(self, msg):
+            if msg["id"] == "Room2":
+                raise SinkException("rejected")
+
+    deadletter = DeadLetterStore(str(tmp_path / "deadletter.jsonl"))
+    src = SourceStream(["Room1", "Room2", "Room3"])
+    agent = NgsiAgentPull(src, SinkSharded(SinkFailing, lanes=2),
+                          process=lambda row: {"id": row.record}, deadletter=deadletter)
+    agent.run()
+    assert agent.stats.output == 2
+    assert agent.stats.error == 1
+    assert agent.stats.deadletter == 1
+    entries = list(deadletter.entries())
+    assert entries[0]["stage"] == "sink"
+    assert entries[0]["msg"] == {"id": "Room2"}
+    agent.close()
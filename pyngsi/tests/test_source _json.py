@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import pytest
 import pkg_resources
+import json
 
 from typing import List
 
@@ -52,3 +54,93 @@ def test_source_json_path(mocker):
     assert rows[0].record["fruit"] == "Apple"
     assert rows[1].provider == "test.json"
     assert rows[1].record["fruit"] == "Lime"
+
+
+def test_source_json_path_expression():
+    data = {"dataset": {"data": [{"fruit": "Apple", "size": "Large"},
+                                 {"fruit": "Lime", "size": "Medium"},
+                                 {"fruit": "Melon", "size": "Large"}]}}
+    src = SourceJson(data, jsonpath="$.dataset.data")
+    assert [row.record["fruit"] for row in src] == ["Apple", "Lime", "Melon"]
+    src = SourceJson(data, jsonpath="$..data[?(@.size == 'Large')].fruit")
+    assert [row.record for row in src] == ["Apple", "Melon"]
+    src.seek({"index": 1})
+    assert [row.record for row in src] == ["Melon"]
+    assert src.position() == {"index": 2}
+
+
+def test_source_json_stream(tmp_path):
+    import gzip
+    from os.path import join
+    from pyngsi.sources.source_json import SourceJsonStream
+
+    doc = {"meta": {"skipped": [{"a": "]}\"{["}, [1, [2]]], "n": 1.5},
+           "dataset": {"data": [{"fruit": "Apple", "i": i, "s": "é" * (i % 5)} for i in range(500)]}}
+    filename = join(tmp_path, "big.json.gz")
+    with gzip.open(filename, "wt", encoding="utf-8") as f:
+        json.dump(doc, f)
+    src = SourceJsonStream(filename, jsonpath=["dataset", "data"], chunk_size=7)
+    rows: List[Row] = [x for x in src]
+    assert len(rows) == 500
+    assert rows[0].provider == "big.json.gz"
+    assert [row.record for row in rows] == doc["dataset"]["data"]
+
+    src.seek({"index": 498})
+    assert [row.record["i"] for row in src] == [498, 499]
+    assert src.position() == {"index": 500}
+
+
+def test_source_json_stream_path_index():
+    from io import StringIO
+    from pyngsi.sources.source_json import SourceJsonStream
+    stream = StringIO('{"a": [0, {"b": [12345, 67890]}]}')
+    src = SourceJsonStream(stream=stream, jsonpath=["a", 1, "b"], chunk_size=3)
+    assert [row.record for row in src] == [12345, 67890]
+
+
+def test_source_json_stream_chunk_boundaries():
+    from io import StringIO
+    from pyngsi.sources.source_json import SourceJsonStream
+    doc = '{"skip": [1.5e3, "x"], "data": [12.5, 3.25, 1e5, -0.5E-2, 7, true, "s", null, {"k": [1, 2.0]}, ' \
+          r'"\u00e9t\u00e9", "a\"b", false, []]}'
+    expected = json.loads(doc)["data"]
+    for chunk_size in range(1, len(doc) + 1):
+        src = SourceJsonStream(stream=StringIO(doc), jsonpath=["data"], chunk_size=chunk_size)
+        assert [row.record for row in src] == expected, f"chunk_size={chunk_size}"
+
+
+def test_json_reader_large_value():
+    from io import StringIO
+    from pyngsi.sources.source_json import JsonReader
+
+    class CountingStream(StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            return super().read(size)
+    value = {"s": "x" * 100000}
+    stream = CountingStream(json.dumps(value))
+    reader = JsonReader(stream, chunk_size=16)
+    assert reader.decode() == value
+    assert stream.reads < 20  # reads double in size
+
+
+def test_json_reader_malformed():
+    from io import StringIO
+    from pyngsi.sources.source_json import JsonReader, SourceJsonException, SourceJsonStream
+
+    class CountingStream(StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            return super().read(size)
+    for doc in ('[1, 2, oops, ' + '3, ' * 100000 + '4]', '[1, {"a" 1}, ' + '3, ' * 100000 + '4]'):
+        stream = CountingStream(doc)
+        with pytest.raises(SourceJsonException):
+            list(SourceJsonStream(stream=stream, chunk_size=16))
+        assert stream.reads < 5  # not read up to the end
+    reader = JsonReader(StringIO('[[' + '1, ' * 100000), chunk_size=16, max_size=1000)
+    with pytest.raises(SourceJsonException):
+        reader.skip()
@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import pytest
+import gzip
 import pkg_resources
 
 from typing import List
 
-from pyngsi.sources.source import Row, Source, SourceStream, SourceStdin, SourceSingle
+from pyngsi.sources.source import Row, Source, SourceStream, SourceStdin, SourceSingle, SourceFiles
 from pyngsi.sources.more_sources import SourceSampleOrion
 
 
@@ -96,3 +98,124 @@ def test_source_file_zip():
     rows: List[Row] = [x for x in src]
     assert rows == [Row('test.txt.zip', 'input5'),
                     Row('test.txt.zip', 'input6')]
+
+
+def test_method_map_filter():
+    src = SourceStream(["1", "2", "3", "4"])
+    src = src.map(int).filter(lambda x: x % 2 == 0).map(lambda x: x * 10)
+    assert len(src.stages) == 3  # stages are fused into a single Source
+    rows: List[Row] = [x for x in src]
+    assert rows == [Row('user', 20), Row('user', 40)]
+
+
+def test_method_flat_map_batch():
+    src = SourceStream(["a;b", "c", "d;e;f"]).flat_map(lambda x: x.split(";")).batch(4)
+    rows: List[Row] = [x for x in src]
+    assert rows == [Row('user', ["a", "b", "c", "d"]), Row('user', ["e", "f"])]
+
+
+def test_method_window():
+    src = SourceStream(["1", "2", "3", "4", "5"]).map(int).window(3, step=2)
+    assert [x.record for x in src] == [(1, 2, 3), (3, 4, 5)]
+
+
+def test_method_filter_counted_by_agent():
+    from pyngsi.agent import NgsiAgentPull
+    from pyngsi.sink import SinkNull
+    src = SourceStream(["1", "", "3", ""]).filter(bool)
+    agent = NgsiAgentPull(src, SinkNull())
+    agent.run()
+    assert agent.stats.filtered == 2
+    assert agent.stats.output == 2
+
+
+def test_source_files_lazy(mocker, tmp_path):
+    filenames = []
+    for i in range(3):
+        filename = tmp_path / f"file{i}.txt"
+        filename.write_text(f"a{i}\nb{i}\n")
+        filenames.append(str(filename))
+    spy = mocker.spy(Source, "from_file")
+    src = Source.from_glob(str(tmp_path / "*.txt"))
+    assert isinstance(src, SourceFiles)
+    assert spy.call_count == 0
+    it = iter(Source.from_files(filenames))
+    assert next(it).record == "a0"
+    assert spy.call_count == 1
+    assert [row.record for row in it] == ["b0", "a1", "b1", "a2", "b2"]
+
+
+def test_source_files_prefetch(tmp_path):
+    filenames = []
+    for i in range(5):
+        filename = tmp_path / f"file{i}.txt.gz"
+        with gzip.open(filename, "wt") as f:
+            f.write(f"a{i}\nb{i}\n")
+        filenames.append(str(filename))
+    src = Source.from_files(filenames, prefetch=2)
+    it = iter(src)
+    for _ in range(3):
+        next(it)
+    assert src.position() == {"index": 1, "position": {"row": 1}}
+    assert [row.provider for row in it] == ["file1.txt.gz"] + [f"file{i}.txt.gz" for i in (2, 2, 3, 3, 4, 4)]
+    src = Source.from_files(filenames, prefetch=2)
+    src.seek({"index": 3, "position": {"row": 1}})
+    assert [row.record for row in src] == ["b3", "a4", "b4"]
+    src = Source.from_files(filenames)
+    src.seek({"index": 3, "position": {"row": 1}})
+    assert [row.record for row in src] == ["b3", "a4", "b4"]
+
+
+def test_method_map_error_counted_by_agent(tmp_path):
+    from pyngsi.agent import NgsiAgentPull
+    from pyngsi.pipeline import NgsiAgentPipeline
+    from pyngsi.sink import SinkNull
+    from pyngsi.deadletter import DeadLetterStore
+    for klass in (NgsiAgentPull, NgsiAgentPipeline):
+        deadletter = DeadLetterStore(str(tmp_path / f"{klass.__name__}.jsonl"))
+        src = SourceStream(["1", "x", "3", "0"]).map(int).map(lambda x: 6 // x)
+        agent = klass(src, SinkNull(), deadletter=deadletter)
+        agent.run()
+        assert agent.stats.output == 2  # the rest of the source has been read
+        assert agent.stats.error == 2
+        assert agent.stats.deadletter == 2
+        entries = list(deadletter.entries())
+        assert [(e["stage"], e["provider"], e["record"]) for e in entries] == [("map", "user", "x"), ("map", "user", 0)]
+
+
+def test_source_files_prefetch_bounded(mocker):
+    import time
+    read = {}
+
+    def lines(i):
+        for n in range(10000):
+            read[i] = n + 1
+            yield Row(f"file{i}", f"{i}:{n}")
+    mocker.patch.object(SourceFiles, "open", lambda self, i: Source(lines(i)))
+    src = SourceFiles(["file0", "file1", "file2"], prefetch=1, buffer=64)
+    it = iter(src)
+    assert next(it).record == "0:0"
+    time.sleep(0.2)
+    assert read[0] <= 3 * 64  # the files are not read ahead entirely
+    assert read.get(1, 0) <= 2 * 64
+    rows = list(it)
+    assert len(rows) == 29999
+    assert rows[-1].record == "2:9999"
+    src = SourceFiles(["file0", "file1"], prefetch=1, buffer=64)
+    src.seek({"index": 1, "position": {"row": 9998}})
+    assert [row.record for row in src] == ["1:9998", "1:9999"]
+
+
+def test_source_files_resumable(tmp_path):
+    from pyngsi.agent import NgsiAgentPull, NgsiException
+    from pyngsi.sink import SinkNull
+    from pyngsi.checkpoint import Checkpoint
+    from pyngsi.sources.source_directory import SourceDirectory
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    assert Source.from_files(["a.txt", "b.json", "c.jsonl.gz", "d.zip"]).resumable
+    src = Source.from_files(["a.txt", "b.tar.gz"])
+    assert not src.resumable
+    with pytest.raises(NgsiException):
+        NgsiAgentPull(src, SinkNull(), checkpoint=checkpoint)
+    assert Source.from_files(["a.txt", "b.tar.gz"], prefetch=1).resumable  # resumed by row count
+    assert not SourceDirectory(str(tmp_path)).resumable
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import tarfile
+import pytest
+
+from os.path import join
+from typing import List
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from pyngsi.sources.source import Row, Source
+from pyngsi.sources.source_archive import SourceArchive, SourceArchiveException
+
+MEMBERS = {
+    "rooms1.csv": "Room1;23;710\nRoom2;21;711\n",
+    "data/rooms2.csv": "Room3;20;712\n",
+    "data/rooms.json": '[{"id": "Room4"}, {"id": "Room5"}]',
+    "readme.md": "not data\n",
+}
+
+
+def create_zip(tmp_path) -> str:
+    filename = join(tmp_path, "rooms.zip")
+    with ZipFile(filename, "w", ZIP_DEFLATED) as zf:
+        for name, content in MEMBERS.items():
+            zf.writestr(name, content)
+    return filename
+
+
+def create_tar(tmp_path) -> str:
+    filename = join(tmp_path, "rooms.tar.gz")
+    with tarfile.open(filename, "w:gz") as tf:
+        for name, content in MEMBERS.items():
+            data = content.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return filename
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_source_zip(tmp_path, workers):
+    src = SourceArchive(create_zip(tmp_path), patterns=["*.csv", "*.json"], workers=workers)
+    rows: List[Row] = [x for x in src]
+    assert [row.record for row in rows] == ["Room1;23;710", "Room2;21;711", "Room3;20;712",
+                                            {"id": "Room4"}, {"id": "Room5"}]
+    assert rows[0].provider == "rooms.zip!rooms1.csv"
+    assert rows[2].provider == "rooms.zip!data/rooms2.csv"
+
+
+def test_source_tar(tmp_path):
+    src = Source.from_file(create_tar(tmp_path), patterns="data/*")
+    assert isinstance(src, SourceArchive)
+    rows: List[Row] = [x for x in src]
+    assert [row.record for row in rows] == ["Room3;20;712", {"id": "Room4"}, {"id": "Room5"}]
+    assert rows[0].provider == "rooms.tar.gz!data/rooms2.csv"
+
+
+def test_source_archive_unknown_format():
+    with pytest.raises(SourceArchiveException):
+        SourceArchive("rooms.rar")
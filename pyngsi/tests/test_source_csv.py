@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from datetime import datetime
+from os.path import join
+from typing import List
+
+from pyngsi.sources.source import Row, Source
+from pyngsi.sources.source_csv import SourceCsv, SourceCsvException
+from pyngsi.agent import NgsiAgent
+from pyngsi.sink import SinkNull
+
+LINES = ["id;temp;pressure;date;location\n",
+         "Room1;23.5;710;01/03/2021 10:00;43.29,5.37\n",
+         "Room2;;711;01/03/2021 10:05;43.30 5.36\n",
+         "Room3;hot;712;01/03/2021 10:10;43.31,5.35\n",
+         "Room4;21\n",
+         "Room5;20;713;01/03/2021 10:15;43.32,5.34\n"]
+
+TYPES = {"temp": "float", "pressure": "int", "date": "datetime:%d/%m/%Y %H:%M", "location": "latlon"}
+
+
+def test_source_csv_dict():
+    src = SourceCsv(LINES, header=True, mapping={"temp": "temperature"}, types=TYPES, batch_size=2)
+    rows: List[Row] = [x for x in src]
+    assert [row.record["id"] for row in rows] == ["Room1", "Room2", "Room5"]
+    assert rows[0].record == {"id": "Room1", "temperature": 23.5, "pressure": 710,
+                              "date": datetime(2021, 3, 1, 10, 0), "location": (43.29, 5.37)}
+    assert rows[1].record["temperature"] is None
+    assert src.malformed == 2
+    assert src.position() == {"line": 5}
+
+
+def test_source_csv_tuple():
+    src = SourceCsv(LINES[1:3], header=["id", "temp", "pressure", "date", "location"],
+                    types={"pressure": int}, records="tuple")
+    rows: List[Row] = [x for x in src]
+    assert rows[0].record == ("Room1", "23.5", 710, "01/03/2021 10:00", "43.29,5.37")
+
+
+def test_source_csv_bool_empty():
+    src = SourceCsv(["Room1;yes\n", "Room2;\n", "Room3;no\n"], header=["id", "open"],
+                    types={"open": "bool"}, records="tuple")
+    assert [row.record for row in src] == [("Room1", True), ("Room2", None), ("Room3", False)]
+
+
+def test_source_csv_no_header():
+    src = SourceCsv(["Room1,23\n", "Room2,21\n"], delimiter=",", types={1: "int"})
+    assert [row.record for row in src] == [{0: "Room1", 1: 23}, {0: "Room2", 1: 21}]
+
+
+def test_source_csv_seek():
+    src = SourceCsv(LINES, header=True, types=TYPES)
+    src.seek({"line": 4})
+    assert [row.record["id"] for row in src] == ["Room5"]
+
+
+def test_source_csv_unknown_type():
+    with pytest.raises(SourceCsvException):
+        SourceCsv(LINES, header=True, types={"temp": "complex"})
+    with pytest.raises(SourceCsvException):
+        SourceCsv(LINES, header=True, types={"humidity": "float"})
+
+
+def test_source_csv_register_extension(tmp_path):
+    filename = join(tmp_path, "rooms.csv")
+    with open(filename, "w") as f:
+        f.writelines(LINES)
+    Source.register_extension("csv", SourceCsv, header=True, types=TYPES)
+    try:
+        src = Source.from_file(filename)
+        rows: List[Row] = [x for x in src]
+    finally:
+        Source.unregister_extension("csv")
+    assert len(rows) == 3
+    assert rows[0].provider == "rooms.csv"
+
+
+def test_agent_counts_malformed():
+    agent = NgsiAgent.create_agent(SourceCsv(LINES, header=True, types=TYPES), SinkNull(),
+                                   process=lambda row: None)
+    agent.run()
+    assert agent.stats.input == 3
+    assert agent.stats.error == 2
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import pytest
+
+from os.path import join, exists
+
+from pyngsi.sources.source_directory import SourceDirectory, SourceDirectoryException
+
+
+def drop(path, name: str, content: str, age: float = 60):
+    with open(join(path, name), "w") as f:
+        f.write(content)
+    mtime = time.time() - age  # written age seconds ago
+    os.utime(join(path, name), (mtime, mtime))
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_source_directory(tmp_path, workers):
+    inbox = join(tmp_path, "inbox")
+    os.mkdir(inbox)
+    manifest = join(tmp_path, "manifest.json")
+    drop(inbox, "a.txt", "a1\na2\n")
+    drop(inbox, "b.txt", "b1\n")
+    drop(inbox, "ignored.tmp", "x\n")
+    src = SourceDirectory(inbox, patterns="*.txt", manifest=manifest, workers=workers)
+    assert [row.record for row in src] == ["a1", "a2", "b1"]
+    assert [row.record for row in src] == []
+    drop(inbox, "c.txt", "c1\n")
+    drop(inbox, "b.txt", "b1\n")  # touched, same content
+    os.utime(join(inbox, "b.txt"), (0, 0))
+    drop(inbox, "a.txt", "a3\n")  # changed
+    src = SourceDirectory(inbox, patterns="*.txt", manifest=manifest, workers=workers)
+    assert [row.record for row in src] == ["a3", "c1"]
+    assert [row.record for row in src] == []
+
+
+def test_source_directory_move(tmp_path):
+    inbox, done = join(tmp_path, "inbox"), join(tmp_path, "done")
+    os.mkdir(inbox)
+    drop(inbox, "a.txt", "a1\n")
+    src = SourceDirectory(inbox, after="move", done=done)
+    rows = [row for row in src]
+    assert rows[0].provider == "a.txt"
+    assert not exists(join(inbox, "a.txt"))
+    assert exists(join(done, "a.txt"))
+
+
+def test_source_directory_delete(tmp_path):
+    drop(tmp_path, "a.txt", "a1\n")
+    src = SourceDirectory(str(tmp_path), after="delete")
+    assert [row.record for row in src] == ["a1"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_source_directory_invalid(tmp_path):
+    with pytest.raises(SourceDirectoryException):
+        SourceDirectory(str(tmp_path), after="move")
+    with pytest.raises(SourceDirectoryException):
+        SourceDirectory(str(tmp_path), after="archive")
+
+
+def test_source_directory_settle(tmp_path):
+    drop(tmp_path, "a.txt", "a1\n")
+    drop(tmp_path, "b.txt", "b1\n", age=0)  # being written
+    src = SourceDirectory(str(tmp_path), after="delete", settle=5)
+    assert [row.record for row in src] == ["a1"]
+    drop(tmp_path, "b.txt", "b1\nb2\n", age=10)
+    assert [row.record for row in src] == ["b1", "b2"]
+
+
+def test_source_directory_move_across_filesystems(tmp_path, mocker):
+    import errno
+    inbox, done = join(tmp_path, "inbox"), join(tmp_path, "done")
+    os.mkdir(inbox)
+    drop(inbox, "a.txt", "a1\n")
+    rename = os.rename
+
+    def cross_device(src, dst, *args, **kwargs):
+        if src.startswith(inbox):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return rename(src, dst, *args, **kwargs)
+    mocker.patch("os.rename", side_effect=cross_device)
+    mocker.patch("os.replace", side_effect=cross_device)
+    src = SourceDirectory(inbox, after="move", done=done)
+    assert [row.record for row in src] == ["a1"]
+    assert os.listdir(inbox) == []
+    assert os.listdir(done) == ["a.txt"]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import pytest
 import re
 
@@ -63,3 +64,127 @@ def test_retrieve_some_files(mock_ftp, mock_tempfile, mock_ftpclient):
     assert len(src.downloaded_files) == 2
     assert ("/tmp/166220-99999-2018.gz", "/pub/data/noaa/2018/166220-99999-2018.gz") in src.downloaded_files
     assert ("/tmp/166220-99999-2019.gz", "/pub/data/noaa/2019/166220-99999-2019.gz") in src.downloaded_files
+
+
+def test_retrieve_files_in_parallel(mock_ftp, mock_ftpclient, mocker):
+    pool_download = mocker.patch("pyngsi.ftpclient.FtpClientPool.download_all",
+                                 side_effect=lambda remotes, versions=None: [(mocked_download(r), r) for r in remotes])
+    src = SourceFtp("ftp.ncdc.noaa.gov", paths=["/pub/data/noaa/2019"], f_match=lambda x: True, connections=4)
+    assert pool_download.call_count == 1
+    assert len(src.downloaded_files) == 6
+    assert ("/tmp/166240-99999-2019.gz", "/pub/data/noaa/2019/166240-99999-2019.gz") in src.downloaded_files
+    src.ftp.clean()
+
+
+def test_stream_files(mock_ftp, mock_ftpclient, mocker):
+    import gzip
+    from contextlib import contextmanager
+    from io import BytesIO
+
+    @contextmanager
+    def mocked_stream(remote):
+        yield BytesIO(gzip.compress(f"{basename(remote)};1\n{basename(remote)};2\n".encode()))
+    mocker.patch("pyngsi.ftpclient.FtpClient.stream", side_effect=mocked_stream)
+    src = SourceFtp("ftp.ncdc.noaa.gov", paths=["/pub/data/noaa/2019"],
+                    f_match=lambda x: "2019" in x, provider=None, stream=True)
+    rows = [row for row in src]
+    assert len(rows) == 6
+    assert rows[0].record == "166220-99999-2019.gz;1"
+    assert rows[0].provider == "ftp://ftp.ncdc.noaa.gov/pub/data/noaa/2019/166220-99999-2019.gz"
+    assert src.position() == {"remote": "/pub/data/noaa/2019/166270-99999-2019.gz", "position": {"line": 2}}
+
+
+class FakeFtpServer():
+    """a local stand-in FTP server answering MLSD and RETR with REST"""
+
+    def __init__(self):
+        self.files = {"/pub/a.txt": (b"a1\na2\n", "20210301100000"),
+                      "/pub/b.txt": (b"b1\n", "20210301100000")}
+        self.transferred = 0
+        self.interrupt = None  # remote whose next transfer is interrupted after 2 bytes
+
+    def mlsd(self, path, facts=[]):
+        for remote, (data, modify) in self.files.items():
+            yield basename(remote), {"type": "file", "size": str(len(data)), "modify": modify}
+
+    def retrbinary(self, cmd, callback, rest=None):
+        remote = cmd.split(" ", 1)[1]
+        data = self.files[remote][0][rest or 0:]
+        if self.interrupt == remote:
+            self.interrupt = None
+            callback(data[:2])
+            self.transferred += 2
+            raise EOFError("connection lost")
+        callback(data)
+        self.transferred += len(data)
+
+
+def test_incremental_sync(mock_ftp, mocker, tmp_path):
+    server = FakeFtpServer()
+    mocker.patch("ftplib.FTP.mlsd", side_effect=server.mlsd)
+    mocker.patch("ftplib.FTP.retrbinary", side_effect=server.retrbinary)
+    manifest = join(tmp_path, "manifest.json")
+    src = SourceFtp("ftp.example.com", paths=["/pub"], f_match=lambda x: True, manifest=manifest)
+    assert [row.record for row in src] == ["a1", "a2", "b1"]
+    assert server.transferred == 9
+
+    # nothing changed
+    src.reset()
+    assert [row.record for row in src] == []
+    assert server.transferred == 9
+
+    # b.txt changed, its transfer is interrupted then resumed on the next run
+    server.files["/pub/b.txt"] = (b"b1\nb2\n", "20210302100000")
+    server.interrupt = "/pub/b.txt"
+    src.reset()
+    assert [row.record for row in src] == []
+    assert server.transferred == 11
+    src.reset()
+    assert [row.record for row in src] == ["b1", "b2"]
+    assert server.transferred == 15
+    assert os.listdir(src.workdir) == []
+
+
+def test_persistent_connection(mock_ftp, mocker, tmp_path):
+    import ftplib
+    server = FakeFtpServer()
+    mocker.patch("ftplib.FTP.mlsd", side_effect=server.mlsd)
+    mocker.patch("ftplib.FTP.retrbinary", side_effect=server.retrbinary)
+    voidcmd = mocker.patch("ftplib.FTP.voidcmd")
+    src = SourceFtp("ftp.example.com", paths=["/pub"], f_match=lambda x: True,
+                    manifest=join(tmp_path, "manifest.json"), persistent=True, keepalive=0)
+    assert [row.record for row in src] == ["a1", "a2", "b1"]
+    server.files["/pub/c.txt"] = (b"c1\n", "20210302100000")
+    src.reset()
+    assert [row.record for row in src] == ["c1"]
+    assert ftplib.FTP.login.call_count == 1
+    assert ftplib.FTP.quit.call_count == 0
+
+    # the connection has been closed by the server while idle
+    voidcmd.side_effect = [EOFError("connection closed"), None]
+    server.files["/pub/d.txt"] = (b"d1\n", "20210302100000")
+    src.reset()
+    assert [row.record for row in src] == ["d1"]
+    assert ftplib.FTP.login.call_count == 2
+    src.close()
+    assert ftplib.FTP.quit.call_count == 1
+
+
+def test_stream_json_incrementally(mock_ftp, mocker):
+    import json
+    from contextlib import contextmanager
+    from io import BytesIO
+
+    doc = json.dumps([{"room": f"Room{i}", "temperature": 20.0 + i % 5} for i in range(50000)]).encode()
+    transfer = BytesIO(doc)
+
+    @contextmanager
+    def mocked_stream(remote):
+        yield transfer
+    mocker.patch("pyngsi.ftpclient.FtpClient.retrieve_filelist", side_effect=lambda path: ["/pub/rooms.json"])
+    mocker.patch("pyngsi.ftpclient.FtpClient.stream", side_effect=mocked_stream)
+    src = SourceFtp("ftp.example.com", paths=["/pub"], f_match=lambda x: True, stream=True)
+    it = iter(src)
+    assert next(it).record == {"room": "Room0", "temperature": 20.0}
+    assert transfer.tell() < len(doc) // 10  # the first row is delivered before the whole file is read
+    assert len(list(it)) == 49999
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from os.path import join
+
+from pyngsi.sources.source import Source
+from pyngsi.sources.source_mmap import SourceMmap
+
+
+CONTENT = "Room1;23;720\r\nRoom2;21;711\nélément;1\rlast\r\n\nno newline at end"
+
+
+@pytest.fixture
+def filename(tmp_path):
+    filename = join(tmp_path, "rooms.csv")
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        f.write(CONTENT * 50)
+    return filename
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_same_rows_as_from_file(filename, chunk_size):
+    expected = [row for row in Source.from_file(filename)]
+    rows = [row for row in SourceMmap(filename, chunk_size=chunk_size)]
+    assert rows == expected
+
+
+def test_parallel(filename):
+    expected = [row for row in Source.from_file(filename)]
+    rows = [row for row in SourceMmap(filename, chunk_size=64, workers=2)]
+    assert rows == expected
+
+
+def test_empty_file(tmp_path):
+    filename = join(tmp_path, "empty.txt")
+    open(filename, "w").close()
+    assert [row for row in SourceMmap(filename)] == []
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import pytest
 import pkg_resources
 
 from pyngsi.sources.more_sources import SourceMicrosoftExcel
@@ -51,3 +52,28 @@ def test_source_with_sheetid():
     assert rows[1].record == "SH2HDR2;;;"
     assert rows[2].record == "data1;21;22;23"
     assert rows[3].record == "data2;24;25;26"
+
+
+def test_source_read_only():
+    filename = pkg_resources.resource_filename(__name__, "data/test.xlsx")
+    src = SourceMicrosoftExcel(filename, sheetid=1, ignore=1, read_only=True)
+    rows = [row for row in src]
+    assert [row.record for row in rows] == ["SH2HDR2;;;", "data1;21;22;23", "data2;24;25;26"]
+
+
+def test_source_typed_records():
+    filename = pkg_resources.resource_filename(__name__, "data/test.xlsx")
+    src = SourceMicrosoftExcel(filename, ignore=2, read_only=True, records="tuple")
+    assert [row.record for row in src] == [("data1", 11, 12, 13), ("data2", 14, 15, 16)]
+    src = SourceMicrosoftExcel(filename, ignore=1, read_only=True, records="dict")
+    rows = [row for row in src]
+    assert rows[1].record == {"SH1HDR2": "data2", 1: 14, 2: 15, 3: 16}
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_source_many_sheets(workers):
+    filename = pkg_resources.resource_filename(__name__, "data/test.xlsx")
+    src = SourceMicrosoftExcel(filename, sheets="*", ignore=2, records="tuple", workers=workers)
+    rows = [row for row in src]
+    assert [row.provider for row in rows] == ["test.xlsx!Sheet1"] * 2 + ["test.xlsx!Sheet2"] * 2
+    assert [row.record[1] for row in rows] == [11, 14, 21, 24]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+
+from typing import List
+
+from pyngsi.sources.source import Row, Source
+from pyngsi.sources.source_ndjson import SourceNdjson
+from pyngsi.agent import NgsiAgent
+from pyngsi.sink import SinkNull
+
+LINES = ['{"fruit": "Apple", "size": 1}\n',
+         '\n',
+         '{"fruit": "Lime", \n',
+         '{"fruit": "Melon", "size": 3}\n',
+         '[1, 2]\n']
+
+
+def test_source_ndjson():
+    src = SourceNdjson(LINES, batch_size=2)
+    rows: List[Row] = [x for x in src]
+    assert [row.record for row in rows] == [{"fruit": "Apple", "size": 1}, {"fruit": "Melon", "size": 3}, [1, 2]]
+    assert src.malformed == 1
+    assert src.position() == {"line": 5}
+
+
+def test_source_ndjson_seek():
+    src = SourceNdjson(LINES)
+    src.seek({"line": 3})
+    assert [row.record for row in src] == [{"fruit": "Melon", "size": 3}, [1, 2]]
+
+
+def test_source_ndjson_from_file(tmp_path):
+    filename = tmp_path / "fruits.jsonl.gz"
+    with gzip.open(filename, "wt") as f:
+        f.writelines(LINES)
+    src = Source.from_file(str(filename))
+    assert isinstance(src, SourceNdjson)
+    rows: List[Row] = [x for x in src]
+    assert len(rows) == 3
+    assert rows[0].provider == "fruits.jsonl.gz"
+
+
+def test_source_ndjson_workers(tmp_path):
+    filename = tmp_path / "numbers.ndjson"
+    filename.write_text("".join(f'{{"n": {i}}}\n' for i in range(1000)))
+    src = SourceNdjson.from_file(str(filename), batch_size=100, workers=2)
+    assert [row.record["n"] for row in src] == list(range(1000))
+
+
+def test_agent_counts_malformed():
+    agent = NgsiAgent.create_agent(SourceNdjson(LINES), SinkNull(), process=lambda row: None)
+    agent.run()
+    assert agent.stats.input == 3
+    assert agent.stats.error == 1
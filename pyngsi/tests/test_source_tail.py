@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from os.path import join
+
+from pyngsi.sources.source_tail import SourceTail
+from pyngsi.checkpoint import Checkpoint
+from pyngsi.agent import NgsiAgent
+from pyngsi.sink import SinkNull
+
+
+def append(filename: str, text: str):
+    with open(filename, "a") as f:
+        f.write(text)
+
+
+def test_source_tail(tmp_path):
+    filename = join(tmp_path, "app.log")
+    append(filename, "line1\nline2\n")
+    src = SourceTail(filename, idle_timeout=0.3)
+    it = iter(src)
+    assert next(it).record == "line1"
+    assert next(it).record == "line2"
+    append(filename, "line3\nline")
+    assert next(it).record == "line3"
+    append(filename, "4\n")
+    row = next(it)
+    assert row.record == "line4"
+    assert row.provider == "app.log"
+    assert src.position() == {filename: {"inode": os.stat(filename).st_ino, "offset": 24}}
+    assert list(it) == []
+
+
+def test_source_tail_from_end(tmp_path):
+    filename = join(tmp_path, "app.log")
+    append(filename, "old\n")
+    src = SourceTail(filename, from_end=True, idle_timeout=0.3)
+    it = iter(src)
+    threading.Timer(0.1, append, (filename, "new\n")).start()
+    assert [row.record for row in it] == ["new"]
+
+
+def test_source_tail_rotation_and_truncation(tmp_path):
+    filename = join(tmp_path, "app.log")
+    append(filename, "a\n")
+    src = SourceTail(filename, idle_timeout=0.3)
+    it = iter(src)
+    assert next(it).record == "a"
+    append(filename, "b\n")
+    os.rename(filename, filename + ".1")
+    append(filename, "ccc\n")
+    assert next(it).record == "b"
+    assert next(it).record == "ccc"
+    with open(filename, "w") as f:  # truncated
+        f.write("d\n")
+    assert [row.record for row in it] == ["d"]
+
+
+def test_source_tail_resume(tmp_path):
+    filename = join(tmp_path, "app.log")
+    checkpoint = Checkpoint(join(tmp_path, "tail.checkpoint"), every=1)
+    append(filename, "a\nb\n")
+    src = SourceTail(filename, idle_timeout=0.1, checkpoint=checkpoint)
+    assert [row.record for row in src] == ["a", "b"]
+    append(filename, "c\n")
+    src = SourceTail(filename, idle_timeout=0.1, checkpoint=checkpoint)
+    assert [row.record for row in src] == ["c"]
+
+
+def test_agent_stops_tail(tmp_path):
+    filename = join(tmp_path, "app.log")
+    append(filename, "a\n")
+    agent = NgsiAgent.create_agent(SourceTail(filename), SinkNull())
+    threading.Timer(0.2, agent.stop).start()
+    start = time.monotonic()
+    agent.run()
+    assert time.monotonic() - start < 2
+    assert agent.stats.output == 1
+
+
+def test_source_tail_chunks(tmp_path):
+    filename = join(tmp_path, "app.log")
+    lines = [f"line{i}" + "x" * (i % 20) for i in range(200)]
+    append(filename, "".join(f"{line}\n" for line in lines))
+    src = SourceTail(filename, idle_timeout=0.1, chunk_size=16)
+    it = iter(src)
+    assert next(it).record == lines[0]
+    assert src.tails[0].f.tell() == 16  # not loaded at once
+    assert [row.record for row in it] == lines[1:]
+    assert src.position()[filename]["offset"] == os.path.getsize(filename)
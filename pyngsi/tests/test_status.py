@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import json
+import time
+
+from pyngsi.status import StatusPoller
+from pyngsi.sink import SinkNull, SinkHttp, SinkException
+from pyngsi.sources.server import ServerHttpUpload
+from pyngsi.agent import NgsiAgent
+
+
+class SinkRemote(SinkNull):
+
+    def __init__(self, state):
+        self.state = state
+
+    def status(self):
+        return self.state
+
+
+def test_poller_not_polled_yet():
+    poller = StatusPoller(SinkRemote({"orion": {"version": "2.4.0"}}))
+    remote_status = poller.get()
+    assert remote_status.state is None
+    assert remote_status.stale
+
+
+def test_poller_healthy():
+    poller = StatusPoller(SinkRemote({"orion": {"version": "2.4.0"}}))
+    poller.poll()
+    remote_status = poller.get()
+    assert remote_status.healthy
+    assert not remote_status.stale
+    assert remote_status.state["orion"]["version"] == "2.4.0"
+
+
+def test_poller_down_feeds_sink():
+    sink = SinkRemote({"state": "Down or Unreachable"})
+    poller = StatusPoller(sink, feed_sink=True)
+    poller.poll()
+    assert poller.get().healthy is False
+    assert sink.healthy is False
+
+
+def test_sink_http_fail_fast(requests_mock):
+    requests_mock.post("http://127.0.0.1:8080/")
+    sink = SinkHttp(fail_fast=True)
+    sink.set_health(False)
+    with pytest.raises(SinkException):
+        sink.write("dummy")
+    assert not requests_mock.called
+    sink.set_health(True)
+    sink.write("dummy")
+    assert requests_mock.called
+
+
+def test_status_endpoint_reads_cache(mocker):
+    sink = SinkRemote({"orion": {"version": "2.4.0"}})
+    server = ServerHttpUpload(poller=StatusPoller(sink, interval=3600))
+    agent = NgsiAgent.create_agent(server, sink)
+    server.set_agent(agent)
+    server.poller.start()
+    while server.poller.get().lastcheck is None:  # wait for the first background poll
+        time.sleep(0.01)
+    mocker.spy(sink, "status")
+    client = server.app.test_client()
+    response = client.get("/status")
+    data = json.loads(response.get_data(as_text=True))
+    assert response.status_code == 200
+    assert data["orion_status"]["orion"]["version"] == "2.4.0"
+    assert data["remote_health"]["healthy"]
+    assert sink.status.call_count == 0  # pylint: disable=no-member
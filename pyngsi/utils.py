@@ -9,19 +9,41 @@ from pathlib import Path
 from loguru import logger
 
 
-def stream_from(filename: str = None):
+def stream_from(filename: str = None, offset: int = 0):
+    """
+    Open a local file as a text stream, handling gzip and zip compression.
+
+    Line endings are kept untranslated so that the byte length of each line can be computed.
+    When offset is given, the stream starts at this byte offset of the uncompressed content.
+    """
     try:
         suffixes = Path(filename).suffixes
         ext = suffixes[-1]
         if ext == ".gz":
-            stream = gzip.open(filename, "rt", encoding="utf-8")
+            if offset:
+                return _text_at(gzip.open(filename, "rb"), offset), suffixes[:-1]
+            stream = gzip.open(filename, "rt", encoding="utf-8", newline="")
             return stream, suffixes[:-1]
         elif ext == ".zip":
             zf = ZipFile(filename, 'r')
             f = zf.namelist()[0]
-            stream = TextIOWrapper(zf.open(f, 'r'), encoding='utf-8')
+            if offset:
+                return _text_at(zf.open(f, 'r'), offset), suffixes[:-1]
+            stream = TextIOWrapper(zf.open(f, 'r'), encoding='utf-8', newline="")
             return stream, suffixes[:-1]
         else:
-            return open(filename, "r", encoding="utf-8"), suffixes
+            if offset:
+                return _text_at(open(filename, "rb"), offset), suffixes
+            return open(filename, "r", encoding="utf-8", newline=""), suffixes
     except Exception as e:
         logger.error(f"Cannot open file {filename} : {e}")
+
+
+def _text_at(binary, offset: int):
+    binary.seek(offset)
+    return TextIOWrapper(binary, encoding="utf-8", newline="")
+
+
+def nbytes(line: str) -> int:
+    """return the length in bytes of an utf-8 encoded line"""
+    return len(line) if line.isascii() else len(line.encode("utf-8"))